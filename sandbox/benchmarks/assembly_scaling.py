@@ -0,0 +1,72 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+"""
+Measure the scaling of threaded system matrix assembly with thread count
+
+Usage: python assembly_scaling.py [order] [max_threads] [subdivisions]
+
+Both the dolfin (any order) and NumPy (order 1 only) backends are timed.
+The mesh colouring and JIT compilation are done before timing starts.
+"""
+from __future__ import division
+
+import sys
+from time import time
+import dolfin
+sys.path.insert(0, '../../')
+from sucemfem.BoundaryConditions import ABCBoundaryCondition, BoundaryConditions
+from sucemfem.ProblemConfigurations.EMDrivenProblem import DrivenProblemABC
+del sys.path[0]
+
+def time_assembly(mesh, order, backend, num_threads, repeats=3):
+    abc = ABCBoundaryCondition()
+    abc.set_region_number(1)
+    bcs = BoundaryConditions()
+    bcs.add_boundary_condition(abc)
+    dp = DrivenProblemABC()
+    dp.set_mesh(mesh)
+    dp.set_basis_order(order)
+    dp.set_boundary_conditions(bcs)
+    dp.set_assembly_backend(backend)
+    dp.set_num_threads(num_threads)
+    dp.init_problem()                   # warm-up: JIT, colouring, patterns
+    times = []
+    for i in range(repeats):
+        t0 = time()
+        dp._init_system_matrices()
+        times.append(time() - t0)
+    return min(times)
+
+if __name__ == '__main__':
+    order = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    max_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    subdivisions = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    mesh = dolfin.UnitCube(*[subdivisions]*3)
+    thread_counts = [1]
+    while thread_counts[-1]*2 <= max_threads:
+        thread_counts.append(thread_counts[-1]*2)
+    backends = ['dolfin'] + (['numpy'] if order == 1 else [])
+    print '%d cells, order %d' % (mesh.num_cells(), order)
+    for backend in backends:
+        t_1 = None
+        for num_threads in thread_counts:
+            t = time_assembly(mesh, order, backend, num_threads)
+            t_1 = t_1 or t
+            print '%-7s threads: %3d time: %8.3f s speedup: %5.2f' % (
+                backend, num_threads, t, t_1/t)
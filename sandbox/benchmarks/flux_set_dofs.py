@@ -0,0 +1,109 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+"""
+Measure the per-call overhead of updating the dofs of VariationalSurfaceFlux
+
+Usage: python flux_set_dofs.py [order] [subdivisions] [repeats]
+
+The precomputed boundary dof gather is compared with the previous
+implementation, which applied two DomainBoundary DirichletBCs on every
+call. Both sides are timed doing the same work: setting the dofs,
+gathering the boundary dofs and setting the testing function, with and
+without the flux calculation itself.
+"""
+from __future__ import division
+
+import sys
+from time import time
+import numpy as np
+import dolfin
+sys.path.insert(0, '../../')
+from sucemfem.Consts import Z0
+from sucemfem.Utilities.Converters import as_dolfin_vector
+from sucemfem.PostProcessing.power_flux import VariationalSurfaceFlux
+del sys.path[0]
+
+def set_dofs_dirichlet(flux, E_r, E_i, dofs):
+    """The dof update before the boundary dofs were cached"""
+    x_r = np.real(dofs).copy()
+    x_i = np.imag(dofs).copy()
+    E_r.vector()[:] = x_r
+    E_i.vector()[:] = x_i
+    boundary = dolfin.DomainBoundary()
+    E_r_dirich = dolfin.DirichletBC(flux.function_space, E_r, boundary)
+    E_i_dirich = dolfin.DirichletBC(flux.function_space, E_i, boundary)
+    x_r_dirich = as_dolfin_vector(np.zeros(len(x_r)))
+    x_i_dirich = as_dolfin_vector(np.zeros(len(x_r)))
+    E_r_dirich.apply(x_r_dirich)
+    E_i_dirich.apply(x_i_dirich)
+    flux.dirich_dofs = x_r_dirich.array() + 1j*x_i_dirich.array()
+    flux.functional.set_E_dofs(dofs)
+    flux.functional.set_g_dofs(1j*flux.dirich_dofs.conjugate()/flux.k0/Z0)
+
+def calc_flux_dirichlet(flux, E_r, E_i, dofs):
+    set_dofs_dirichlet(flux, E_r, E_i, dofs)
+    return flux.functional.calc_functional().conjugate()
+
+def set_dofs_cached(flux, dofs):
+    """The dof update with the cached boundary dofs"""
+    flux.set_dofs(dofs)
+    flux._update_g_dofs()
+
+def calc_flux_cached(flux, dofs):
+    flux.set_dofs(dofs)
+    return flux.calc_flux()
+
+def time_calls(fn, dofs, repeats):
+    fn(dofs)                            # warm-up: boundary dofs, JIT
+    t0 = time()
+    for i in range(repeats):
+        fn(dofs)
+    return (time() - t0)/repeats
+
+if __name__ == '__main__':
+    order = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    subdivisions = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    k0 = 2*np.pi
+    mesh = dolfin.UnitCube(*[subdivisions]*3)
+    V = dolfin.FunctionSpace(mesh, "Nedelec 1st kind H(curl)", order)
+    dofs = np.random.random(V.dim()) + 1j*np.random.random(V.dim())
+    E_r, E_i = dolfin.Function(V), dolfin.Function(V)
+    flux_before = VariationalSurfaceFlux(V)
+    flux_before.set_k0(k0)
+    flux_after = VariationalSurfaceFlux(V)
+    flux_after.set_k0(k0)
+    t_set_before = time_calls(
+        lambda x: set_dofs_dirichlet(flux_before, E_r, E_i, x), dofs, repeats)
+    t_set_after = time_calls(
+        lambda x: set_dofs_cached(flux_after, x), dofs, repeats)
+    assert np.all(flux_after.dirich_dofs == flux_before.dirich_dofs)
+    t_flux_before = time_calls(
+        lambda x: calc_flux_dirichlet(flux_before, E_r, E_i, x), dofs, repeats)
+    t_flux_after = time_calls(
+        lambda x: calc_flux_cached(flux_after, x), dofs, repeats)
+    print '%d cells, order %d, %d dofs' % (mesh.num_cells(), order, V.dim())
+    print 'set_dofs + boundary gather:'
+    print '  DirichletBC: %8.3f ms' % (t_set_before*1000)
+    print '  cached:      %8.3f ms speedup: %5.1f' % (
+        t_set_after*1000, t_set_before/t_set_after)
+    print 'set_dofs + calc_flux:'
+    print '  DirichletBC: %8.3f ms' % (t_flux_before*1000)
+    print '  cached:      %8.3f ms speedup: %5.1f' % (
+        t_flux_after*1000, t_flux_before/t_flux_after)
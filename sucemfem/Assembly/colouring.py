@@ -0,0 +1,82 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+"""Colouring of elements so that elements of the same colour share no dofs
+
+Elements of one colour can be assembled concurrently without any write
+conflicts in the global matrix. This module has no dolfin dependency.
+"""
+from __future__ import division
+
+import numpy as np
+import scipy.sparse
+
+def element_adjacency(element_dofs, n_dofs):
+    """Return a CSR matrix with nonzeros where two elements share a dof
+
+    The diagonal (self adjacency) is excluded.
+    """
+    n_el, k = element_dofs.shape
+    B = scipy.sparse.csr_matrix(
+        (np.ones(n_el*k), element_dofs.ravel(), np.arange(0, n_el*k+1, k)),
+        shape=(n_el, n_dofs))
+    C = (B*B.T).tocsr()
+    C.setdiag(np.zeros(n_el))
+    C.eliminate_zeros()
+    C.sort_indices()
+    return C
+
+def colour_elements(element_dofs, n_dofs, seed=0):
+    """Colour elements such that elements of the same colour share no dofs
+
+    Uses the Jones-Plassmann algorithm: in each round, every uncoloured
+    element with a higher random priority than all its uncoloured
+    neighbours is given the round's colour. All operations within a round
+    are vectorised.
+
+    @param element_dofs: (n, k) array of the global dofs of each element
+    @param n_dofs: Total number of global dofs
+    @keyword seed: Seed for the random priorities, for reproducibility
+    @return: A list of arrays, each containing the element numbers of one
+        colour
+    """
+    C = element_adjacency(np.asarray(element_dofs), n_dofs)
+    n_el = C.shape[0]
+    priority = np.random.RandomState(seed).permutation(n_el).astype(np.int64)
+    row_lengths = np.diff(C.indptr)
+    has_nbrs = row_lengths > 0
+    colours = []
+    uncoloured = np.ones(n_el, dtype=bool)
+    while np.any(uncoloured):
+        live_priority = np.where(uncoloured, priority, -1)
+        nbr_max = np.full(n_el, -1, dtype=np.int64)
+        if len(C.indices):
+            nbr_max[has_nbrs] = np.maximum.reduceat(
+                live_priority[C.indices], C.indptr[:-1][has_nbrs])
+        selected = uncoloured & (priority > nbr_max)
+        colours.append(np.flatnonzero(selected))
+        uncoloured &= ~selected
+    return colours
+
+def check_colouring(element_dofs, colours):
+    """Return True if no two elements of the same colour share a dof"""
+    for els in colours:
+        dofs = np.asarray(element_dofs)[els].ravel()
+        if len(np.unique(dofs)) != len(dofs):
+            return False
+    return True
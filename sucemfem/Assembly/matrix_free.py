@@ -0,0 +1,157 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+"""Matrix-free application of the lowest order Nedelec driven system matrix"""
+from __future__ import division
+
+import numpy as np
+
+from sucemfem.Assembly import nedelec1
+from sucemfem.Assembly.mesh_data import get_mesh_data
+
+def _accumulate(cell_dofs, values, n):
+    """Sum (m, k) values into a length n vector at cell_dofs"""
+    dofs = cell_dofs.ravel()
+    values = values.ravel()
+    if np.iscomplexobj(values):
+        return (np.bincount(dofs, weights=values.real, minlength=n)
+                + 1j*np.bincount(dofs, weights=values.imag, minlength=n))
+    return np.bincount(dofs, weights=values, minlength=n)
+
+class DrivenSystemOperator(object):
+    """Matrix-free operator for A = S - k0**2*M + 1j*k0*S_0
+
+    Applies the lowest order Nedelec driven system matrix (see
+    L{ProblemConfigurations.EMDrivenProblem.DrivenProblemABC}) element by
+    element, without assembling any global matrix. Only the mesh
+    connectivity and per-cell data are stored. Either the element
+    matrices are cached (faster, 36 values per cell) or they are
+    recalculated in chunks from the cell geometry for each product (least
+    memory).
+
+    The operator has shape, dtype and matvec() attributes, so it can be
+    passed to the scipy iterative solvers and to the solver classes in
+    L{Utilities.LinalgSolvers} in place of a matrix.
+
+    Rows of dofs constrained by essential boundary conditions are
+    replaced as by dolfin.DirichletBC.apply() on each of S, M and S_0,
+    i.e. the same operator as the assembled matrix is obtained.
+    """
+    chunk_size = 100000
+
+    def __init__(self, mesh, k0, eps_r=None, mu_r=None, essential_dofs=None,
+                 abc=True, cache_element_matrices=False):
+        """
+        @param mesh: UFC ordered dolfin mesh
+        @param k0: Free space wave number
+        @keyword eps_r: Optional length num_cells array of eps_r values
+        @keyword mu_r: Optional length num_cells array of mu_r values
+        @keyword essential_dofs: Optional array of constrained dofs
+        @keyword abc: Include the first order ABC term S_0 (default: True)
+        @keyword cache_element_matrices: Store the element matrices rather
+            than recalculating them for every product (default: False)
+        """
+        self.mesh_data = md = get_mesh_data(mesh)
+        self.k0 = k0
+        self.eps_r = eps_r
+        self.mu_r_inv = None if mu_r is None else 1/np.asarray(mu_r)
+        self.abc = abc
+        n = md.num_edges
+        self.shape = (n, n)
+        self.dtype = np.dtype(np.complex128)
+        if essential_dofs is None:
+            essential_dofs = np.array([], dtype=np.int64)
+        self.essential_dofs = np.asarray(essential_dofs, dtype=np.int64)
+        # Diagonal value of constrained rows, being the sum of the identity
+        # rows of S, M and S_0 as combined in A
+        self.essential_value = 1 - k0**2 + (1j*k0 if abc else 0)
+        self._element_matrices = None
+        self._abc_matrices = None
+        if abc:
+            self._abc_matrices = 1j*k0*self._calc_abc_matrices()
+        if cache_element_matrices:
+            self._element_matrices = self._calc_element_matrices(
+                slice(None))
+
+    def _calc_element_matrices(self, cells):
+        md = self.mesh_data
+        grads, volumes = md.grads[cells], md.volumes[cells]
+        eps_r = None if self.eps_r is None else self.eps_r[cells]
+        mu_r_inv = None if self.mu_r_inv is None else self.mu_r_inv[cells]
+        return (nedelec1.stiffness_matrices(grads, volumes, mu_r_inv)
+                - self.k0**2*nedelec1.mass_matrices(grads, volumes, eps_r))
+
+    def _calc_abc_matrices(self):
+        md = self.mesh_data
+        fc = md.boundary_face_cells
+        return nedelec1.face_tangential_mass_matrices(
+            md.grads[fc], md.boundary_face_normals, md.boundary_face_areas,
+            md.boundary_face_numbers)
+
+    def _iter_volume_products(self, x):
+        md = self.mesh_data
+        if self._element_matrices is not None:
+            yield md.cell_edges, np.einsum(
+                'nij,nj->ni', self._element_matrices, x[md.cell_edges])
+            return
+        for start in range(0, md.num_cells, self.chunk_size):
+            cells = slice(start, start + self.chunk_size)
+            cell_dofs = md.cell_edges[cells]
+            yield cell_dofs, np.einsum(
+                'nij,nj->ni', self._calc_element_matrices(cells),
+                x[cell_dofs])
+
+    def matvec(self, x):
+        """Calculate and return A*x"""
+        shape = np.shape(x)
+        x = np.asarray(x).ravel()
+        n = self.shape[0]
+        y = np.zeros(n, dtype=np.complex128)
+        for cell_dofs, y_el in self._iter_volume_products(x):
+            y += _accumulate(cell_dofs, y_el, n)
+        if self.abc:
+            md = self.mesh_data
+            face_dofs = md.cell_edges[md.boundary_face_cells]
+            y += _accumulate(face_dofs, np.einsum(
+                'nij,nj->ni', self._abc_matrices, x[face_dofs]), n)
+        ed = self.essential_dofs
+        y[ed] = self.essential_value*x[ed]
+        return y.reshape(shape)
+
+    def __mul__(self, x):
+        return self.matvec(x)
+
+    def diagonal(self):
+        """Return the diagonal of A, e.g. for a Jacobi preconditioner"""
+        md = self.mesh_data
+        n = self.shape[0]
+        diag = np.zeros(n, dtype=np.complex128)
+        for start in range(0, md.num_cells, self.chunk_size):
+            cells = slice(start, start + self.chunk_size)
+            if self._element_matrices is not None:
+                el_mats = self._element_matrices[cells]
+            else:
+                el_mats = self._calc_element_matrices(cells)
+            diag += _accumulate(md.cell_edges[cells],
+                                np.diagonal(el_mats, axis1=1, axis2=2), n)
+        if self.abc:
+            diag += _accumulate(md.cell_edges[md.boundary_face_cells],
+                                np.diagonal(self._abc_matrices, axis1=1, axis2=2),
+                                n)
+        diag[self.essential_dofs] = self.essential_value
+        return diag
@@ -0,0 +1,161 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+"""Array based mesh connectivity and geometry for vectorised assembly"""
+from __future__ import division
+
+import numpy as np
+import dolfin
+
+from sucemfem.Utilities.Caching import get_cached
+from sucemfem.Assembly import nedelec1
+from sucemfem.Assembly.colouring import colour_elements
+
+# 7 point triangle quadrature rule of degree 5 (Radon). Barycentric
+# coordinates and weights normalised to a unit area triangle.
+_a = (6 - np.sqrt(15))/21
+_b = (6 + np.sqrt(15))/21
+triangle_quadrature_points = np.array(
+    [[1/3, 1/3, 1/3],
+     [_a, _a, 1 - 2*_a], [_a, 1 - 2*_a, _a], [1 - 2*_a, _a, _a],
+     [_b, _b, 1 - 2*_b], [_b, 1 - 2*_b, _b], [1 - 2*_b, _b, _b]])
+triangle_quadrature_weights = np.array(
+    [9/40] + [(155 - np.sqrt(15))/1200]*3 + [(155 + np.sqrt(15))/1200]*3)
+
+def get_cell_entities(mesh, dim):
+    """Return an (num_cells, n) array of the dim-entities of each cell
+
+    The entities are in UFC local order if the mesh is ordered.
+    """
+    D = mesh.topology().dim()
+    mesh.init(dim)
+    mesh.init(D, dim)
+    try:
+        entities = mesh.topology()(D, dim)()
+    except TypeError:
+        # Older dolfin python wrappers do not expose the full
+        # connectivity array
+        entities = [cell.entities(dim) for cell in dolfin.cells(mesh)]
+    return np.array(entities, dtype=np.int64).reshape(mesh.num_cells(), -1)
+
+def _unique_row_counts(rows):
+    """Return the number of times each row of the 2D array rows occurs"""
+    order = np.lexsort(rows.T[::-1])
+    sorted_rows = rows[order]
+    new_group = np.ones(len(rows), dtype=bool)
+    new_group[1:] = np.any(sorted_rows[1:] != sorted_rows[:-1], axis=1)
+    group_no = np.cumsum(new_group) - 1
+    counts = np.bincount(group_no)
+    row_counts = np.empty(len(rows), dtype=np.int64)
+    row_counts[order] = counts[group_no]
+    return row_counts
+
+class MeshData(object):
+    """Mesh connectivity and geometry as NumPy arrays
+
+    Use get_mesh_data() to obtain an instance cached with the mesh.
+    """
+    def __init__(self, mesh):
+        if not mesh.ordered():
+            raise ValueError('Mesh should be UFC ordered, call mesh.order()')
+        self.mesh = mesh
+        self.num_cells = mesh.num_cells()
+        self.coordinates = mesh.coordinates()
+        self.cells = np.array(mesh.cells(), dtype=np.int64)
+        self.cell_coords = self.coordinates[self.cells]
+        self.grads, self.volumes = nedelec1.cell_geometry(self.cell_coords)
+        self._init_cell_edges()
+        self._init_boundary_faces()
+        self._colourings = {}
+        self._csr_patterns = {}
+        self._boundary_quadrature = None
+
+    def _init_cell_edges(self):
+        self.cell_edges = get_cell_entities(self.mesh, 1)
+        self.num_edges = self.mesh.num_edges()
+
+    def _init_boundary_faces(self):
+        """Find exterior faces as (cell, local face number) pairs"""
+        face_vertices = np.sort(
+            self.cells[:, nedelec1.local_face_vertices], axis=2).reshape(-1, 3)
+        exterior = np.flatnonzero(_unique_row_counts(face_vertices) == 1)
+        self.boundary_face_cells = exterior // 4
+        self.boundary_face_numbers = exterior % 4
+        self.boundary_face_normals, self.boundary_face_areas = \
+            nedelec1.face_normals_areas(self.cell_coords[self.boundary_face_cells],
+                                        self.boundary_face_numbers)
+
+    def get_boundary_quadrature(self):
+        """Return quadrature points on the exterior faces, calculated once
+
+        Uses the degree 5 triangle rule triangle_quadrature_points on
+        each boundary face.
+
+        @return: (cells, points, normals, weights) -- the cell of each
+            point, the (n, 3) points, the (n, 3) outward unit normals and
+            the length n quadrature weights
+        """
+        if self._boundary_quadrature is None:
+            cells = self.boundary_face_cells
+            face_coords = self.cell_coords[
+                cells[:,np.newaxis],
+                nedelec1.local_face_vertices[self.boundary_face_numbers]]
+            points = np.einsum('qj,fjk->fqk', triangle_quadrature_points,
+                               face_coords).reshape(-1, 3)
+            no_qpts = len(triangle_quadrature_weights)
+            normals = np.repeat(self.boundary_face_normals, no_qpts, axis=0)
+            weights = (self.boundary_face_areas[:,np.newaxis]
+                       *triangle_quadrature_weights).ravel()
+            self._boundary_quadrature = (np.repeat(cells, no_qpts), points,
+                                         normals, weights)
+        return self._boundary_quadrature
+
+    def get_element_dofs(self, kernel):
+        """Return the (n, 6) global dofs of the elements of kernel
+
+        For the 'abc' kernel the elements are the boundary faces, each
+        represented by the dofs of its cell.
+        """
+        if kernel == 'abc':
+            return self.cell_edges[self.boundary_face_cells]
+        return self.cell_edges
+
+    def _get_element_type(self, kernel):
+        # All the volume kernels share the same elements
+        return 'boundary_faces' if kernel == 'abc' else 'cells'
+
+    def get_colouring(self, kernel):
+        """Return the element colouring for kernel, calculated once"""
+        el_type = self._get_element_type(kernel)
+        if el_type not in self._colourings:
+            self._colourings[el_type] = colour_elements(
+                self.get_element_dofs(kernel), self.num_edges)
+        return self._colourings[el_type]
+
+    def get_csr_pattern(self, kernel):
+        """Return the CSR sparsity pattern for kernel, calculated once"""
+        from sucemfem.Assembly.numpy_assembly import CSRPattern
+        el_type = self._get_element_type(kernel)
+        if el_type not in self._csr_patterns:
+            self._csr_patterns[el_type] = CSRPattern(
+                self.get_element_dofs(kernel), self.num_edges)
+        return self._csr_patterns[el_type]
+
+def get_mesh_data(mesh):
+    """Return MeshData for mesh, calculated once and cached with the mesh"""
+    return get_cached(mesh, 'assembly_mesh_data', MeshData)
@@ -0,0 +1,188 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+"""Batched element kernels for lowest order (Whitney) Nedelec elements
+
+All functions work on arrays of tetrahedra at once. Local edge and face
+numbering follows the UFC conventions used by dolfin, i.e. local edge i
+connects local vertices local_edge_vertices[i], and local face i is
+opposite local vertex i. Basis function i is
+
+    w_i = lambda_a grad(lambda_b) - lambda_b grad(lambda_a)
+
+with (a, b) = local_edge_vertices[i]. On a UFC ordered mesh (cell vertices
+sorted by global index) this matches the dolfin 'Nedelec 1st kind H(curl)'
+order 1 basis, including its orientation.
+
+This module has no dolfin dependency.
+"""
+from __future__ import division
+
+import numpy as np
+
+local_edge_vertices = np.array([[2,3], [1,3], [1,2], [0,3], [0,2], [0,1]])
+local_face_vertices = np.array([[1,2,3], [0,2,3], [0,1,3], [0,1,2]])
+# Local edges lying on each local face
+local_face_edges = np.array([[0,1,2], [0,3,4], [1,3,5], [2,4,5]])
+
+_ea, _eb = local_edge_vertices.T
+
+def is_nedelec_order1(function_space):
+    """Return True if function_space uses lowest order Nedelec elements
+
+    Objects without a UFL element, e.g. test stand-ins, are not lowest
+    order Nedelec spaces.
+    """
+    try:
+        element = function_space.ufl_element()
+        return (element.family() == 'Nedelec 1st kind H(curl)'
+                and element.degree() == 1)
+    except AttributeError:
+        return False
+
+def cell_geometry(cell_coords):
+    """Calculate barycentric coordinate gradients and volumes of tetrahedra
+
+    @param cell_coords: (n, 4, 3) array of cell vertex coordinates
+    @return: (grads, volumes) -- a (n, 4, 3) array with the gradients of the
+        4 barycentric coordinates of each cell, and a length n array of cell
+        volumes.
+    """
+    cell_coords = np.asarray(cell_coords, dtype=np.float64)
+    J = cell_coords[:,1:,:] - cell_coords[:,0:1,:]
+    grads = np.empty_like(cell_coords)
+    grads[:,1:,:] = np.linalg.inv(J).transpose(0,2,1)
+    grads[:,0,:] = -np.sum(grads[:,1:,:], axis=1)
+    volumes = np.abs(np.linalg.det(J))/6
+    return grads, volumes
+
+def barycentric_coordinates(cell_coords, grads, points):
+    """Calculate the barycentric coordinates of points in their cells
+
+    @param cell_coords: (n, 4, 3) array of cell vertex coordinates
+    @param grads: (n, 4, 3) barycentric gradients as from cell_geometry()
+    @param points: (n, 3) array, point i is evaluated in cell i
+    @return: (n, 4) array of barycentric coordinates
+    """
+    rel = np.asarray(points, dtype=np.float64) - cell_coords[:,0,:]
+    lam = np.empty((len(rel), 4), dtype=np.float64)
+    lam[:,1:] = np.einsum('nij,nj->ni', grads[:,1:,:], rel)
+    lam[:,0] = 1 - np.sum(lam[:,1:], axis=1)
+    return lam
+
+def _integrated_products(grads, volumes, denominator):
+    """Return the 6x6 integrals of w_i . w_j given barycentric moments
+
+    Uses int(lambda_p*lambda_q) = measure*(1 + delta_pq)/denominator, where
+    denominator is 20 for tetrahedra and 12 for triangles.
+    """
+    G = np.einsum('npk,nqk->npq', grads, grads)
+    L = (1 + np.eye(4))/denominator
+    ia, ib = _ea[:,np.newaxis], _eb[:,np.newaxis]
+    ja, jb = _ea[np.newaxis,:], _eb[np.newaxis,:]
+    mats = (L[ia,ja]*G[:,ib,jb] - L[ia,jb]*G[:,ib,ja]
+            - L[ib,ja]*G[:,ia,jb] + L[ib,jb]*G[:,ia,ja])
+    return mats*volumes[:,np.newaxis,np.newaxis]
+
+def mass_matrices(grads, volumes, weights=None):
+    """Calculate element mass matrices int(weight*w_i . w_j dV)
+
+    @param grads: (n, 4, 3) barycentric gradients as from cell_geometry()
+    @param volumes: length n array of cell volumes
+    @keyword weights: Optional length n array of constant per-cell weights,
+        e.g. eps_r
+    @return: (n, 6, 6) array of element matrices
+    """
+    if weights is not None:
+        volumes = volumes*weights
+    return _integrated_products(grads, volumes, 20)
+
+def curls(grads):
+    """Calculate the (constant) curls of the basis functions
+
+    curl(w_i) = 2 grad(lambda_a) x grad(lambda_b)
+
+    @return: (n, 6, 3) array
+    """
+    return 2*np.cross(grads[:,_ea,:], grads[:,_eb,:])
+
+def stiffness_matrices(grads, volumes, weights=None):
+    """Calculate element stiffness matrices int(weight*curl(w_i).curl(w_j) dV)
+
+    @param grads: (n, 4, 3) barycentric gradients as from cell_geometry()
+    @param volumes: length n array of cell volumes
+    @keyword weights: Optional length n array of constant per-cell weights,
+        e.g. 1/mu_r
+    @return: (n, 6, 6) array of element matrices
+    """
+    if weights is not None:
+        volumes = volumes*weights
+    c = curls(grads)
+    return np.einsum('nik,njk->nij', c, c)*volumes[:,np.newaxis,np.newaxis]
+
+def face_normals_areas(cell_coords, faces):
+    """Calculate outward unit normals and areas of tetrahedron faces
+
+    @param cell_coords: (n, 4, 3) array of cell vertex coordinates
+    @param faces: length n array of local face numbers
+    @return: (normals, areas) -- (n, 3) array and length n array
+    """
+    n = len(faces)
+    fv = cell_coords[np.arange(n)[:,np.newaxis], local_face_vertices[faces]]
+    normals = np.cross(fv[:,1] - fv[:,0], fv[:,2] - fv[:,0])
+    areas = np.sqrt(np.sum(normals**2, axis=1))
+    normals /= areas[:,np.newaxis]
+    # Orient normal away from the opposite vertex
+    inward = cell_coords[np.arange(n), faces] - fv[:,0]
+    normals[np.sum(normals*inward, axis=1) > 0] *= -1
+    return normals, areas/2
+
+def face_tangential_mass_matrices(grads, normals, areas, faces):
+    """Calculate int((n x w_i).(n x w_j) dS) over a face of each cell
+
+    This is the element matrix of the first order ABC boundary form. Only
+    the three edges on the face contribute, but full 6x6 element matrices
+    are returned so that they can be scattered with the cell dofs.
+
+    @param grads: (n, 4, 3) barycentric gradients of the cells
+    @param normals: (n, 3) face normals
+    @param areas: length n array of face areas
+    @param faces: length n array of local face numbers
+    @return: (n, 6, 6) array of element matrices
+    """
+    # Surface gradients: the tangential part of the 3D gradients equals the
+    # gradient of the face barycentric coordinates
+    grads_s = grads - np.einsum('npk,nk->np', grads, normals)[:,:,np.newaxis]\
+        *normals[:,np.newaxis,:]
+    mats = _integrated_products(grads_s, areas, 12)
+    # Zero rows/columns of edges that do not lie on the face
+    on_face = np.zeros((len(faces), 6), dtype=bool)
+    on_face[np.arange(len(faces))[:,np.newaxis], local_face_edges[faces]] = True
+    mask = on_face[:,:,np.newaxis] & on_face[:,np.newaxis,:]
+    mats[~mask] = 0
+    return mats
+
+def basis_values(grads, lam):
+    """Evaluate the basis functions at points given in barycentric coordinates
+
+    @param grads: (n, 4, 3) barycentric gradients of the cells
+    @param lam: (n, 4) barycentric coordinates of one point per cell
+    @return: (n, 6, 3) array of basis function values
+    """
+    return (lam[:,_ea,np.newaxis]*grads[:,_eb,:]
+            - lam[:,_eb,np.newaxis]*grads[:,_ea,:])
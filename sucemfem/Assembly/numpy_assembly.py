@@ -0,0 +1,172 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+"""Assemble lowest order Nedelec system matrices directly with NumPy
+
+The element matrices have closed forms for Whitney elements, so no form
+compilation or per-cell dispatch is needed. The global dof numbering is
+that of the dolfin 'Nedelec 1st kind H(curl)' order 1 function space,
+i.e. the global edge numbers of the mesh.
+"""
+from __future__ import division
+
+import numpy as np
+import scipy.sparse
+from multiprocessing.pool import ThreadPool
+
+from sucemfem.Assembly import nedelec1
+from sucemfem.Assembly.mesh_data import get_mesh_data
+
+def scatter_element_matrices(cell_dofs, element_matrices, n):
+    """Sum element matrices into a global n x n scipy CSR matrix
+
+    @param cell_dofs: (m, k) array of global dof numbers of each element
+    @param element_matrices: (m, k, k) array of element matrices
+    @param n: global matrix dimension
+    """
+    k = cell_dofs.shape[1]
+    rows = np.repeat(cell_dofs, k, axis=1).ravel()
+    cols = np.tile(cell_dofs, (1, k)).ravel()
+    # Duplicate entries are summed by the COO -> CSR conversion
+    return scipy.sparse.coo_matrix(
+        (element_matrices.ravel(), (rows, cols)), shape=(n, n)).tocsr()
+
+class CSRPattern(object):
+    """Sparsity pattern of a set of elements in CSR format
+
+    Also stores the position of every element matrix entry in the CSR data
+    array, so that element matrices can be summed into the data array
+    directly.
+    """
+    def __init__(self, cell_dofs, n):
+        self.n = n
+        k = cell_dofs.shape[1]
+        rows = np.repeat(cell_dofs, k, axis=1).ravel()
+        cols = np.tile(cell_dofs, (1, k)).ravel()
+        pattern = scipy.sparse.coo_matrix(
+            (np.ones(len(rows)), (rows, cols)), shape=(n, n)).tocsr()
+        pattern.sort_indices()
+        self.indptr, self.indices = pattern.indptr, pattern.indices
+        # Entries are sorted by (row, col) in CSR, so the position of
+        # each element entry can be found with a binary search
+        csr_rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.indptr))
+        csr_keys = csr_rows*n + self.indices
+        self.positions = np.searchsorted(
+            csr_keys, rows.astype(np.int64)*n + cols).reshape(-1, k, k)
+
+    def get_matrix(self, data):
+        """Return a CSR matrix with this pattern and data"""
+        return scipy.sparse.csr_matrix(
+            (data, self.indices, self.indptr), shape=(self.n, self.n))
+
+def apply_essential_csr(A, dofs, diagonal_value=1.):
+    """Apply essential boundary conditions to scipy matrix A
+
+    As with dolfin.DirichletBC.apply(), the rows of constrained dofs are
+    zeroed and a one (or diagonal_value) is placed on the diagonal.
+    """
+    if len(dofs) == 0:
+        return A
+    n = A.shape[0]
+    free = np.ones(n)
+    free[dofs] = 0
+    return (scipy.sparse.spdiags(free, 0, n, n)*A
+            + scipy.sparse.spdiags(diagonal_value*(1 - free), 0, n, n)).tocsr()
+
+class NedelecOneAssembler(object):
+    """Vectorised assembly of lowest order Nedelec matrices on a mesh"""
+
+    kernels = ('mass', 'stiffness', 'abc')
+
+    def __init__(self, mesh):
+        self.mesh_data = get_mesh_data(mesh)
+
+    def get_global_dimension(self):
+        return self.mesh_data.num_edges
+
+    def calc_element_matrices(self, kernel, weights=None, elements=None):
+        """Calculate element matrices and their global dofs for kernel
+
+        @param kernel: One of 'mass', 'stiffness' or 'abc'
+        @keyword weights: Optional per-cell weights, e.g. eps_r for the
+            mass kernel or 1/mu_r for the stiffness kernel
+        @keyword elements: Optional array of element numbers to calculate
+            the matrices of. All elements are calculated by default
+        @return: (cell_dofs, element_matrices)
+        """
+        md = self.mesh_data
+        if kernel not in self.kernels:
+            raise ValueError('Unknown element kernel %s' % kernel)
+        if elements is None:
+            elements = slice(None)
+        cell_dofs = md.get_element_dofs(kernel)[elements]
+        if kernel == 'abc':
+            fc = md.boundary_face_cells[elements]
+            return cell_dofs, nedelec1.face_tangential_mass_matrices(
+                md.grads[fc], md.boundary_face_normals[elements],
+                md.boundary_face_areas[elements],
+                md.boundary_face_numbers[elements])
+        if weights is not None:
+            weights = weights[elements]
+        kernel_fn = dict(mass=nedelec1.mass_matrices,
+                         stiffness=nedelec1.stiffness_matrices)[kernel]
+        return cell_dofs, kernel_fn(
+            md.grads[elements], md.volumes[elements], weights)
+
+    def assemble(self, kernel, weights=None, num_threads=1):
+        """Assemble kernel into a global scipy CSR matrix
+
+        @keyword num_threads: If larger than one, assemble concurrently
+            using a pool of num_threads threads. See assemble_threaded()
+        """
+        if num_threads > 1:
+            return self.assemble_threaded(kernel, weights, num_threads)
+        cell_dofs, element_matrices = self.calc_element_matrices(kernel, weights)
+        return scatter_element_matrices(
+            cell_dofs, element_matrices, self.get_global_dimension())
+
+    def assemble_threaded(self, kernel, weights=None, num_threads=2):
+        """Assemble kernel using a pool of threads
+
+        The elements are coloured so that elements of the same colour share
+        no dofs. For each colour the elements are divided between the
+        threads, and each thread calculates its element matrices and sums
+        them directly into the shared CSR data array. Since the elements
+        of one colour never write to the same matrix entry, no locking is
+        needed. The colouring and the CSR pattern are calculated once and
+        cached with the mesh data.
+        """
+        md = self.mesh_data
+        colours = md.get_colouring(kernel)
+        pattern = md.get_csr_pattern(kernel)
+        data = np.zeros(len(pattern.indices), dtype=np.float64)
+        def assemble_chunk(elements):
+            dofs, element_matrices = self.calc_element_matrices(
+                kernel, weights, elements)
+            # No duplicate positions within a colour, so fancy indexed
+            # addition is safe
+            data[pattern.positions[elements]] += element_matrices
+        pool = ThreadPool(num_threads)
+        try:
+            for elements in colours:
+                chunks = [c for c in np.array_split(elements, num_threads)
+                          if len(c)]
+                pool.map(assemble_chunk, chunks)
+        finally:
+            pool.close()
+        return pattern.get_matrix(data)
@@ -0,0 +1,44 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+from __future__ import division
+
+import unittest
+import numpy as np
+
+# Module under test
+from sucemfem.Assembly import colouring
+
+class test_colour_elements(unittest.TestCase):
+    def setUp(self):
+        rand = np.random.RandomState(1)
+        self.n_dofs = 400
+        self.element_dofs = np.array([rand.permutation(self.n_dofs)[:6]
+                                      for i in range(300)])
+
+    def test_colouring(self):
+        colours = colouring.colour_elements(self.element_dofs, self.n_dofs)
+        all_elements = np.sort(np.hstack(colours))
+        self.assertTrue(np.all(all_elements == np.arange(len(self.element_dofs))))
+        self.assertTrue(colouring.check_colouring(self.element_dofs, colours))
+
+    def test_check_colouring(self):
+        # Elements 0 and 1 share a dof
+        element_dofs = np.array([[0,1,2], [2,3,4], [5,6,7]])
+        self.assertFalse(colouring.check_colouring(element_dofs, [[0,1,2]]))
+        self.assertTrue(colouring.check_colouring(element_dofs, [[0,2], [1]]))
@@ -0,0 +1,63 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+from __future__ import division
+
+import unittest
+import numpy as np
+import dolfin
+
+from sucemfem.Assembly.numpy_assembly import NedelecOneAssembler
+from sucemfem.Assembly.numpy_assembly import apply_essential_csr
+# Module under test
+from sucemfem.Assembly.matrix_free import DrivenSystemOperator
+
+class test_DrivenSystemOperator(unittest.TestCase):
+    def setUp(self):
+        self.mesh = dolfin.UnitCube(2,2,2)
+        self.k0 = 3.1
+        num_cells = self.mesh.num_cells()
+        self.eps_r = 1 + np.random.rand(num_cells)
+        self.mu_r = 1 + np.random.rand(num_cells)
+        self.essential_dofs = np.array([0, 3, 11])
+        assembler = NedelecOneAssembler(self.mesh)
+        mats = [apply_essential_csr(assembler.assemble(kernel, weights),
+                                    self.essential_dofs)
+                for kernel, weights in (('mass', self.eps_r),
+                                        ('stiffness', 1/self.mu_r),
+                                        ('abc', None))]
+        M, S, S_0 = mats
+        self.A = S - self.k0**2*M + 1j*self.k0*S_0
+        n = self.A.shape[0]
+        self.x = np.random.rand(n) + 1j*np.random.rand(n)
+
+    def _get_DUT(self, cache_element_matrices):
+        return DrivenSystemOperator(
+            self.mesh, self.k0, self.eps_r, self.mu_r, self.essential_dofs,
+            cache_element_matrices=cache_element_matrices)
+
+    def test_matvec(self):
+        desired = self.A*self.x
+        for cache in (False, True):
+            DUT = self._get_DUT(cache)
+            self.assertTrue(np.allclose(DUT.matvec(self.x), desired))
+            self.assertTrue(np.allclose(DUT*self.x, desired))
+
+    def test_diagonal(self):
+        DUT = self._get_DUT(False)
+        self.assertTrue(np.allclose(DUT.diagonal(), self.A.diagonal()))
@@ -0,0 +1,114 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+from __future__ import division
+
+import unittest
+import numpy as np
+
+# Module under test
+from sucemfem.Assembly import nedelec1
+
+def random_tets(n):
+    """Random, positively oriented tetrahedra"""
+    coords = np.random.rand(n, 4, 3)
+    J = coords[:,1:,:] - coords[:,0:1,:]
+    flip = np.linalg.det(J) < 0
+    coords[flip, 1:3] = coords[flip, 2:0:-1]
+    return coords
+
+def tet_quadrature_points():
+    """Degree 2, 4 point rule on a tetrahedron in barycentric coordinates"""
+    a, b = 0.5854101966249685, 0.1381966011250105
+    lam = np.array([[a,b,b,b], [b,a,b,b], [b,b,a,b], [b,b,b,a]])
+    return lam, np.ones(4)/4
+
+class test_nedelec1_kernels(unittest.TestCase):
+    def setUp(self):
+        self.n = 5
+        self.coords = random_tets(self.n)
+        self.grads, self.volumes = nedelec1.cell_geometry(self.coords)
+
+    def test_barycentric_coordinates(self):
+        for i in range(4):
+            lam = nedelec1.barycentric_coordinates(
+                self.coords, self.grads, self.coords[:,i,:])
+            self.assertTrue(np.allclose(lam, np.eye(4)[i]))
+
+    def test_dofs(self):
+        # The tangential component of basis i integrated along edge j
+        # should be delta_ij
+        for j, (a, b) in enumerate(nedelec1.local_edge_vertices):
+            mid = (self.coords[:,a,:] + self.coords[:,b,:])/2
+            t = self.coords[:,b,:] - self.coords[:,a,:]
+            lam = nedelec1.barycentric_coordinates(self.coords, self.grads, mid)
+            vals = nedelec1.basis_values(self.grads, lam)
+            dofs = np.einsum('nik,nk->ni', vals, t)
+            self.assertTrue(np.allclose(dofs, np.eye(6)[j]))
+
+    def test_mass_matrices(self):
+        weights = np.random.rand(self.n)
+        actual = nedelec1.mass_matrices(self.grads, self.volumes, weights)
+        quad_lam, quad_w = tet_quadrature_points()
+        desired = np.zeros_like(actual)
+        for lam, w in zip(quad_lam, quad_w):
+            vals = nedelec1.basis_values(
+                self.grads, np.tile(lam, (self.n, 1)))
+            desired += w*np.einsum('nik,njk->nij', vals, vals)
+        desired *= (self.volumes*weights)[:,np.newaxis,np.newaxis]
+        self.assertTrue(np.allclose(actual, desired))
+
+    def test_curls(self):
+        # Compare with a finite difference curl at the cell centroid
+        h = 1e-6
+        centroid = np.mean(self.coords, axis=1)
+        def vals_at(pts):
+            lam = nedelec1.barycentric_coordinates(self.coords, self.grads, pts)
+            return nedelec1.basis_values(self.grads, lam)
+        jac = np.zeros((self.n, 6, 3, 3))
+        for k in range(3):
+            dx = np.zeros(3)
+            dx[k] = h
+            jac[:,:,:,k] = (vals_at(centroid + dx) - vals_at(centroid - dx))/2/h
+        desired = np.array([jac[:,:,2,1] - jac[:,:,1,2],
+                            jac[:,:,0,2] - jac[:,:,2,0],
+                            jac[:,:,1,0] - jac[:,:,0,1]]).transpose(1,2,0)
+        self.assertTrue(np.allclose(nedelec1.curls(self.grads), desired,
+                                    atol=1e-5))
+
+    def test_face_tangential_mass_matrices(self):
+        faces = np.random.randint(0, 4, self.n)
+        normals, areas = nedelec1.face_normals_areas(self.coords, faces)
+        actual = nedelec1.face_tangential_mass_matrices(
+            self.grads, normals, areas, faces)
+        # Degree 2 rule on a triangle, edge midpoints
+        desired = np.zeros_like(actual)
+        for i in range(self.n):
+            fv = nedelec1.local_face_vertices[faces[i]]
+            for p, q in ((0,1), (1,2), (0,2)):
+                lam = np.zeros((1,4))
+                lam[0, fv[p]] = lam[0, fv[q]] = 0.5
+                vals = nedelec1.basis_values(self.grads[i:i+1], lam)[0]
+                vals_t = np.cross(normals[i], vals)
+                desired[i] += areas[i]/3*np.dot(vals_t, vals_t.T)
+        self.assertTrue(np.allclose(actual, desired))
+        # Normals point away from the opposite vertex
+        opposite = self.coords[np.arange(self.n), faces]
+        centroid = np.mean(self.coords, axis=1)
+        self.assertTrue(np.all(np.sum((centroid - opposite)*normals, axis=1) > 0))
+        
@@ -0,0 +1,68 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+from __future__ import division
+
+import unittest
+import numpy as np
+import dolfin
+from dolfin import inner, dot, cross, curl, dx, ds
+
+from sucemfem.Utilities.Converters import dolfin_ublassparse_to_scipy_csr
+# Module under test
+from sucemfem.Assembly.numpy_assembly import NedelecOneAssembler
+
+class test_NedelecOneAssembler(unittest.TestCase):
+    def setUp(self):
+        self.mesh = dolfin.UnitCube(2,2,2)
+        self.mesh.coordinates()[:] *= [1., 2., 0.5]
+        self.V = dolfin.FunctionSpace(self.mesh, "Nedelec 1st kind H(curl)", 1)
+        self.u = dolfin.TrialFunction(self.V)
+        self.v = dolfin.TestFunction(self.V)
+        self.DUT = NedelecOneAssembler(self.mesh)
+
+    def _assemble_dolfin(self, form):
+        mat = dolfin.uBLASSparseMatrix()
+        dolfin.assemble(form, tensor=mat)
+        return dolfin_ublassparse_to_scipy_csr(mat).todense()
+
+    def test_global_dimension(self):
+        self.assertEqual(self.DUT.get_global_dimension(), self.V.dim())
+
+    def test_mass(self):
+        desired = self._assemble_dolfin(inner(self.v, self.u)*dx)
+        actual = self.DUT.assemble('mass').todense()
+        self.assertTrue(np.allclose(actual, desired, rtol=1e-10, atol=1e-14))
+
+    def test_stiffness(self):
+        desired = self._assemble_dolfin(dot(curl(self.v), curl(self.u))*dx)
+        actual = self.DUT.assemble('stiffness').todense()
+        self.assertTrue(np.allclose(actual, desired, rtol=1e-10, atol=1e-14))
+
+    def test_abc(self):
+        n = self.V.cell().n
+        desired = self._assemble_dolfin(
+            inner(cross(n, self.v), cross(n, self.u))*ds)
+        actual = self.DUT.assemble('abc').todense()
+        self.assertTrue(np.allclose(actual, desired, rtol=1e-10, atol=1e-14))
+
+    def test_threaded(self):
+        for kernel in NedelecOneAssembler.kernels:
+            desired = self.DUT.assemble(kernel).todense()
+            actual = self.DUT.assemble(kernel, num_threads=3).todense()
+            self.assertTrue(np.allclose(actual, desired, rtol=1e-12, atol=1e-15))
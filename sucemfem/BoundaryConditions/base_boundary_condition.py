@@ -19,6 +19,7 @@
 # Authors:
 # Neilen Marais <nmarais@gmail.com>
 # Evan Lezar <mail@evanlezar.com>
+import numpy as np
 from sucemfem import Forms
 
 class BoundaryCondition(object):
@@ -83,6 +84,17 @@ class BoundaryCondition(object):
         """
         return lambda x: None
 
+    def get_essential_dofs(self, function_space=None):
+        """Return the indices of the dofs constrained by the boundary condition
+
+        @keyword function_space: An optional dolfin function space to use for
+            constructing the essential boundary condition. If None is
+            specified, the function space stored in self is used.
+        @return: An array of dof numbers. Empty for boundary conditions
+            without an essential component.
+        """
+        return np.array([], dtype=np.int64)
+
     def get_linear_form(self, test_function=None):
         """Return boundary condition's  linear form contribution as a dolfin form
 
@@ -19,6 +19,7 @@
 # Authors:
 # Neilen Marais <nmarais@gmail.com>
 from __future__ import division
+import numpy as np
 from sucemfem import Forms
 
 
@@ -41,6 +42,15 @@ class BoundaryConditions(object):
             if b: apply_fn(A, b)
             else: apply_fn(A)
 
+    def get_essential_dofs(self):
+        """
+        Get the dofs constrained by all the essential boundary conditions
+        """
+        dofs = np.array([], dtype=np.int64)
+        for bc_num, bc in self.boundary_conditions.items():
+            dofs = np.union1d(dofs, bc.get_essential_dofs())
+        return dofs
+
     def get_linear_form(self):
         """Get boundary conditions contribution to RHS linear form
         """
@@ -20,6 +20,7 @@
 # Neilen Marais <nmarais@gmail.com>
 # Evan Lezar <mail@evanlezar.com>
 from __future__ import division
+import numpy as np
 import dolfin
 from sucemfem.BoundaryConditions import BoundaryCondition
 
@@ -80,6 +81,22 @@ class EssentialBoundaryCondition(BoundaryCondition):
                                                self.region_number)
         return self._dirichletBC.apply
 
+    def get_essential_dofs(self, function_space=None):
+        """Return the indices of the dofs constrained by the boundary condition
+
+        See parent class documentation for more details
+        """
+        if function_space is not None: self.set_function_space ( function_space )
+        V = self.function_space
+        zero = dolfin.Constant((0.,)*V.mesh().geometry().dim())
+        bc = dolfin.DirichletBC(V, zero, self.mesh_function, self.region_number)
+        # Constrained dofs are set to zero when the BC is applied to a
+        # vector of ones
+        marker = dolfin.Vector(V.dim())
+        marker[:] = 1.
+        bc.apply(marker)
+        return np.flatnonzero(marker.array() == 0)
+
 class PECWallsBoundaryCondition ( EssentialBoundaryCondition ):
     """A class for an essential boundary condition that models PEC walls
     """
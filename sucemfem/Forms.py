@@ -84,6 +84,18 @@ class EMGalerkinInteriorForms(GalerkinInteriorForms):
         s = dot(curl(v), curl(u))/mu_r*dx
         return s
 
+    def get_weighted_mass_form(self, weight):
+        """Get mass form with the material replaced by weight"""
+        u = self.trial_function
+        v = self.test_function
+        return weight*inner(v, u)*dx
+
+    def get_weighted_stiffness_form(self, weight):
+        """Get stiffness form with the inverse material replaced by weight"""
+        u = self.trial_function
+        v = self.test_function
+        return weight*dot(curl(v), curl(u))*dx
+
 
 class CombineGalerkinForms(object):
     """Base class for problem-specific form combination logic"""
@@ -115,3 +127,24 @@ class CombineGalerkinForms(object):
         """
         raise NotImplementedError("Use a concrete class")
 
+    def get_kernels(self):
+        """Get the element kernel names corresponding to get_forms()
+
+        Used by the NumPy assembly backend in place of the forms. Only
+        the standard 'mass', 'stiffness' and first order ABC ('abc')
+        kernels are available. A kernel name of None indicates a null
+        form.
+
+        @raise NotImplementedError: If the sub-class does not support
+            NumPy assembly.
+        @return: The kernel names for the various matrices.
+            eg: {'M': 'mass'; 'ABC': 'abc'}
+        """
+        raise NotImplementedError("Use a concrete class")
+
+    def _get_boundary_kernel(self):
+        """Kernel name of the boundary conditions' bilinear form"""
+        if isinstance(self.boundary_conditions.get_bilinear_form(), NullForm):
+            return None
+        return 'abc'
+
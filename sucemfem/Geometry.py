@@ -20,8 +20,12 @@
 # Neilen Marais <nmarais@gmail.com>
 from __future__ import division
 
+import numpy as np
 import dolfin
 
+from sucemfem.Utilities.Caching import get_cached
+from sucemfem.Assembly.nedelec1 import cell_geometry, barycentric_coordinates
+
 class EnsureInitialised(object):
     """Ensures that a dolfin.mesh object connectivity info is initialised"""
     dim_entity_map = {
@@ -102,5 +106,174 @@ class CellsConnected2Edges(object):
         for edge in dolfin.SubsetIterator(self.boundary_edgefun,
                                           self.boundary_value):
             cell_array[edge.entities(3)] = value
-         
 
+
+class CellLocator(object):
+    """Locate the cells containing a batch of points
+
+    A KD-tree of the cell centroids is built once. For each point the
+    cells with the nearest centroids are tested using barycentric
+    coordinates. Points that are not found among max_neighbours
+    candidates are tested against all the cells. Use get_cell_locator()
+    to obtain an instance cached with the mesh.
+    """
+    initial_neighbours = 8
+    max_neighbours = 64
+    # Barycentric coordinate tolerance for points on cell boundaries
+    tolerance = 1e-10
+
+    def __init__(self, mesh):
+        import scipy.spatial
+        coordinates = mesh.coordinates()
+        cells = np.array(mesh.cells(), dtype=np.int64)
+        self.cell_coords = coordinates[cells]
+        self.grads, volumes = cell_geometry(self.cell_coords)
+        self.tree = scipy.spatial.cKDTree(np.mean(self.cell_coords, axis=1))
+        self.bounding_box = (np.min(coordinates, axis=0),
+                             np.max(coordinates, axis=0))
+
+    def _test_candidates(self, points, candidates):
+        """Return a mask of the points lying in their candidate cells"""
+        lam = barycentric_coordinates(self.cell_coords[candidates],
+                                      self.grads[candidates], points)
+        return np.all(lam >= -self.tolerance, axis=1)
+
+    def _locate_exhaustive(self, point):
+        lam_rest = np.einsum('nij,nj->ni', self.grads[:,1:,:],
+                             point - self.cell_coords[:,0,:])
+        lam_0 = 1 - np.sum(lam_rest, axis=1)
+        inside = ((lam_0 >= -self.tolerance)
+                  & np.all(lam_rest >= -self.tolerance, axis=1))
+        found = np.flatnonzero(inside)
+        return found[0] if len(found) > 0 else -1
+
+    def locate(self, points):
+        """Find the cells containing points
+
+        Points on a boundary between cells are assigned to any one of the
+        cells.
+
+        @param points: (N, 3) array of point coordinates
+        @return: length N array of cell indices, -1 for points outside
+            the mesh
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        cell_indices = -np.ones(len(points), dtype=np.int64)
+        bb_min, bb_max = self.bounding_box
+        todo = np.flatnonzero(np.all((points >= bb_min - self.tolerance)
+                                     & (points <= bb_max + self.tolerance),
+                                     axis=1))
+        num_cells = len(self.cell_coords)
+        checked = 0
+        k = min(self.initial_neighbours, num_cells)
+        while len(todo) > 0 and checked < k:
+            dist, candidates = self.tree.query(points[todo], k)
+            candidates = candidates.reshape(len(todo), -1)
+            for j in range(checked, k):
+                inside = self._test_candidates(points[todo], candidates[:,j])
+                cell_indices[todo[inside]] = candidates[inside, j]
+                todo = todo[~inside]
+                candidates = candidates[~inside]
+                if len(todo) == 0:
+                    break
+            checked = k
+            k = min(4*k, self.max_neighbours, num_cells)
+        for i in todo:
+            cell_indices[i] = self._locate_exhaustive(points[i])
+        return cell_indices
+
+    def _get_cell_bounding_boxes(self):
+        if not hasattr(self, '_cell_bounding_boxes'):
+            self._cell_bounding_boxes = (np.min(self.cell_coords, axis=1),
+                                         np.max(self.cell_coords, axis=1))
+        return self._cell_bounding_boxes
+
+    def clip_segment(self, start, end):
+        """Split the line segment from start to end into per-cell pieces
+
+        The segment is parametrised as start + t*(end - start), 0 <= t <= 1.
+        The pieces do not overlap: where the segment runs along a face or
+        edge shared by several cells it is assigned to only one of them.
+        Parts of the segment outside the mesh are not covered.
+
+        @param start: length 3 array with the segment start point
+        @param end: length 3 array with the segment end point
+        @return: (cell_indices, t_start, t_end) -- arrays with the cell and
+            parameter interval of each piece, sorted by t_start
+        """
+        start = np.asarray(start, dtype=np.float64)
+        delta = np.asarray(end, dtype=np.float64) - start
+        tol = self.tolerance
+        cell_min, cell_max = self._get_cell_bounding_boxes()
+        seg_min = np.minimum(start, start + delta) - tol
+        seg_max = np.maximum(start, start + delta) + tol
+        candidates = np.flatnonzero(np.all((cell_max >= seg_min)
+                                           & (cell_min <= seg_max), axis=1))
+        # The barycentric coordinates are affine along the segment,
+        # lam(t) = lam_start + t*slope, and the segment is inside a cell
+        # where all four are non-negative.
+        lam_start = barycentric_coordinates(
+            self.cell_coords[candidates], self.grads[candidates],
+            np.tile(start, (len(candidates), 1))) + tol
+        slope = np.einsum('nik,k->ni', self.grads[candidates], delta)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t_cross = -lam_start/slope
+        t_lo = np.max(np.where(slope > 0, t_cross, 0), axis=1)
+        t_hi = np.min(np.where(slope < 0, t_cross, 1), axis=1)
+        t_lo = np.maximum(t_lo, 0)
+        t_hi = np.minimum(t_hi, 1)
+        # Cells with a coordinate that is constant and negative along the
+        # segment do not intersect it
+        outside = np.any((slope == 0) & (lam_start < 0), axis=1)
+        keep = (t_hi > t_lo) & ~outside
+        cell_indices, t_lo, t_hi = candidates[keep], t_lo[keep], t_hi[keep]
+        order = np.argsort(t_lo, kind='mergesort')
+        cell_indices, t_lo, t_hi = cell_indices[order], t_lo[order], t_hi[order]
+        # Remove overlaps by starting each piece where the previous ones end
+        if len(t_hi) > 0:
+            covered = np.maximum.accumulate(t_hi)
+            t_lo[1:] = np.maximum(t_lo[1:], covered[:-1])
+        keep = t_hi > t_lo
+        return cell_indices[keep], t_lo[keep], t_hi[keep]
+
+def get_cell_locator(mesh):
+    """Return a CellLocator for mesh, built once and cached with the mesh"""
+    return get_cached(mesh, 'cell_locator', CellLocator)
+
+def get_segment_quadrature_points(V):
+    """Return the number of segment quadrature points per cell needed for V
+
+    The basis functions are polynomials of degree equal to the basis
+    order, and n point Gauss-Legendre quadrature is exact up to degree
+    2n - 1, see L{get_segment_quadrature}.
+    """
+    return V.ufl_element().degree()//2 + 1
+
+def get_segment_quadrature(mesh, start, end, no_points):
+    """Return a quadrature rule along a line segment, split at cell faces
+
+    The segment is clipped against the mesh cells, and no_points point
+    Gauss-Legendre quadrature is used on the piece in each cell, so that
+    polynomials of degree 2*no_points - 1 within each cell are integrated
+    exactly. Parts of the segment outside the mesh are not covered, in
+    which case the weights sum to less than the segment length.
+
+    @param mesh: dolfin Mesh object
+    @param start: length 3 array with the segment start point
+    @param end: length 3 array with the segment end point
+    @param no_points: number of quadrature points per cell
+    @return: (cell_indices, points, weights) -- the cell of each point,
+        (N,3) array of point coordinates and the weights, scaled by the
+        segment length
+    """
+    start = np.asarray(start, dtype=np.float64)
+    delta = np.asarray(end, dtype=np.float64) - start
+    cell_indices, t_start, t_end = get_cell_locator(mesh).clip_segment(
+        start, start + delta)
+    xi, w = np.polynomial.legendre.leggauss(no_points)
+    half_len = (t_end - t_start)/2
+    t_mid = (t_end + t_start)/2
+    t = (t_mid[:,np.newaxis] + half_len[:,np.newaxis]*xi).ravel()
+    weights = (half_len[:,np.newaxis]*w).ravel()*np.sqrt(np.sum(delta**2))
+    points = start + t[:,np.newaxis]*delta
+    return np.repeat(cell_indices, no_points), points, weights
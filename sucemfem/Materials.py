@@ -22,11 +22,89 @@ from __future__ import division
 
 import numpy 
 from sucemfem import Consts
+from sucemfem.Utilities.Caching import get_cached
 import dolfin
 
 mu0 = Consts.mu0
 eps0 = Consts.eps0
 
+class DispersionModel(object):
+    """Base class for frequency dependent relative material parameters
+
+    Instances can be used in place of a numeric eps_r or mu_r value of a
+    material region. The exp(j*omega*t) time convention is used, so lossy
+    materials have negative imaginary parts.
+
+    Dispersive regions are assembled with nominal_value as their material
+    parameter. The difference between the actual and nominal values is
+    added for every frequency using separately assembled region matrices,
+    see L{ProblemConfigurations.EMDrivenProblem.DrivenProblemABC}.
+    """
+    nominal_value = 1.
+
+    def __call__(self, frequency):
+        """Return the complex relative parameter value at frequency in Hz"""
+        raise NotImplementedError("Use a concrete class")
+
+class DebyeModel(DispersionModel):
+    """Debye relaxation: eps_inf + (eps_s - eps_inf)/(1 + j*omega*tau)"""
+    def __init__(self, eps_inf, eps_s, tau):
+        """
+        @param eps_inf: High frequency relative value
+        @param eps_s: Static relative value
+        @param tau: Relaxation time in seconds
+        """
+        self.eps_inf = eps_inf
+        self.eps_s = eps_s
+        self.tau = tau
+
+    def __call__(self, frequency):
+        omega = 2*numpy.pi*frequency
+        return self.eps_inf + (self.eps_s - self.eps_inf)/(1 + 1j*omega*self.tau)
+
+class LorentzModel(DispersionModel):
+    """Lorentz resonance:
+    eps_inf + delta_eps*omega_0**2/(omega_0**2 - omega**2 + j*omega*gamma)
+    """
+    def __init__(self, eps_inf, delta_eps, resonant_frequency, gamma):
+        """
+        @param eps_inf: High frequency relative value
+        @param delta_eps: Static minus high frequency relative value
+        @param resonant_frequency: Resonant frequency omega_0/(2*pi) in Hz
+        @param gamma: Damping coefficient in rad/s
+        """
+        self.eps_inf = eps_inf
+        self.delta_eps = delta_eps
+        self.resonant_frequency = resonant_frequency
+        self.gamma = gamma
+
+    def __call__(self, frequency):
+        omega = 2*numpy.pi*frequency
+        omega_0 = 2*numpy.pi*self.resonant_frequency
+        return self.eps_inf + self.delta_eps*omega_0**2/(
+            omega_0**2 - omega**2 + 1j*omega*self.gamma)
+
+class DrudeModel(DispersionModel):
+    """Drude model: eps_inf - omega_p**2/(omega**2 - j*omega*gamma)"""
+    def __init__(self, eps_inf, plasma_frequency, gamma):
+        """
+        @param eps_inf: High frequency relative value
+        @param plasma_frequency: Plasma frequency omega_p/(2*pi) in Hz
+        @param gamma: Collision frequency in rad/s
+        """
+        self.eps_inf = eps_inf
+        self.plasma_frequency = plasma_frequency
+        self.gamma = gamma
+
+    def __call__(self, frequency):
+        omega = 2*numpy.pi*frequency
+        omega_p = 2*numpy.pi*self.plasma_frequency
+        return self.eps_inf - omega_p**2/(omega**2 - 1j*omega*self.gamma)
+
+def is_dispersive(value):
+    """Return True if value is a frequency dependent material parameter"""
+    return isinstance(value, DispersionModel)
+
 class MaterialProperties(object):
     allowed_properties_defaults = {'eps_r':1.0, 'mu_r':1.0}
 
@@ -52,6 +130,17 @@ class MaterialProperties(object):
     def get_mu_r(self):
         return self.mu_r
 
+    def is_dispersive(self, pname):
+        """Return True if property pname is frequency dependent"""
+        return is_dispersive(getattr(self, pname))
+
+    def get_value_at(self, pname, frequency):
+        """Return the value of property pname at frequency in Hz"""
+        value = getattr(self, pname)
+        if is_dispersive(value):
+            value = value(frequency)
+        return value
+
     def get_mu_r_inv(self):
         return 1/self.get_mu_r()
 
@@ -107,17 +196,41 @@ class MaterialFunctionFactory(object):
             material functions will be defined on this mesh
         """
         self.region_material_properties = region_material_properties
-        # if the meshfunction is not defined then initialise to a zero mesh function
-        if region_meshfunction is None:
-            region_meshfunction = dolfin.MeshFunction (
-                'uint', mesh, mesh.topology().dim() )
-            region_meshfunction.set_all (0)
         self.region_meshfunction = region_meshfunction
         self.mesh = mesh
+        self._region_lookup = None
+
+    def _get_region_lookup(self):
+        """Return (region_nos, cell_region_indices) for the mesh cells
+
+        region_nos is the sorted array of unique region numbers present
+        in the mesh, and region_nos[cell_region_indices] the region number
+        of each cell. If no region meshfunction was set, all cells are in
+        region 0 and cell_region_indices is None.
+        """
+        if self._region_lookup is None:
+            if self.region_meshfunction is None:
+                self._region_lookup = (numpy.array([0]), None)
+            else:
+                self._region_lookup = numpy.unique(
+                    self.region_meshfunction.array(), return_inverse=True)
+        return self._region_lookup
+
+    def _get_function_space(self):
+        # Lowest order discontinuous Galerkin space gives you
+        # element-wise constant functions, which is how material
+        # properties are defined. It is shared by all properties.
+        return get_cached(self.mesh, 'material_function_space',
+                          lambda mesh: dolfin.FunctionSpace(mesh, 'DG', 0))
 
     def get_material_functions(self, *property_names):
         """Return material functions for the requested properties
 
+        Each property value is looked up once per region, and then
+        broadcast to the cells with a single vectorised take. If the mesh
+        contains only one region a dolfin Constant is returned instead of
+        a DG0 Function.
+
         @param property_names: A sequence of property names for which to
             calculate material functions
         
@@ -125,27 +238,64 @@ class MaterialFunctionFactory(object):
             region_material_properties objects passed to the class
             constructor
 
+        Dispersive properties get their nominal value, see
+        L{DispersionModel}.
+
         @return: a dict with elements {property_name:property_value_function}
         """
         
         mat_fns = {}
-        # Lowest order discontinuous Galerkin space gives you
-        # element-wise constant functions, which is how material
-        # properties are defined.
-        mat_funcspace = dolfin.FunctionSpace(self.mesh, 'DG', 0)
-        region_meshfn = self.region_meshfunction
+        region_nos, cell_region_indices = self._get_region_lookup()
         mats = self.region_material_properties
         for pname in property_names:
-            valfunc = 'get_'+pname
-            # Simple dictionary of region number to value for property pname
-            region_valuemap = dict((k, getattr(mat, valfunc)())
-                                   for k, mat in mats.items())
-            matfn = dolfin.Function(mat_funcspace)
             try:
-                matfn.vector()[:] = numpy.array([region_valuemap[int(i)]
-                                                 for i in region_meshfn.array()])
+                region_values = numpy.array(
+                    [self._get_static_value(mats[int(k)], pname)
+                     for k in region_nos])
             except KeyError, s:
                 raise ValueError('Material number %d not found' % s.args[0])
+            if len(region_nos) == 1:
+                mat_fns[pname] = dolfin.Constant(region_values[0])
+                continue
+            matfn = dolfin.Function(self._get_function_space())
+            matfn.vector()[:] = numpy.take(region_values, cell_region_indices)
             mat_fns[pname] = matfn
         return mat_fns
-        
+
+    def _get_static_value(self, material_properties, pname):
+        value = getattr(material_properties, 'get_'+pname)()
+        if is_dispersive(value):
+            value = value.nominal_value
+        return value
+
+    def get_dispersive_regions(self, pname):
+        """Return the numbers of mesh regions where pname is dispersive"""
+        region_nos, cell_region_indices = self._get_region_lookup()
+        mats = self.region_material_properties
+        return [int(k) for k in region_nos
+                if int(k) in mats and mats[int(k)].is_dispersive(pname)]
+
+    def get_region_indicator(self, region_no):
+        """Return a DG0 function that is one in region_no and zero elsewhere"""
+        region_nos, cell_region_indices = self._get_region_lookup()
+        indfn = dolfin.Function(self._get_function_space())
+        if cell_region_indices is None:
+            indfn.vector()[:] = float(region_no == region_nos[0])
+        else:
+            region_index = numpy.searchsorted(region_nos, region_no)
+            indfn.vector()[:] = numpy.float64(
+                cell_region_indices == region_index)
+        return indfn
+
+def get_cell_values(material_function, num_cells):
+    """Return the per-cell values of an element-wise constant material function
+
+    @param material_function: DG0 dolfin Function or a dolfin Constant
+    @param num_cells: Number of mesh cells
+    @return: A length num_cells array
+    """
+    try:
+        # DG0 dofs are numbered in cell order
+        return material_function.vector().array()
+    except AttributeError:
+        return numpy.ones(num_cells)*float(material_function)
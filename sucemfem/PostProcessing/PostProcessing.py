@@ -21,12 +21,20 @@
 import dolfin
 import numpy as N
 from dolfin import dx, dot, curl
+from sucemfem.Geometry import get_cell_locator
+from sucemfem.Sources.point_source import evaluate_basis
+from sucemfem.Sources.point_source import get_point_testing_matrix
+from sucemfem.PostProcessing.complex_field import ComplexField
 
-__all__ = ['Reconstruct', 'CalcEMFunctional']
+__all__ = ['Reconstruct', 'PointEvaluationOperator', 'CalcEMFunctional',
+           'ComplexField']
 
 class Reconstruct(object):
     """Reconstruct field values, dealing with complex numbers as required"""
 
+    chunk_size = 10000
+    """Number of points that are reconstructed in one batch"""
+
     def __init__(self, function_space):
         """Initialise reconstruction for dolfin FunctionSpace object function_space"""
         self.function_space = function_space
@@ -35,29 +43,151 @@ class Reconstruct(object):
         """Set dof values x as numpy.array"""
         self.dof_values = x
 
-    def reconstruct_points(self, points):
+    def reconstruct_points(self, points, chunk_size=None):
         """Reconstruct function at points
 
-        Where points is an n x d array for a d-dimensional function
+        Where points is an n x 3 array of points in a tetrahedral mesh.
+        The points are processed in batches of at most chunk_size points
+        to bound the memory used, see L{reconstruct_chunks}.
+
+        @keyword chunk_size: (optional) number of points per batch, the
+            class attribute chunk_size is used by default
+        @return: n x d array of values of the d-dimensional function
+        """
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+        points = N.asarray(points, dtype=N.float64)
+        chunks = (points[i:i+chunk_size]
+                  for i in range(0, len(points), chunk_size))
+        values = list(self.reconstruct_chunks(chunks))
+        if len(values) == 0:
+            return N.zeros((0, self.get_value_dimension()),
+                           dtype=N.asarray(self.dof_values).dtype)
+        return N.vstack(values)
+
+    def get_value_dimension(self):
+        """Return the dimension of the function values"""
+        return self.function_space.dolfin_element().value_dimension(0)
+
+    def get_evaluation_operator(self, points):
+        """Return a L{PointEvaluationOperator} for points
+
+        Use this when the same points are sampled for many dof vectors,
+        e.g. over a frequency sweep or for many excitations.
         """
-        u = dolfin.Function(self.function_space)
-        # N.require() to make sure that the array is continuous.
-        u.vector()[:] = N.require(N.real(self.dof_values), requirements='C')
-        finite_element = self.function_space.dolfin_element()
-        bf_value_dimension = finite_element.value_dimension(0)
-        values_re = N.zeros((len(points), bf_value_dimension), dtype=N.float64)
-        values = values_re
-        for i, fp in enumerate(points):
-            values_re[i,:] = u(fp) 
-        # Add imaginary part, if any
-        if N.any(N.iscomplex(self.dof_values)):
-            values_im = N.zeros_like(values_re)
-            for i, fp in enumerate(points):
-                u.vector()[:] = N.require(N.imag(self.dof_values), requirements='C')
-                values_im[i,:] = u(fp)
-            values = values_re + 1j*values_im
-                
-        return values
+        return PointEvaluationOperator.from_function_space(
+            self.function_space, points)
+
+    def reconstruct_chunks(self, point_chunks):
+        """Reconstruct the function for an iterable of point arrays
+
+        A generator yielding the reconstructed values of each chunk in
+        turn, so that very large point sets can be processed without
+        holding all the points or values in memory. All the points of a
+        chunk are located in one pass using the cell locator cached with
+        the mesh and the real and imaginary parts are evaluated together.
+        For lowest order Nedelec elements the basis functions of a chunk
+        are tabulated in bulk using their closed form. Other elements of
+        any value dimension tabulate the dofs once per cell, but evaluate
+        the basis functions point by point through the dolfin element.
+
+        @param point_chunks: iterable of n x 3 arrays of points
+        @return: generator of n x d arrays of values of the d-dimensional
+            function
+        """
+        V = self.function_space
+        if V.mesh().geometry().dim() != 3:
+            raise NotImplementedError(
+                'Reconstruction is only implemented for 3D tetrahedral meshes')
+        locator = get_cell_locator(V.mesh())
+        x = N.asarray(self.dof_values)
+        for points in point_chunks:
+            points = N.asarray(points, dtype=N.float64).reshape(-1, 3)
+            cell_indices = locator.locate(points)
+            if N.any(cell_indices < 0):
+                raise ValueError('Point(s) outside the mesh: %s' %
+                                 points[cell_indices < 0])
+            dofnos, basis_vals = evaluate_basis(V, cell_indices, points)
+            yield N.einsum('nik,ni->nk', basis_vals, x[dofnos])
+
+class PointEvaluationOperator(object):
+    """Precomputed sparse operator evaluating fields at a fixed set of points
+
+    The points are located and the basis functions tabulated once when
+    the operator is set up. Reconstructing the field of any dof vector
+    on the same function space is then a single sparse matrix-vector
+    product. The operator can be saved to and loaded from a file so that
+    probe points can be reused in later sessions without access to the
+    mesh.
+    """
+
+    def __init__(self, matrix, points):
+        """Initialise from a precomputed evaluation matrix
+
+        Use L{from_function_space} or L{load} to construct an operator.
+
+        @param matrix: scipy.sparse.csr_matrix of shape (3*n_points, n_dofs)
+        @param points: (n_points, 3) array of the evaluation points
+        """
+        self.matrix = matrix.tocsr()
+        self.points = N.asarray(points, dtype=N.float64).reshape(-1, 3)
+        assert(self.matrix.shape[0] == 3*len(self.points))
+
+    @classmethod
+    def from_function_space(cls, function_space, points):
+        """Set up the operator for points on dolfin FunctionSpace object
+
+        @param function_space: dolfin FunctionSpace object
+        @param points: (n_points, 3) array of points inside the mesh
+        """
+        points = N.asarray(points, dtype=N.float64).reshape(-1, 3)
+        cell_indices = get_cell_locator(function_space.mesh()).locate(points)
+        if N.any(cell_indices < 0):
+            raise ValueError('Point(s) outside the mesh: %s' %
+                             points[cell_indices < 0])
+        P = get_point_testing_matrix(function_space, cell_indices, points)
+        return cls(P.T.tocsr(), points)
+
+    def get_no_points(self):
+        return len(self.points)
+
+    def get_no_dofs(self):
+        return self.matrix.shape[1]
+
+    def apply(self, dof_values):
+        """Evaluate the field of dof_values at the operator points
+
+        @param dof_values: length n_dofs array, or (n_dofs, m) array with
+            m solution vectors in its columns
+        @return: (n_points, 3) array of field values, or
+            (n_points, 3, m) array for a block of solutions
+        """
+        x = N.asarray(dof_values)
+        if x.shape[0] != self.get_no_dofs():
+            raise ValueError('Expected %d dofs, got %d' %
+                             (self.get_no_dofs(), x.shape[0]))
+        values = self.matrix*x
+        return values.reshape((self.get_no_points(), 3) + x.shape[1:])
+
+    def save(self, filename):
+        """Save the operator to a numpy .npz file"""
+        M = self.matrix
+        N.savez(filename, data=M.data, indices=M.indices, indptr=M.indptr,
+                shape=N.array(M.shape), points=self.points)
+
+    @classmethod
+    def load(cls, filename):
+        """Load an operator saved with L{save}"""
+        import scipy.sparse
+        f = N.load(filename)
+        try:
+            matrix = scipy.sparse.csr_matrix(
+                (f['data'], f['indices'], f['indptr']),
+                shape=tuple(f['shape']))
+            points = f['points']
+        finally:
+            f.close()
+        return cls(matrix, points)
 
 class CalcEMFunctional(object):
     """Evaluate EM functional, assuming freespace
@@ -74,8 +204,7 @@ class CalcEMFunctional(object):
         else:
             self.testing_space = testing_space
         Vt = self.testing_space
-        self.E_r = dolfin.Function(V)
-        self.E_i = dolfin.Function(V)
+        self.E_field = ComplexField(V)
         self.g_r = dolfin.Function(Vt)
         self.g_i = dolfin.Function(Vt)
         self.dx = dx
@@ -134,7 +263,8 @@ class CalcEMFunctional(object):
 
     def _get_forms(self):
         if self.dirty:
-            E_r, E_i, g_r, g_i = self.E_r, self.E_i, self.g_r, self.g_i
+            E_r, E_i = self.E_field.get_functions()
+            g_r, g_i = self.g_r, self.g_i
             k0 = self.k0
             eps_r = self._get_epsr_function()
             mu_r = self._get_mur_function()
@@ -148,10 +278,12 @@ class CalcEMFunctional(object):
         return self.form_r, self.form_i
 
     def set_E_dofs(self, E_dofs):
-        x_r = N.real(E_dofs).copy()
-        x_i = N.imag(E_dofs).copy()
-        self.E_r.vector()[:] = x_r
-        self.E_i.vector()[:] = x_i
+        self.E_field.set_dofs(E_dofs)
+
+    def set_E_field(self, E_field):
+        """Share the L{ComplexField} E_field instead of copying dofs"""
+        self.E_field = E_field
+        self.dirty = True
         
     def set_g_dofs(self, g_dofs):
         x_r = N.real(g_dofs).copy()
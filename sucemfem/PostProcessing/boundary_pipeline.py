@@ -0,0 +1,185 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+"""Postprocess boundary quantities from a single pass over the boundary
+
+The surface flux, variational flux and far field of a solution are
+usually calculated by separate classes, each assembling its own form
+over the exterior facets or the skin of boundary cells. The
+L{BoundaryPostProcessor} instead calculates the boundary data once per
+solution and frequency:
+
+  - E and curl(E) at the boundary quadrature points, with the normals
+    and weights, see L{surface_ntff.QuadratureNTFF}
+  - the skin product (S - k0^2 M) x, see L{variational_ntff.BilinearNTFF}
+
+and calculates every registered L{BoundaryQuantity} from this shared
+data. Blocks of solutions are supported.
+"""
+from __future__ import division
+
+import numpy as np
+
+from sucemfem.Consts import Z0, c0
+from sucemfem.PostProcessing.variational_ntff import BilinearNTFF
+from sucemfem.PostProcessing.power_flux import get_boundary_dofs
+
+__all__ = ['BoundaryQuantity', 'SurfaceFluxQuantity',
+           'VariationalFluxQuantity', 'FarFieldQuantity',
+           'BoundaryPostProcessor']
+
+class BoundaryQuantity(object):
+    """A quantity calculated by L{BoundaryPostProcessor}"""
+
+    def calc(self, boundary_data):
+        """Calculate the quantity
+
+        @param boundary_data: the L{BoundaryPostProcessor}, which provides
+            the cached boundary data of the current solution
+        @raise NotImplementedError: This method should be implemented in a
+            sub-class.
+        """
+        raise NotImplementedError(
+            'User subclass should implement calc()')
+
+    def _get_value(self, boundary_data, values):
+        """Return values, or its only entry for a single solution"""
+        if boundary_data.get_dofs().ndim == 1:
+            return values[0]
+        return values
+
+class SurfaceFluxQuantity(BoundaryQuantity):
+    """Power flux through the boundary, as L{power_flux.SurfaceFlux}
+
+    I.e. the integral of Re(E x H*).n, twice the time average power. The
+    boundary is assumed to be non-magnetic.
+    """
+
+    def calc(self, boundary_data):
+        points, normals, weights = boundary_data.get_boundary_quadrature()
+        E, curl_E = boundary_data.get_boundary_traces()
+        H = 1j*curl_E/(boundary_data.k0*Z0)
+        S = np.cross(E, H.conj(), axis=1)
+        return self._get_value(boundary_data, np.einsum(
+            'nk,nkm,n->m', normals, S, weights).real)
+
+class VariationalFluxQuantity(BoundaryQuantity):
+    """Power flux calculated as L{power_flux.VariationalSurfaceFlux}
+
+    The skin of boundary cells is assumed to be free space.
+    """
+
+    def calc(self, boundary_data):
+        rows, KE = boundary_data.get_skin_product()
+        x = boundary_data.get_dofs()
+        x = x.reshape(len(x), -1)
+        if rows is None:
+            # Testing function dofs are zero except on the boundary
+            rows = get_boundary_dofs(boundary_data.function_space)
+            KE = KE[rows]
+        g = 1j*x[rows].conj()/(boundary_data.k0*Z0)
+        return self._get_value(boundary_data, np.sum(g*KE, axis=0).conj())
+
+class FarFieldQuantity(BoundaryQuantity):
+    """Far field in a set of directions, normalised to radius 1
+
+    Calculated with the variational NTFF if variational is True,
+    otherwise with the surface NTFF.
+    """
+
+    def __init__(self, theta_deg, phi_deg, variational=False):
+        self.theta_deg = np.atleast_1d(theta_deg)
+        self.phi_deg = np.atleast_1d(phi_deg)*np.ones_like(self.theta_deg)
+        self.variational = variational
+
+    def calc(self, boundary_data):
+        if self.variational:
+            ntff = boundary_data.get_variational_ntff()
+        else:
+            ntff = boundary_data.get_surface_ntff()
+        return ntff.calc_pts(self.theta_deg, self.phi_deg)
+
+class BoundaryPostProcessor(object):
+    """Calculate registered boundary quantities from shared boundary data
+
+    Each kind of boundary data is calculated at most once per solution
+    and frequency, when the first quantity that needs it is calculated.
+    """
+
+    def __init__(self, function_space):
+        """Initialise the postprocessor
+
+        @param function_space: dolfin FunctionSpace object of the solutions
+        """
+        self.function_space = function_space
+        self.ntff = BilinearNTFF(function_space)
+        self.quantities = []
+
+    def add_quantity(self, name, quantity):
+        """Register a L{BoundaryQuantity} that is returned as name by calc()"""
+        if name in dict(self.quantities):
+            raise ValueError('Quantity %s is already registered' % name)
+        self.quantities.append((name, quantity))
+
+    def set_k0(self, k0):
+        self.k0 = k0
+        self.ntff.set_k0(k0)
+
+    def set_frequency(self, frequency):
+        self.frequency = frequency
+        self.set_k0(self.frequency*2*np.pi/c0)
+
+    def set_dofs(self, dofs):
+        """Set the E-field dofs, or an (n_dofs, m) array of solutions"""
+        self.ntff.set_dofs(dofs)
+
+    def set_field(self, field):
+        """Share the L{ComplexField} field"""
+        self.ntff.set_field(field)
+
+    def get_dofs(self):
+        return self.ntff.get_dofs()
+
+    def get_surface_ntff(self):
+        return self.ntff.surface_ntff
+
+    def get_variational_ntff(self):
+        return self.ntff
+
+    def get_boundary_quadrature(self):
+        """Return the (points, normals, weights) of the boundary quadrature"""
+        return self.ntff.surface_ntff.get_boundary_quadrature()
+
+    def get_boundary_traces(self):
+        """Return E and curl(E) at the quadrature points as (n, 3, m) arrays"""
+        return self.ntff.surface_ntff.get_boundary_traces()
+
+    def get_skin_product(self):
+        """Return (rows, KE), see L{BilinearNTFF.get_skin_product}"""
+        return self.ntff.get_skin_product()
+
+    def calc(self):
+        """Calculate all the registered quantities
+
+        @return: dict of the quantities by name. Each value has a trailing
+            axis of length m if a block of m solutions was set.
+        """
+        return dict((name, quantity.calc(self))
+                    for name, quantity in self.quantities)
@@ -10,3 +10,23 @@ def S11(Zl, Z0):
     """
     Zl = np.asarray(Zl)
     return (Zl - Z0)/(Zl + Z0)
+
+def S_matrix(Z, Z0):
+    """Calculate the scattering matrix of a multi-port network
+
+    S = Z0^(-1/2) (Z - Z0) (Z + Z0)^-1 Z0^(1/2) for real, diagonal
+    reference impedances, which reduces to L{S11} for a single port.
+
+    @param Z: (..., n, n) array of impedance matrices, e.g. one per
+        frequency
+    @param Z0: Characteristic impedance, or length n array with the
+        reference impedance of each port
+    """
+    Z = np.asarray(Z)
+    Z0 = np.asarray(Z0, dtype=np.float64)*np.ones(Z.shape[-1])
+    Z0_diag = np.diag(Z0)
+    # S (Z + Z0) = Z - Z0, solved as (Z + Z0)^T S^T = (Z - Z0)^T
+    S = np.linalg.solve(np.swapaxes(Z + Z0_diag, -1, -2),
+                        np.swapaxes(Z - Z0_diag, -1, -2))
+    S = np.swapaxes(S, -1, -2)
+    return S*np.sqrt(Z0)/np.sqrt(Z0)[:,np.newaxis]
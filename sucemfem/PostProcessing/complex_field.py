@@ -0,0 +1,84 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+"""Complex solution container shared between postprocessors
+
+dolfin Functions are real valued, so each postprocessor used to keep its
+own real/imaginary Function pair and copy every solution into it. A
+L{ComplexField} owns a single pair per solution that any number of
+postprocessors can share via their set_field() methods.
+"""
+from __future__ import division
+
+import numpy as np
+import dolfin
+
+__all__ = ['ComplexField']
+
+class ComplexField(object):
+    """Real and imaginary dolfin Functions of a complex solution
+
+    The version number is incremented every time the dofs are set, so
+    that derived quantities can be cached until the solution changes,
+    either with L{get_derived} or by comparing the version number.
+    """
+
+    def __init__(self, function_space, dofs=None):
+        """Initialise the field
+
+        @param function_space: dolfin FunctionSpace object of the solution
+        @keyword dofs: optional initial complex dof values
+        """
+        self.function_space = V = function_space
+        self.E_r = dolfin.Function(V)
+        self.E_i = dolfin.Function(V)
+        self.dofs = None
+        self.version = 0
+        self._derived = {}
+        if dofs is not None:
+            self.set_dofs(dofs)
+
+    def set_dofs(self, dofs):
+        """Set the complex dof values, as a numpy array"""
+        self.dofs = np.asarray(dofs)
+        self.E_r.vector()[:] = np.real(self.dofs).copy()
+        self.E_i.vector()[:] = np.imag(self.dofs).copy()
+        self.version += 1
+        self._derived.clear()
+
+    def get_dofs(self):
+        return self.dofs
+
+    def get_functions(self):
+        """Return the (real, imaginary) dolfin Function pair"""
+        return self.E_r, self.E_i
+
+    def get_derived(self, key, calc_fn):
+        """Return a quantity derived from the current dofs
+
+        @param key: hashable key identifying the quantity
+        @param calc_fn: function calc_fn(field) that calculates the
+            quantity. It is only called again once the dofs change.
+        """
+        try:
+            return self._derived[key]
+        except KeyError:
+            value = self._derived[key] = calc_fn(self)
+            return value
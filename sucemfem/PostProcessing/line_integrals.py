@@ -0,0 +1,138 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+"""Line integrals of the E-field, e.g. port voltages
+
+The integral of E.dl along a straight line is a linear functional of the
+solution dofs. Each line is clipped against the mesh cells and the basis
+functions are integrated along the piece in each cell with Gauss-Legendre
+quadrature that is exact for the basis order. The functionals of many
+lines form the rows of a sparse matrix, so that the integrals of all the
+lines for complex solutions, or blocks of solutions, are a single sparse
+product.
+"""
+from __future__ import division
+
+import numpy as np
+import scipy.sparse
+
+from sucemfem.Utilities.Caching import get_cached
+from sucemfem.Geometry import get_segment_quadrature
+from sucemfem.Geometry import get_segment_quadrature_points
+from sucemfem.Sources.point_source import evaluate_basis
+
+__all__ = ['get_line_integral_matrix', 'get_line_functional', 'LineIntegrals']
+
+def get_line_integral_matrix(function_space, lines):
+    """Return the sparse matrix of the line integral functionals
+
+    @param function_space: dolfin FunctionSpace object
+    @param lines: (n, 2, 3) array with the start and end point of each
+        line, or a single (2, 3) line
+    @raise ValueError: if a line does not lie inside the mesh
+    @return: scipy.sparse.csr_matrix L of shape (n, V.dim()), so that
+        L*x is the integral of E.dl along each line from its start to its
+        end point for the dofs x
+    """
+    lines = np.asarray(lines, dtype=np.float64).reshape(-1, 2, 3)
+    mesh = function_space.mesh()
+    no_pts = get_segment_quadrature_points(function_space)
+    line_nos, cells, points, tangents = [], [], [], []
+    for i, (start, end) in enumerate(lines):
+        delta = end - start
+        length = np.sqrt(np.sum(delta**2))
+        if length == 0:
+            continue
+        cell_indices, pts, weights = get_segment_quadrature(
+            mesh, start, end, no_pts)
+        if abs(np.sum(weights)/length - 1) > 1e-6:
+            raise ValueError('Line %d does not lie inside the mesh' % i)
+        line_nos.append(np.ones(len(pts), np.int64)*i)
+        cells.append(cell_indices)
+        points.append(pts)
+        tangents.append(weights[:,np.newaxis]*delta/length)
+    if not line_nos:
+        return scipy.sparse.csr_matrix((len(lines), function_space.dim()))
+    # Evaluate the basis functions at the points of all the lines at once
+    dofnos, basis_vals = evaluate_basis(
+        function_space, np.concatenate(cells), np.concatenate(points))
+    values = np.einsum('nik,nk->ni', basis_vals, np.concatenate(tangents))
+    rows = np.repeat(np.concatenate(line_nos), dofnos.shape[1])
+    return scipy.sparse.coo_matrix(
+        (values.ravel(), (rows, dofnos.ravel())),
+        shape=(len(lines), function_space.dim())).tocsr()
+
+def get_line_functional(function_space, start_pt, end_pt):
+    """Return the line integral functional of a single line
+
+    Assembled once and cached with the function space for each pair of
+    end points.
+
+    @param function_space: dolfin FunctionSpace object
+    @param start_pt: start point of the line
+    @param end_pt: end point of the line
+    @return: scipy.sparse.csr_matrix l of shape (1, V.dim()) so that l*x
+        is the integral of E.dl from start_pt to end_pt for the dofs x
+    """
+    line = np.array([start_pt, end_pt], dtype=np.float64).reshape(2, 3)
+    key = ('line_integral_functional', tuple(line.ravel()))
+    return get_cached(function_space, key,
+                      lambda V: get_line_integral_matrix(V, line))
+
+class LineIntegrals(object):
+    """Integrate E.dl along a fixed set of lines for many solutions
+
+    The line integral matrix is assembled once, after which the integrals
+    of each solution, or block of solutions, are a sparse product.
+    """
+
+    def __init__(self, function_space, lines):
+        """Initialise the line integrals
+
+        @param function_space: dolfin FunctionSpace object of the solutions
+        @param lines: (n, 2, 3) array with the start and end point of each
+            line, see L{get_line_integral_matrix}
+        """
+        self.function_space = function_space
+        self.lines = np.asarray(lines, dtype=np.float64).reshape(-1, 2, 3)
+        self.matrix = get_line_integral_matrix(function_space, self.lines)
+        self.field = None
+
+    def set_dofs(self, dofs):
+        """Set the E-field dofs, or an (n_dofs, m) array of solutions"""
+        self.dofs = np.asarray(dofs)
+        self.field = None
+
+    def set_field(self, field):
+        """Share the L{ComplexField} field"""
+        self.field = field
+
+    def get_dofs(self):
+        if self.field is not None:
+            return self.field.get_dofs()
+        return self.dofs
+
+    def calc_integrals(self):
+        """Calculate the line integrals
+
+        @return: length n array of integrals, or (n, m) array for a block
+            of m solutions
+        """
+        return self.matrix*self.get_dofs()
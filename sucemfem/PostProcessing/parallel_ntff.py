@@ -0,0 +1,185 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+"""Far field evaluation spread over a pool of worker processes
+
+The pool is started once and kept alive between calls. Each worker
+process constructs its own NTFF instance, and hence its own compiled
+forms, in the pool initialiser. The worker processes are forked, so the
+function space is inherited from the parent, and the solution dofs are
+shared read-only through a shared memory array instead of being copied
+to each worker. When the dofs or frequency change, only the new dofs
+are copied into the shared array, and each worker updates its NTFF when
+it receives the first task of the new state.
+"""
+from __future__ import division
+
+import multiprocessing
+import numpy as np
+
+__all__ = ['calc_pts_serial', 'ParallelNTFF']
+
+# NTFF instance of a worker process and the state version of its dofs and
+# frequency, set up by _init_worker()
+_worker_state = {}
+
+def calc_pts_serial(ntff, theta_deg, phi_deg):
+    """Calculate the far field of ntff for arrays of directions in sequence
+
+    Uses the NTFF's calc_pts() method if it has one, otherwise calc_pt()
+    is called for each direction.
+
+    @return: (n, 2) array of (E_theta, E_phi) values
+    """
+    if hasattr(ntff, 'calc_pts'):
+        return np.asarray(ntff.calc_pts(theta_deg, phi_deg))
+    E_ff = np.zeros((len(theta_deg), 2), np.complex128)
+    for i, (theta, phi) in enumerate(zip(theta_deg, phi_deg)):
+        E_ff[i] = ntff.calc_pt(theta, phi)
+    return E_ff
+
+def _init_worker(ntff_class, function_space, shared_dofs):
+    _worker_state['ntff'] = ntff_class(function_space)
+    _worker_state['shared_dofs'] = shared_dofs
+    _worker_state['version'] = None
+
+def _calc_chunk(task):
+    version, frequency, dofs_dtype, dofs_shape, directions = task
+    ntff = _worker_state['ntff']
+    if version != _worker_state['version']:
+        size = int(np.prod(dofs_shape))*np.dtype(dofs_dtype).itemsize//8
+        dofs = np.ctypeslib.as_array(_worker_state['shared_dofs'])[:size]
+        ntff.set_frequency(frequency)
+        ntff.set_dofs(dofs.view(dofs_dtype).reshape(dofs_shape))
+        _worker_state['version'] = version
+    return calc_pts_serial(ntff, *directions)
+
+class ParallelNTFF(object):
+    """Evaluate an NTFF for many directions using a process pool
+
+    Any NTFF class constructed as ntff_class(function_space), with
+    set_frequency(), set_dofs() and calc_pt() methods, can be used, e.g.
+    L{surface_ntff.NTFF} or L{variational_ntff.NTFF}. The directions are
+    divided into chunks that are evaluated by the worker processes, and
+    the results are returned in the input order. Each worker evaluates
+    its directions exactly as the serial NTFF would, so the results are
+    identical.
+
+    The pool is started by the first call to L{calc_pts} and reused by
+    later calls, so the NTFF of each worker is only constructed once. It
+    is restarted if the dofs no longer fit into the shared array. Call
+    L{close} to stop the worker processes.
+    """
+    # Number of chunks per worker process, to balance the load
+    chunks_per_process = 4
+
+    def __init__(self, ntff_class, function_space, no_processes=None):
+        """Initialise the parallel NTFF
+
+        @param ntff_class: NTFF class to instantiate in each worker
+        @param function_space: dolfin FunctionSpace object of the solution
+        @keyword no_processes: number of worker processes, the number of
+            CPUs by default. No pool is used for a single process.
+        """
+        self._pool = None
+        self.ntff_class = ntff_class
+        self.function_space = function_space
+        if no_processes is None:
+            no_processes = multiprocessing.cpu_count()
+        self.no_processes = no_processes
+        self._version = 0
+        self._shared_dofs = None
+        self._shared_version = None
+        self._ntff = None
+        self._ntff_version = None
+
+    def set_frequency(self, frequency):
+        self.frequency = frequency
+        self._version += 1
+
+    def set_dofs(self, dofs):
+        self.dofs = np.asarray(dofs)
+        self._version += 1
+
+    def _get_ntff(self):
+        """Return the NTFF used in this process if no pool is used"""
+        if self._ntff is None:
+            self._ntff = self.ntff_class(self.function_space)
+        if self._ntff_version != self._version:
+            self._ntff.set_frequency(self.frequency)
+            self._ntff.set_dofs(self.dofs)
+            self._ntff_version = self._version
+        return self._ntff
+
+    def _get_pool(self):
+        """Return the worker pool, with the current dofs in shared memory"""
+        dofs = np.ascontiguousarray(self.dofs)
+        size = dofs.nbytes//8
+        if self._pool is not None and len(self._shared_dofs) < size:
+            self.close()
+        if self._pool is None:
+            self._shared_dofs = multiprocessing.RawArray('d', size)
+            self._shared_version = None
+            self._pool = multiprocessing.Pool(
+                self.no_processes, _init_worker,
+                (self.ntff_class, self.function_space, self._shared_dofs))
+        if self._shared_version != self._version:
+            np.ctypeslib.as_array(self._shared_dofs)[:size] = \
+                dofs.ravel().view(np.float64)
+            self._shared_version = self._version
+        return self._pool
+
+    def close(self):
+        """Stop the worker processes, a new pool is started when needed"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+            self._shared_dofs = None
+
+    def __del__(self):
+        self.close()
+
+    def calc_pts(self, theta_deg, phi_deg):
+        """Calculate the far field for arrays of directions
+
+        @param theta_deg: length n array of elevation angles in degrees
+        @param phi_deg: length n array of azimuth angles in degrees
+        @return: (n, 2) array of (E_theta, E_phi) values
+        """
+        theta_deg = np.atleast_1d(theta_deg)
+        phi_deg = np.atleast_1d(phi_deg)*np.ones_like(theta_deg)
+        if len(theta_deg) == 0:
+            return np.zeros((0, 2), np.complex128)
+        if self.no_processes == 1:
+            return calc_pts_serial(self._get_ntff(), theta_deg, phi_deg)
+        no_chunks = min(self.no_processes*self.chunks_per_process,
+                        len(theta_deg))
+        pool = self._get_pool()
+        task_state = (self._version, self.frequency, self.dofs.dtype,
+                      self.dofs.shape)
+        tasks = [task_state + (directions,) for directions in zip(
+            np.array_split(theta_deg, no_chunks),
+            np.array_split(phi_deg, no_chunks))]
+        return np.concatenate(pool.map(_calc_chunk, tasks))
+
+    def calc_pt(self, theta_deg, phi_deg):
+        """Calculate the far field (E_theta, E_phi) in a single direction"""
+        return tuple(self.calc_pts(theta_deg, phi_deg)[0])
@@ -0,0 +1,327 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+"""Radiation pattern analysis with few far field evaluations
+
+The radiated power is integrated with Gauss-Legendre product rules on the
+sphere. Far field patterns are band-limited, so the order is doubled
+until successive estimates agree, and their difference is the error
+estimate. Pattern cuts are sampled adaptively, refining only the
+intervals where the pattern is not yet resolved, before the beamwidth and
+sidelobe level are located. A cut is a full circle through the poles, so
+the beam parameters are found on the cut re-centred on its peak.
+
+Any object with a calc_pts(theta_deg, phi_deg) method returning (n, 2)
+arrays of (E_theta, E_phi) values can be analysed, e.g.
+L{surface_ntff.QuadratureNTFF} or L{spherical_wave.SphericalWaveExpansion}.
+
+This module has no dolfin dependency.
+"""
+from __future__ import division
+
+import numpy as np
+import scipy.optimize
+
+from sucemfem.Consts import Z0
+from sucemfem.PostProcessing.spherical_wave import SphericalWaveExpansion
+
+__all__ = ['get_flux_power', 'PatternAnalysis']
+
+def get_flux_power(flux):
+    """Return the time average power of a L{power_flux} result
+
+    The power flux classes integrate Re(E x H*).n over the boundary, i.e.
+    without the factor 1/2 of the time average Poynting vector.
+    """
+    return np.real(flux)/2
+
+def _to_dB(x):
+    return 10*np.log10(np.maximum(x, 1e-300))
+
+class PatternAnalysis(object):
+    """Directivity, gain, beamwidth and sidelobe levels of a far field"""
+
+    initial_order = 8
+    max_order = 256
+
+    def __init__(self, pattern, tolerance=1e-6):
+        """Initialise the analysis for a far field pattern
+
+        @param pattern: far field with a calc_pts(theta_deg, phi_deg)
+            method, normalised to radius 1
+        @keyword tolerance: relative tolerance of the power integration
+        """
+        self.pattern = pattern
+        self.tolerance = tolerance
+        self.no_evaluations = 0
+        self._power = None
+        self._samples = None
+
+    def calc_intensity(self, theta_deg, phi_deg):
+        """Return the radiation intensity |E_ff|^2/(2*Z0) in W/sr"""
+        theta_deg = np.atleast_1d(theta_deg)
+        E_ff = np.asarray(self.pattern.calc_pts(
+            theta_deg, np.atleast_1d(phi_deg)*np.ones_like(theta_deg)))
+        if E_ff.ndim != 2:
+            raise ValueError('Only single solution patterns can be analysed')
+        self.no_evaluations += len(E_ff)
+        return np.sum(np.abs(E_ff)**2, axis=1)/(2*Z0)
+
+    def _integrate_power(self, order):
+        theta, phi, weights = SphericalWaveExpansion.get_sampling_grid(order)
+        theta_deg, phi_deg = np.rad2deg(theta), np.rad2deg(phi)
+        U = self.calc_intensity(theta_deg, phi_deg)
+        self._samples = (theta_deg, phi_deg, U)
+        return np.dot(weights, U)
+
+    def calc_radiated_power(self):
+        """Integrate the radiated power over the sphere
+
+        The refinement is global: the order of the whole Gauss-Legendre
+        product grid is doubled until successive estimates agree. Since
+        the grids do not nest, each step evaluates the pattern on a new
+        grid. For the smooth, band-limited patterns of finite sources
+        this converges faster than local refinement of the sphere would.
+
+        @return: (power, error) -- the power and an estimate of its
+            absolute error
+        """
+        if self._power is None:
+            order = self.initial_order
+            P = self._integrate_power(order)
+            while True:
+                order *= 2
+                P_new = self._integrate_power(order)
+                error = abs(P_new - P)
+                P = P_new
+                if error <= self.tolerance*abs(P) or order >= self.max_order:
+                    break
+            self._power = (P, error)
+        return self._power
+
+    def calc_directivity(self, theta_deg, phi_deg):
+        """Calculate the directivity in the given directions
+
+        @return: (directivity, relative_error) -- linear directivity array
+            and the relative error estimate of the radiated power
+        """
+        P, error = self.calc_radiated_power()
+        U = self.calc_intensity(theta_deg, phi_deg)
+        return 4*np.pi*U/P, error/P
+
+    def calc_gain(self, theta_deg, phi_deg, accepted_power=None, flux=None):
+        """Calculate the gain in the given directions
+
+        @keyword accepted_power: time average power accepted by the
+            antenna
+        @keyword flux: result of one of the L{power_flux} classes, used to
+            calculate the accepted power if it is not given, see
+            L{get_flux_power}
+        @return: linear gain array
+        """
+        if accepted_power is None:
+            if flux is None:
+                raise ValueError('Either accepted_power or flux is required')
+            accepted_power = get_flux_power(flux)
+        return 4*np.pi*self.calc_intensity(theta_deg, phi_deg)/accepted_power
+
+    def calc_max_directivity(self):
+        """Find the direction of maximum directivity
+
+        The finest power integration grid is used as starting point for a
+        local search.
+
+        @return: (directivity, theta_deg, phi_deg)
+        """
+        P = self.calc_radiated_power()[0]
+        theta_deg, phi_deg, U = self._samples
+        i = np.argmax(U)
+        neg_U = lambda x: -self.calc_intensity(x[0], x[1])[0]
+        theta, phi = scipy.optimize.fmin(
+            neg_U, [theta_deg[i], phi_deg[i]], xtol=1e-4, ftol=1e-12*U[i],
+            disp=False)
+        # Keep theta in [0, 180]
+        if theta < 0:
+            theta, phi = -theta, phi + 180
+        if theta > 180:
+            theta, phi = 360 - theta, phi + 180
+        return 4*np.pi*max(-neg_U([theta, phi]), U[i])/P, theta, phi % 360
+
+    def _cut_intensity(self, t, phi_deg):
+        """Intensity along the cut phi = phi_deg at angles t in degrees
+
+        The cut is periodic in t with period 360, t is taken to [-180, 180)
+        and negative t lie in the half plane phi_deg + 180.
+        """
+        t = (np.atleast_1d(t) + 180) % 360 - 180
+        return self.calc_intensity(np.abs(t), phi_deg + 180*(t < 0))
+
+    def calc_cut(self, phi_deg, tolerance_dB=0.1, initial_points=37,
+                 max_depth=10, floor_dB=-60.):
+        """Sample a pattern cut adaptively
+
+        Starting from a uniform grid, an interval is bisected while the
+        pattern at its midpoint differs from linear interpolation by more
+        than tolerance_dB. All the midpoints of a pass are evaluated in
+        one batch. Values more than floor_dB below the maximum are not
+        refined further.
+
+        @param phi_deg: azimuth angle of the cut, negative cut angles t
+            lie in the half plane phi_deg + 180
+        @return: (t, U) -- cut angles in degrees in [-180, 180] and the
+            radiation intensity
+        """
+        t = np.linspace(-180, 180, initial_points)
+        U = self._cut_intensity(t, phi_deg)
+        active = np.ones(len(t) - 1, dtype=bool)
+        for depth in range(max_depth):
+            intervals = np.flatnonzero(active)
+            if len(intervals) == 0:
+                break
+            floor = _to_dB(U.max()) + floor_dB
+            dB = np.maximum(_to_dB(U), floor)
+            t_mid = (t[intervals] + t[intervals+1])/2
+            U_mid = self._cut_intensity(t_mid, phi_deg)
+            dB_mid = np.maximum(_to_dB(U_mid), floor)
+            refine = np.abs(dB_mid - (dB[intervals] + dB[intervals+1])/2) \
+                     > tolerance_dB
+            # Keep all the midpoints, but only check the halves of the
+            # intervals that were not yet resolved in the next pass
+            order = np.argsort(np.concatenate([t, t_mid]), kind='mergesort')
+            t = np.concatenate([t, t_mid])[order]
+            U = np.concatenate([U, U_mid])[order]
+            refined_mid = np.concatenate(
+                [np.zeros(len(order) - len(t_mid), dtype=bool), refine])[order]
+            active = refined_mid[:-1] | refined_mid[1:]
+        return t, U
+
+    def calc_beam_parameters(self, phi_deg=None, tolerance_dB=0.1,
+                             xtol=1e-3, floor_dB=-60.):
+        """Calculate the main beam parameters in a pattern cut
+
+        The parameters are calculated on the cut sampled with tolerance_dB
+        and again with tolerance_dB/4. The finer values are returned, and
+        the differences between the two are the error estimates. The
+        beamwidth error includes the root finding tolerance xtol, and the
+        sidelobe level error the variation of the pattern within xtol of
+        the located maxima.
+
+        @keyword phi_deg: azimuth angle of the cut, through the direction
+            of maximum directivity by default
+        @keyword tolerance_dB: refinement tolerance of the cut, see
+            L{calc_cut}
+        @keyword xtol: angular tolerance in degrees used to locate the
+            beam peak and half power points
+        @keyword floor_dB: lobes more than floor_dB below the peak are
+            ignored, see L{calc_cut}
+        @return: dict with the cut peak directivity (linear) and angle,
+            the half power beamwidth in degrees with its error estimate,
+            and the sidelobe level in dB relative to the peak with its
+            error estimate. The beamwidth is nan if the pattern does not
+            drop to half power on both sides of the peak, and the sidelobe
+            level is nan if no sidelobes are found. Any other lobe in the
+            cut counts as a sidelobe, so a pattern with two equal beams in
+            the cut has a 0 dB sidelobe level.
+        """
+        P, P_error = self.calc_radiated_power()
+        if phi_deg is None:
+            phi_deg = self.calc_max_directivity()[2]
+        coarse, fine = [
+            self._calc_beam_parameters(
+                phi_deg, self.calc_cut(phi_deg, tol, floor_dB=floor_dB),
+                xtol, floor_dB)
+            for tol in (tolerance_dB, tolerance_dB/4)]
+        peak_dB, t_peak, beamwidth, sidelobe_dB, xtol_dB = fine
+        return dict(
+            peak_directivity=4*np.pi*10**(peak_dB/10)/P,
+            peak_angle=t_peak,
+            directivity_relative_error=P_error/P,
+            beamwidth=beamwidth,
+            beamwidth_error=abs(beamwidth - coarse[2]) + 2*xtol,
+            sidelobe_level=sidelobe_dB,
+            sidelobe_level_error=abs(sidelobe_dB - coarse[3]) + xtol_dB)
+
+    def _calc_beam_parameters(self, phi_deg, cut, xtol, floor_dB):
+        """Locate the beam peak, half power points and sidelobes in a cut
+
+        @return: (peak_dB, peak_angle, beamwidth, sidelobe_dB, xtol_dB)
+            where xtol_dB is the largest drop of the pattern within xtol
+            of the located peak and sidelobe maxima
+        """
+        t, U = cut
+        dB_fn = lambda x: _to_dB(self._cut_intensity(x, phi_deg))[0]
+        # The last sample of the cut is the same direction as the first
+        t, U = t[:-1], U[:-1]
+        i0 = np.argmax(U)
+        # Re-centre the periodic cut on its peak, closing it with the
+        # sample opposite the peak at both ends
+        offset = (t - t[i0] + 180) % 360 - 180
+        order = np.argsort(offset, kind='mergesort')
+        t = t[i0] + np.append(offset[order], offset[order[0]] + 360)
+        dB = _to_dB(np.append(U[order], U[order[0]]))
+        i0 = np.flatnonzero(order == i0)[0]
+        t_peak = scipy.optimize.fminbound(
+            lambda x: -dB_fn(x), t[max(i0-1, 0)], t[min(i0+1, len(t)-1)],
+            xtol=xtol)
+        peak_dB = max(dB_fn(t_peak), dB[i0])
+        xtol_dB = peak_dB - min(dB_fn(t_peak - xtol), dB_fn(t_peak + xtol))
+        t_peak = (t_peak + 180) % 360 - 180
+        half_power_dB = peak_dB + _to_dB(0.5)
+        # Half power points, bracketed by the cut samples
+        half_power = []
+        for step in (-1, 1):
+            j = i0
+            while 0 <= j + step < len(t) and dB[j+step] >= half_power_dB:
+                j += step
+            if not 0 <= j + step < len(t):
+                break
+            half_power.append(scipy.optimize.brentq(
+                lambda x: dB_fn(x) - half_power_dB, t[j], t[j+step],
+                xtol=xtol))
+        if len(half_power) == 2:
+            beamwidth = abs(half_power[1] - half_power[0])
+        else:
+            beamwidth = np.nan
+        # The main lobe extends to the first minimum on either side, a
+        # sidelobe is any other local maximum above the floor
+        dB = np.maximum(dB, peak_dB + floor_dB)
+        lo = i0
+        while lo > 0 and dB[lo-1] < dB[lo]:
+            lo -= 1
+        hi = i0
+        while hi < len(t) - 1 and dB[hi+1] < dB[hi]:
+            hi += 1
+        # The ends of the closed cut are the same direction
+        dB_prev = np.append(dB[-2], dB[:-1])
+        dB_next = np.append(dB[1:], dB[1])
+        is_max = (dB > dB_prev) & (dB >= dB_next)
+        side = np.concatenate([np.arange(0, lo), np.arange(hi+1, len(t))])
+        side = side[is_max[side]]
+        if len(side):
+            js = side[np.argmax(dB[side])]
+            t_sl = scipy.optimize.fminbound(
+                lambda x: -dB_fn(x), t[max(js-1, 0)], t[min(js+1, len(t)-1)],
+                xtol=xtol)
+            sl_dB = max(dB_fn(t_sl), dB[js])
+            xtol_dB += sl_dB - min(dB_fn(t_sl - xtol), dB_fn(t_sl + xtol))
+            sidelobe_dB = sl_dB - peak_dB
+        else:
+            sidelobe_dB = np.nan
+        return peak_dB, t_peak, beamwidth, sidelobe_dB, xtol_dB
@@ -0,0 +1,172 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+"""Voltage ports for impedance and S-parameter calculation
+
+The voltage of a port fed by a fillament current source is a linear
+functional of the solution dofs. The functional of each port is
+assembled once per function space as a sparse row vector, see
+L{line_integrals}, so that the voltages, impedances and S-parameters of
+every port, excitation and frequency are sparse products.
+"""
+from __future__ import division
+
+import numpy as np
+import scipy.sparse
+
+from sucemfem.Utilities.Caching import get_cached
+from sucemfem.Sources.fillament_current_source import FillamentCurrentSource
+from sucemfem.PostProcessing.line_integrals import get_line_functional
+from sucemfem.PostProcessing import circuit
+
+__all__ = ['VoltagePort', 'get_port_functional', 'VoltagePorts']
+
+class VoltagePort(object):
+    """A port fed by a fillament current between two points
+
+    The current I flows from the start to the end point, and the port
+    voltage is that of the end relative to the start point, i.e.
+
+    V = -int E.dl
+
+    from start to end, so that Z = V/I is the input impedance.
+    """
+
+    def __init__(self, endpoints, current=1., reference_impedance=50.):
+        """Initialise the port
+
+        @param endpoints: 2x3 array with the start and end point
+        @keyword current: port excitation current in Amperes
+        @keyword reference_impedance: reference impedance for the
+            S-parameters in Ohm
+        """
+        self.endpoints = np.asarray(endpoints, dtype=np.float64).reshape(2, 3)
+        self.current = current
+        self.reference_impedance = reference_impedance
+
+    def get_source(self):
+        """Return the fillament current source that excites the port"""
+        source = FillamentCurrentSource()
+        source.set_source_endpoints(self.endpoints)
+        source.set_value(self.current)
+        return source
+
+def get_port_functional(function_space, endpoints):
+    """Return the port voltage functional as a sparse row vector
+
+    Assembled once and cached with the function space.
+
+    @param function_space: dolfin FunctionSpace object
+    @param endpoints: 2x3 array with the port start and end point
+    @return: scipy.sparse.csr_matrix v of shape (1, V.dim()) so that v*x
+        is the port voltage, see L{VoltagePort}
+    """
+    endpoints = np.asarray(endpoints, dtype=np.float64).reshape(2, 3)
+    key = ('port_voltage_functional', tuple(endpoints.ravel()))
+    return get_cached(function_space, key,
+                      lambda V: -get_line_functional(V, *endpoints))
+
+class VoltagePorts(object):
+    """Voltages, impedances and S-parameters of a set of voltage ports
+
+    The solutions are expected one per port excitation, in the port
+    order, so that the impedance matrix is Z_ij = V_i/I_j with V_i the
+    voltage of port i and I_j the current of port j when only port j is
+    excited. All the other ports are open circuited, as with
+    L{ProblemConfigurations.EMDrivenProblem.DrivenProblemABC.solve_excitations}
+    of the port sources.
+    """
+
+    def __init__(self, function_space, ports):
+        """Initialise the ports
+
+        @param function_space: dolfin FunctionSpace object of the solutions
+        @param ports: sequence of L{VoltagePort} objects
+        """
+        self.function_space = function_space
+        self.ports = list(ports)
+        self.functionals = scipy.sparse.vstack(
+            [get_port_functional(function_space, port.endpoints)
+             for port in self.ports]).tocsr()
+        self.currents = np.array([port.current for port in self.ports])
+        self.reference_impedances = np.array(
+            [port.reference_impedance for port in self.ports],
+            dtype=np.float64)
+
+    def get_excitations(self):
+        """Return the port sources, one excitation per port"""
+        return [port.get_source() for port in self.ports]
+
+    def calc_voltages(self, x):
+        """Calculate the port voltages
+
+        @param x: dofs, or (n_dofs, m) array of solutions
+        @return: length n_ports array, or (n_ports, m) array of voltages
+        """
+        return self.functionals*np.asarray(x)
+
+    def calc_impedance_matrix(self, x):
+        """Calculate the impedance matrix
+
+        @param x: (n_dofs, n_ports) array with the solution of each port
+            excitation, or the dofs of the single port excitation of a
+            one-port network
+        @return: (n_ports, n_ports) impedance matrix
+        """
+        x = np.asarray(x)
+        x = x.reshape(len(x), -1)
+        if x.shape[1] != len(self.ports):
+            raise ValueError('Expected %d port excitation solutions'
+                             % len(self.ports))
+        return self.calc_voltages(x)/self.currents
+
+    def calc_S_matrix(self, x):
+        """Calculate the S-parameters, see L{calc_impedance_matrix}"""
+        return circuit.S_matrix(self.calc_impedance_matrix(x),
+                                self.reference_impedances)
+
+    def calc_sweep(self, problem, frequencies, **solver_kwargs):
+        """Solve the port excitations over a frequency sweep
+
+        The voltages of all the ports and excitations at all the
+        frequencies are calculated with the precomputed functionals, and
+        the impedance and S-parameters of the whole sweep at once.
+
+        @param problem: initialised
+            L{ProblemConfigurations.EMDrivenProblem.DrivenProblemABC}
+        @param frequencies: sequence of frequencies in Hz
+        @keyword solver_kwargs: passed on to the problem's
+            solve_excitations() method
+        @return: dict with the frequencies, and the (n_freqs, n_ports,
+            n_ports) arrays of port voltages V, impedance matrices Z and
+            S-parameters S
+        """
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+        excitations = self.get_excitations()
+        no_ports = len(self.ports)
+        V = np.zeros((len(frequencies), no_ports, no_ports), np.complex128)
+        for i, frequency in enumerate(frequencies):
+            problem.set_frequency(frequency)
+            solutions = problem.solve_excitations(
+                excitations, **solver_kwargs).solutions
+            V[i] = self.calc_voltages(solutions)
+        Z = V/self.currents
+        return dict(frequencies=frequencies, V=V, Z=Z,
+                    S=circuit.S_matrix(Z, self.reference_impedances))
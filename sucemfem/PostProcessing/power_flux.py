@@ -4,8 +4,9 @@ import dolfin
 import numpy as np
 
 from sucemfem.Consts import eps0, mu0, c0, Z0
-from sucemfem.Utilities.Converters import as_dolfin_vector
+from sucemfem.Utilities.Caching import get_cached
 from sucemfem.PostProcessing import CalcEMFunctional
+from sucemfem.PostProcessing.complex_field import ComplexField
 from sucemfem import Geometry 
 
 class SurfaceFlux(object):
@@ -22,17 +23,21 @@ class SurfaceFlux(object):
     """
     def __init__(self, function_space):
         self.function_space = V = function_space
-        self.E_r = dolfin.Function(V)
-        self.E_i = dolfin.Function(V)
+        self.field = ComplexField(V)
         self.mur_function = None
+        self._form = None
 
     def set_dofs(self, dofs):
-        x_r = np.real(dofs).copy()
-        x_i = np.imag(dofs).copy()
-        self.E_r.vector()[:] = x_r
-        self.E_i.vector()[:] = x_i
+        self.field.set_dofs(dofs)
+
+    def set_field(self, field):
+        """Share the L{ComplexField} field instead of copying dofs"""
+        self.field = field
+        self._form = None
 
     def set_k0(self,k0):
+        if k0 != getattr(self, 'k0', None):
+            self._form = None
         self.k0 = k0
 
     def _get_mur_function(self):
@@ -45,12 +50,22 @@ class SurfaceFlux(object):
 
     def set_mur_function(self, mur_function):
         self.mur_function = mur_function
+        self._form = None
 
     def _get_form(self):
+        """Return the flux form, built once per k0 and mu_r function
+
+        The form refers to the functions of the field, so new dofs do not
+        require a new form.
+        """
+        if self._form is None:
+            self._form = self._build_form()
+        return self._form
+
+    def _build_form(self):
         n = self.function_space.cell().n
         k0 = self.k0
-        E_i = self.E_i
-        E_r = self.E_r
+        E_r, E_i = self.field.get_functions()
         mu_r = self._get_mur_function()
         return (1/k0/Z0)*dolfin.dot(n, (dolfin.cross(E_r, -dolfin.curl(E_i)/mu_r) +
                                         dolfin.cross(E_i, dolfin.curl(E_r)/mu_r)))*dolfin.ds
@@ -59,11 +74,27 @@ class SurfaceFlux(object):
         """Calculate the power flux"""
         return dolfin.assemble(self._get_form())
 
+def _calc_boundary_dofs(function_space):
+    boundary = dolfin.DomainBoundary()
+    zero = dolfin.Constant((0.,)*function_space.mesh().geometry().dim())
+    bc = dolfin.DirichletBC(function_space, zero, boundary)
+    # Boundary dofs are set to zero when the BC is applied to a vector
+    # of ones
+    marker = dolfin.Vector(function_space.dim())
+    marker[:] = 1.
+    bc.apply(marker)
+    return np.flatnonzero(marker.array() == 0)
+
+def get_boundary_dofs(function_space):
+    """Return the indices of the dofs on the mesh boundary
+
+    Calculated once and cached with the function space.
+    """
+    return get_cached(function_space, 'boundary_dofs', _calc_boundary_dofs)
+
 class VariationalSurfaceFlux(object):
     def __init__(self, function_space):
         self.function_space = V = function_space
-        self.E_r = dolfin.Function(V)
-        self.E_i = dolfin.Function(V)
         self.mur_function = None
         self.epsr_function = None
         ## Set CalcEMCalcEMFunctional to only integrate along a skin
@@ -75,31 +106,24 @@ class VariationalSurfaceFlux(object):
         boundary_cells.mark(cell_domains, cell_region)
         self.functional = CalcEMFunctional(V)
         self.functional.set_cell_domains(cell_domains, cell_region)
-        self.k0_dirty = True
+        self.boundary_dofs = get_boundary_dofs(V)
+        # Solution dofs with all the interior dofs set to zero
+        self.dirich_dofs = np.zeros(V.dim(), np.complex128)
+        self._g_key = None
+        self.set_field(ComplexField(V))
 
     def set_dofs(self, dofs):
-        x_r = np.real(dofs).copy()
-        x_i = np.imag(dofs).copy()
-        self.E_r.vector()[:] = x_r
-        self.E_i.vector()[:] = x_i
-        self.dofs = dofs
-        
-        boundary = dolfin.DomainBoundary()
-        E_r_dirich = dolfin.DirichletBC(
-            self.function_space, self.E_r, boundary)
-        E_i_dirich = dolfin.DirichletBC(
-            self.function_space, self.E_i, boundary)
-        x_r_dirich = as_dolfin_vector(np.zeros(len(x_r)))
-        x_i_dirich = as_dolfin_vector(np.zeros(len(x_r)))
-        E_r_dirich.apply(x_r_dirich)
-        E_i_dirich.apply(x_i_dirich)
-        self.dirich_dofs = x_r_dirich.array() + 1j*x_i_dirich.array()
-        self.functional.set_E_dofs(dofs)
+        self.field.set_dofs(dofs)
+
+    def set_field(self, field):
+        """Share the L{ComplexField} field instead of copying dofs"""
+        self.field = field
+        self.functional.set_E_field(field)
+        self._g_key = None
         
     def set_k0(self,k0):
         self.k0 = k0
         self.functional.set_k0(k0)
-        self.k0_dirty = True
         
     def set_epsr_function(self, epsr_function):
         self.epsr_function = epsr_function
@@ -110,10 +134,18 @@ class VariationalSurfaceFlux(object):
         self.mur_function = mur_function
         self.functional.set_mur_function(mur_function)
 
-    def calc_flux(self):
-        if self.k0_dirty:
+    def _update_g_dofs(self):
+        """Gather the boundary dofs into the testing function if needed"""
+        # The testing function only changes with the dofs or k0
+        g_key = (self.field.version, self.k0)
+        if g_key != self._g_key:
+            self.dirich_dofs[self.boundary_dofs] = self.field.get_dofs()[
+                self.boundary_dofs]
             self.functional.set_g_dofs(1j*self.dirich_dofs.conjugate()/self.k0/Z0)
-            self.k0_dirty = False
+            self._g_key = g_key
+
+    def calc_flux(self):
+        self._update_g_dofs()
         return self.functional.calc_functional().conjugate()
 
     def _get_mur_function(self):
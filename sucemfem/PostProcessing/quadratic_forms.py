@@ -0,0 +1,242 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+"""Postprocessed quantities that are quadratic in the solution dofs
+
+Power flux, stored energy and material losses are all of the form
+x^H Q x for a sparse Hermitian operator Q. The operators are assembled
+once and then evaluated cheaply for every solution of a frequency sweep
+or set of excitations.
+"""
+from __future__ import division
+
+import numpy as np
+import scipy.sparse
+
+from sucemfem.Consts import eps0, mu0, c0, Z0
+from sucemfem.Materials import MaterialPropertiesFactory
+from sucemfem.Assembly import nedelec1
+from sucemfem.Assembly.mesh_data import get_mesh_data
+from sucemfem.Assembly.numpy_assembly import NedelecOneAssembler
+from sucemfem.Sources.point_source import get_point_testing_matrix
+from sucemfem.PostProcessing.complex_field import ComplexField
+
+__all__ = ['calc_quadratic_form', 'QuadraticForms']
+
+def calc_quadratic_form(Q, x):
+    """Calculate x^H Q x
+
+    @param Q: sparse (n, n) operator
+    @param x: length n dof vector, (n, m) array of m dof vectors, or
+        L{ComplexField}
+    @return: the value, or length m array of values
+    """
+    if isinstance(x, ComplexField):
+        x = x.get_dofs()
+    x = np.asarray(x)
+    return np.sum(x.conj()*(Q*x), axis=0)
+
+class QuadraticForms(object):
+    """Assemble and evaluate quadratic postprocessing operators
+
+    The unit weight mass and curl-curl matrices of each material region
+    and the boundary flux matrix are assembled once, independent of
+    frequency. The operators of a frequency are weighted combinations of
+    these, cached by (quantity, region) for the current k0. Material values are taken
+    from the material properties at the set frequency, so dispersive and
+    lossy (complex) materials are supported.
+
+    Time convention e^(j*omega*t) and peak phasors are assumed, so the
+    stored energies and losses are time averages. The power flux follows
+    the L{power_flux} convention of integrating Re(E x H*).n over the
+    mesh boundary, i.e. twice the time average power. The boundary is
+    assumed to be in a non-magnetic region, as for L{power_flux.SurfaceFlux}.
+    """
+
+    def __init__(self, function_space, region_meshfunction=None,
+                 material_regions=None):
+        """Initialise the engine
+
+        @param function_space: dolfin FunctionSpace object of the solutions
+        @keyword region_meshfunction: dolfin MeshFunction mapping cells to
+            material region numbers. All cells are in region 0 if None
+        @keyword material_regions: material properties of each region, as
+            accepted by L{Materials.MaterialPropertiesFactory}
+        """
+        self.function_space = function_space
+        self.region_meshfunction = region_meshfunction
+        self.material_properties = MaterialPropertiesFactory(
+            material_regions).get_material_properties()
+        self._region_matrices = {}
+        self._flux_matrix = None
+        self._operators = {}
+
+    def set_frequency(self, frequency):
+        self.frequency = frequency
+        self.k0 = 2*np.pi*frequency/c0
+        # Only keep the operators of the current frequency
+        self._operators = dict((k, v) for k, v in self._operators.items()
+                               if k[2] == self.k0)
+
+    def set_k0(self, k0):
+        self.set_frequency(k0*c0/(2*np.pi))
+
+    def get_region_numbers(self):
+        if self.region_meshfunction is None:
+            return [0]
+        return [int(k) for k in np.unique(self.region_meshfunction.array())]
+
+    def _get_region_indicator(self, region_no):
+        mesh = self.function_space.mesh()
+        if self.region_meshfunction is None:
+            return np.ones(mesh.num_cells())*float(region_no == 0)
+        return np.float64(self.region_meshfunction.array() == region_no)
+
+    def _get_region_matrices(self, region_no):
+        """Return the unit weight (mass, curl-curl) matrices of a region"""
+        if region_no not in self._region_matrices:
+            indicator = self._get_region_indicator(region_no)
+            if nedelec1.is_nedelec_order1(self.function_space):
+                assembler = NedelecOneAssembler(self.function_space.mesh())
+                mats = tuple(assembler.assemble(kernel, indicator)
+                             for kernel in ('mass', 'stiffness'))
+            else:
+                mats = self._assemble_region_matrices_dolfin(indicator)
+            self._region_matrices[region_no] = mats
+        return self._region_matrices[region_no]
+
+    def _assemble_region_matrices_dolfin(self, indicator):
+        import dolfin
+        from sucemfem.Forms import EMGalerkinInteriorForms
+        from sucemfem.Utilities.Converters import dolfin_to_scipy_csr
+        V = self.function_space
+        indicator_fn = dolfin.Function(dolfin.FunctionSpace(V.mesh(), 'DG', 0))
+        indicator_fn.vector()[:] = indicator
+        forms = EMGalerkinInteriorForms()
+        forms.set_function_space(V)
+        return tuple(
+            dolfin_to_scipy_csr(dolfin.assemble(
+                form, tensor=dolfin.uBLASSparseMatrix()))
+            for form in (forms.get_weighted_mass_form(indicator_fn),
+                         forms.get_weighted_stiffness_form(indicator_fn)))
+
+    def _get_flux_matrix(self):
+        """Return B with B_ij = int n.(N_i x curl(N_j)) dS over the boundary
+
+        Integrated with the boundary quadrature rule of the mesh data.
+        """
+        if self._flux_matrix is None:
+            V = self.function_space
+            cells, points, normals, weights = get_mesh_data(
+                V.mesh()).get_boundary_quadrature()
+            P = get_point_testing_matrix(V, cells, points)
+            C = get_point_testing_matrix(V, cells, points, curl=True)
+            # Block diagonal matrix of w_q*(v x n_q) for each point q
+            no_pts = len(points)
+            n = normals*weights[:,np.newaxis]
+            zero = np.zeros(no_pts)
+            blocks = np.array([[zero, n[:,2], -n[:,1]],
+                               [-n[:,2], zero, n[:,0]],
+                               [n[:,1], -n[:,0], zero]]).transpose(2, 0, 1)
+            X = scipy.sparse.bsr_matrix(
+                (blocks, np.arange(no_pts), np.arange(no_pts+1)),
+                shape=(3*no_pts, 3*no_pts))
+            self._flux_matrix = (P*(X*C.T.tocsc())).tocsr()
+        return self._flux_matrix
+
+    def _get_material_value(self, region_no, pname):
+        try:
+            mat = self.material_properties[region_no]
+        except KeyError:
+            raise ValueError('Material number %d not found' % region_no)
+        return complex(mat.get_value_at(pname, self.frequency))
+
+    def _get_operator(self, name, region_no, calc_fn):
+        key = (name, region_no, self.k0)
+        if key not in self._operators:
+            self._operators[key] = calc_fn()
+        return self._operators[key]
+
+    def get_flux_operator(self):
+        """Return Q with x^H Q x the power flux through the boundary
+
+        With H = j curl(E)/(k0*Z0), n.(E x H*) integrates to
+        -j/(k0*Z0) x^T B conj(x), of which Q gives the real part.
+        """
+        def calc():
+            B = self._get_flux_matrix()
+            return ((-1j*B.T + 1j*B)/(2*self.k0*Z0)).tocsr()
+        return self._get_operator('flux', None, calc)
+
+    def get_electric_energy_operator(self, region_no):
+        """Return Q with x^H Q x the stored electric energy of a region"""
+        def calc():
+            eps_r = self._get_material_value(region_no, 'eps_r')
+            return eps0/4*eps_r.real*self._get_region_matrices(region_no)[0]
+        return self._get_operator('electric_energy', region_no, calc)
+
+    def get_magnetic_energy_operator(self, region_no):
+        """Return Q with x^H Q x the stored magnetic energy of a region"""
+        def calc():
+            mu_r_inv = 1/self._get_material_value(region_no, 'mu_r')
+            return (mu0/(4*self.k0**2*Z0**2)*mu_r_inv.real
+                    *self._get_region_matrices(region_no)[1])
+        return self._get_operator('magnetic_energy', region_no, calc)
+
+    def get_loss_operator(self, region_no):
+        """Return Q with x^H Q x the material power loss of a region
+
+        Lossy materials have negative imaginary eps_r or mu_r.
+        """
+        def calc():
+            omega = self.k0*c0
+            eps_r = self._get_material_value(region_no, 'eps_r')
+            mu_r_inv = 1/self._get_material_value(region_no, 'mu_r')
+            M, S = self._get_region_matrices(region_no)
+            return (omega*eps0/2*(-eps_r.imag)*M
+                    + omega*mu0/(2*self.k0**2*Z0**2)*mu_r_inv.imag*S)
+        return self._get_operator('loss', region_no, calc)
+
+    def _sum_regions(self, operator_fn, x, region_no):
+        if region_no is not None:
+            return calc_quadratic_form(operator_fn(region_no), x).real
+        return sum(calc_quadratic_form(operator_fn(k), x).real
+                   for k in self.get_region_numbers())
+
+    def calc_flux(self, x):
+        """Calculate the power flux through the boundary, see L{power_flux}
+
+        @param x: dofs of a solution, or (n, m) array of m solutions
+        """
+        return calc_quadratic_form(self.get_flux_operator(), x).real
+
+    def calc_electric_energy(self, x, region_no=None):
+        """Time average stored electric energy, in all regions by default"""
+        return self._sum_regions(self.get_electric_energy_operator,
+                                 x, region_no)
+
+    def calc_magnetic_energy(self, x, region_no=None):
+        """Time average stored magnetic energy, in all regions by default"""
+        return self._sum_regions(self.get_magnetic_energy_operator,
+                                 x, region_no)
+
+    def calc_losses(self, x, region_no=None):
+        """Time average material power loss, in all regions by default"""
+        return self._sum_regions(self.get_loss_operator, x, region_no)
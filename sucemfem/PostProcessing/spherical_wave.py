@@ -0,0 +1,296 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+"""Spherical wave expansion of far fields
+
+The far field of the outgoing spherical waves TE_nm and TM_nm is
+proportional to the tangential vector spherical harmonics r_hat x
+grad(Y_nm) and grad(Y_nm) respectively. A far field pattern is therefore
+expanded as
+
+E_ff(theta, phi) = sum_nm a_nm Psi1_nm(theta, phi) + b_nm Psi2_nm(theta, phi)
+
+with the orthonormal harmonics
+
+Psi1_nm = grad(Y_nm)/sqrt(n(n+1)),  Psi2_nm = r_hat x Psi1_nm
+
+where Y_nm are the orthonormal scalar spherical harmonics. Once the
+coefficients are known the far field can be evaluated in any direction
+without going back to the NTFF. The field radiated by sources inside a
+sphere of radius a is band-limited to roughly n <= k0*a, so only a few
+coefficients are needed for electrically small domains.
+
+This module has no dolfin dependency.
+"""
+from __future__ import division
+
+import numpy as np
+from sucemfem.Consts import Z0
+
+__all__ = ['get_truncation_order', 'normalised_legendre',
+           'vector_spherical_harmonics', 'SphericalWaveExpansion']
+
+def get_truncation_order(k0, radius, digits=6):
+    """Return the number of spherical modes needed for a source region
+
+    Uses the usual excess bandwidth rule N = k0*a + 1.8*digits^(2/3)*(k0*a)^(1/3)
+
+    @param k0: Free space wavenumber
+    @param radius: Radius of the minimum sphere, centred at the origin,
+        enclosing all the sources
+    @keyword digits: Number of significant digits of accuracy required
+    """
+    ka = k0*radius
+    return max(int(np.ceil(ka + 1.8*digits**(2/3)*ka**(1/3))), 1)
+
+def normalised_legendre(no_modes, theta):
+    """Calculate normalised associated Legendre functions of cos(theta)
+
+    The functions are normalised so that int_0^pi P_nm^2 sin(theta) dtheta = 1.
+
+    @param no_modes: Maximum order n
+    @param theta: length k array of elevation angles in radians
+    @return: (P, U, dP) -- (no_modes+1, no_modes+1, k) arrays indexed by
+        [n, m] with P_nm(cos(theta)), P_nm/sin(theta) and
+        dP_nm/dtheta. U is zero for m = 0, and is finite at the poles.
+    """
+    theta = np.atleast_1d(theta).astype(np.float64)
+    x, s = np.cos(theta), np.sin(theta)
+    N = no_modes
+    P = np.zeros((N+1, N+1, len(theta)))
+    U = np.zeros_like(P)
+    dP = np.zeros_like(P)
+    def recurse(F, m, F_mm):
+        # Upward recurrence in n for fixed m, valid for any function
+        # proportional to P_nm with an n independent factor
+        F[m,m] = F_mm
+        if m < N:
+            F[m+1,m] = x*np.sqrt(2*m + 3)*F_mm
+        for n in range(m+2, N+1):
+            a_n = np.sqrt((4*n**2 - 1)/(n**2 - m**2))
+            a_n1 = np.sqrt((4*(n-1)**2 - 1)/((n-1)**2 - m**2))
+            F[n,m] = a_n*(x*F[n-1,m] - F[n-2,m]/a_n1)
+    c_m = np.sqrt(1/2)
+    recurse(P, 0, c_m*np.ones_like(x))
+    for m in range(1, N+1):
+        c_m *= np.sqrt((2*m + 1)/(2*m))
+        recurse(U, m, c_m*s**(m-1))
+        P[:,m] = s*U[:,m]
+    for n in range(1, N+1):
+        dP[n,0] = -np.sqrt(n*(n+1))*P[n,1]
+        for m in range(1, n+1):
+            dP[n,m] = n*x*U[n,m] - np.sqrt(
+                (n**2 - m**2)*(2*n + 1)/(2*n - 1))*U[n-1,m]
+    return P, U, dP
+
+def _mode_indices(no_modes):
+    """Return the (n, m) of each coefficient, ordered by n then m"""
+    orders = range(1, no_modes+1)
+    n = np.concatenate([[i]*(2*i + 1) for i in orders])
+    m = np.concatenate([np.arange(-i, i+1) for i in orders])
+    return n.astype(int), m.astype(int)
+
+def vector_spherical_harmonics(no_modes, theta, phi):
+    """Evaluate the orthonormal tangential vector spherical harmonics
+
+    @param no_modes: Maximum order n
+    @param theta: length k array of elevation angles in radians
+    @param phi: length k array of azimuth angles in radians
+    @return: (Psi1, Psi2) -- (k, no_modes*(no_modes+2), 2) arrays with
+        the (theta, phi) components of the harmonics, ordered by n then m
+    """
+    theta = np.atleast_1d(theta).astype(np.float64)
+    phi = np.atleast_1d(phi).astype(np.float64)
+    P, U, dP = normalised_legendre(no_modes, theta)
+    n, m = _mode_indices(no_modes)
+    norm = 1/np.sqrt(2*np.pi*n*(n+1))
+    e_mphi = np.exp(1j*np.outer(phi, m))*norm
+    Psi1 = np.zeros((len(theta), len(n), 2), np.complex128)
+    Psi1[:,:,0] = dP[n,np.abs(m)].T*e_mphi
+    Psi1[:,:,1] = 1j*m*U[n,np.abs(m)].T*e_mphi
+    Psi2 = np.zeros_like(Psi1)
+    Psi2[:,:,0] = -Psi1[:,:,1]
+    Psi2[:,:,1] = Psi1[:,:,0]
+    return Psi1, Psi2
+
+class SphericalWaveExpansion(object):
+    """Far field pattern(s) represented by spherical wave coefficients
+
+    The coefficients of several solutions, e.g. the excitations of a
+    block solve, are stored together. Since the expansion is linear in
+    the far field, L{combine} gives the expansion of any superposition
+    of the solutions. Far fields are normalised to radius 1, as for the
+    NTFF classes.
+    """
+    # Maximum number of harmonic values calculated at once
+    chunk_size = 2000000
+
+    def __init__(self, coefficients, k0=None):
+        """Initialise with known coefficients
+
+        Use L{from_ntff} or L{from_samples} to calculate the coefficients.
+
+        @param coefficients: (2, N*(N+2)) array with the Psi1 and Psi2
+            coefficients, or (2, N*(N+2), m) array for m solutions
+        @keyword k0: Free space wavenumber of the solution(s)
+        """
+        self.coefficients = np.asarray(coefficients, dtype=np.complex128)
+        self.k0 = k0
+        no_coeffs = self.coefficients.shape[1]
+        self.no_modes = int(round(np.sqrt(no_coeffs + 1))) - 1
+        if self.no_modes*(self.no_modes + 2) != no_coeffs:
+            raise ValueError('Invalid number of coefficients %d' % no_coeffs)
+
+    @staticmethod
+    def get_sampling_grid(no_modes):
+        """Return (theta, phi, weights) of a sphere quadrature grid
+
+        Gauss-Legendre in cos(theta) and uniform in phi, integrating
+        products of harmonics up to order no_modes exactly.
+        """
+        no_theta, no_phi = no_modes + 2, 2*no_modes + 2
+        x, w = np.polynomial.legendre.leggauss(no_theta)
+        phi = np.arange(no_phi)*2*np.pi/no_phi
+        theta, phi = np.meshgrid(np.arccos(x), phi, indexing='ij')
+        weights = np.repeat(w*2*np.pi/no_phi, no_phi)
+        return theta.ravel(), phi.ravel(), weights
+
+    @classmethod
+    def from_samples(cls, no_modes, theta, phi, weights, E_ff, k0=None):
+        """Calculate coefficients by projecting sampled far fields
+
+        @param no_modes: Maximum order n of the expansion
+        @param theta, phi, weights: sphere quadrature grid in radians,
+            see L{get_sampling_grid}
+        @param E_ff: (k, 2) or (k, 2, m) array of (E_theta, E_phi) values
+        """
+        E_ff = np.asarray(E_ff)
+        E = E_ff.reshape(len(E_ff), 2, -1)*weights[:,np.newaxis,np.newaxis]
+        Psi1, Psi2 = vector_spherical_harmonics(no_modes, theta, phi)
+        coefficients = np.array(
+            [np.einsum('kjc,kcm->jm', Psi.conj(), E) for Psi in (Psi1, Psi2)])
+        if E_ff.ndim == 2:
+            coefficients = coefficients[:,:,0]
+        return cls(coefficients, k0)
+
+    @classmethod
+    def from_ntff(cls, ntff, radius=None, no_modes=None, digits=6):
+        """Calculate coefficients from an NTFF with its dofs and k0 set
+
+        The far field is calculated on a grid that is just fine enough
+        for the truncation order, using calc_pts() if the NTFF provides
+        it.
+
+        @param ntff: NTFF instance, e.g. L{surface_ntff.QuadratureNTFF}
+        @keyword radius: Radius of the minimum sphere enclosing the
+            sources. The largest distance of a mesh vertex from the
+            origin is used by default.
+        @keyword no_modes: Truncation order, calculated using
+            L{get_truncation_order} by default
+        @keyword digits: Accuracy used to calculate the truncation order
+        """
+        k0 = ntff.k0
+        if no_modes is None:
+            if radius is None:
+                coords = ntff.function_space.mesh().coordinates()
+                radius = np.sqrt(np.max(np.sum(coords**2, axis=1)))
+            no_modes = get_truncation_order(k0, radius, digits)
+        theta, phi, weights = cls.get_sampling_grid(no_modes)
+        theta_deg, phi_deg = np.rad2deg(theta), np.rad2deg(phi)
+        if hasattr(ntff, 'calc_pts'):
+            E_ff = ntff.calc_pts(theta_deg, phi_deg)
+        else:
+            E_ff = np.array([ntff.calc_pt(th, ph)
+                             for th, ph in zip(theta_deg, phi_deg)])
+        return cls.from_samples(no_modes, theta, phi, weights, E_ff, k0)
+
+    def get_no_solutions(self):
+        """Number of solutions, or None for a single solution"""
+        if self.coefficients.ndim == 2:
+            return None
+        return self.coefficients.shape[2]
+
+    def calc_pts(self, theta_deg, phi_deg):
+        """Evaluate the far field for arrays of directions
+
+        @param theta_deg: length k array of elevation angles in degrees
+        @param phi_deg: length k array of azimuth angles in degrees
+        @return: (k, 2) array of (E_theta, E_phi) values, or (k, 2, m)
+            array for m solutions
+        """
+        theta = np.deg2rad(np.atleast_1d(theta_deg))
+        phi = np.deg2rad(np.atleast_1d(phi_deg))
+        a, b = self.coefficients.reshape(2, self.coefficients.shape[1], -1)
+        E_ff = np.zeros((len(theta), 2, a.shape[1]), np.complex128)
+        chunk = max(self.chunk_size//(2*a.shape[0]), 1)
+        for start in range(0, len(theta), chunk):
+            sl = slice(start, start+chunk)
+            Psi1, Psi2 = vector_spherical_harmonics(
+                self.no_modes, theta[sl], phi[sl])
+            E_ff[sl] = (np.einsum('kjc,jm->kcm', Psi1, a)
+                        + np.einsum('kjc,jm->kcm', Psi2, b))
+        if self.coefficients.ndim == 2:
+            E_ff = E_ff[:,:,0]
+        return E_ff
+
+    def calc_pt(self, theta_deg, phi_deg):
+        """Evaluate the far field (E_theta, E_phi) in a single direction"""
+        return tuple(self.calc_pts(theta_deg, phi_deg)[0])
+
+    def calc_radiated_power(self):
+        """Return the power radiated by the far field(s)
+
+        By orthonormality the integral of |E_ff|^2 over the sphere is the
+        sum of the squared coefficient magnitudes.
+        """
+        return np.sum(np.abs(self.coefficients)**2, axis=(0, 1))/(2*Z0)
+
+    def combine(self, weights):
+        """Return the expansion of a weighted sum of the solutions
+
+        @param weights: length m array of complex solution weights, or
+            (m, p) array to calculate p combinations at once
+        """
+        return SphericalWaveExpansion(
+            np.dot(self.coefficients, weights), self.k0)
+
+    def __add__(self, other):
+        return SphericalWaveExpansion(
+            self.coefficients + other.coefficients, self.k0)
+
+    def __mul__(self, factor):
+        return SphericalWaveExpansion(self.coefficients*factor, self.k0)
+
+    __rmul__ = __mul__
+
+    def save(self, filename):
+        """Save the coefficients to a numpy .npz file"""
+        k0 = np.nan if self.k0 is None else self.k0
+        np.savez(filename, coefficients=self.coefficients, k0=k0)
+
+    @classmethod
+    def load(cls, filename):
+        """Load an expansion saved with L{save}"""
+        f = np.load(filename)
+        try:
+            k0 = float(f['k0'])
+            return cls(f['coefficients'], None if np.isnan(k0) else k0)
+        finally:
+            f.close()
@@ -0,0 +1,106 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+"""Storage and linear combination of multi-excitation solutions"""
+from __future__ import division
+
+import numpy as np
+
+class SuperpositionStore(object):
+    """Store the solutions of several excitations of the same system
+
+    Since the fields depend linearly on the excitations, the solution for
+    any weighted combination of the excitations, and any quantity that is
+    linear in the solution (e.g. far fields), follows from the stored
+    per-excitation values without solving again.
+    """
+    def __init__(self, solutions, names=None):
+        """
+        @param solutions: (n, m) array with the dof values of the solution
+            of each of the m excitations as columns
+        @keyword names: Optional sequence of m excitation names
+        """
+        self.solutions = np.asarray(solutions)
+        self.names = names
+        self.linear_quantities = {}
+
+    def get_no_excitations(self):
+        return self.solutions.shape[1]
+
+    def get_excitation_index(self, name):
+        return list(self.names).index(name)
+
+    def get_excitation_solution(self, index):
+        """Return the dofs of the solution of excitation number index"""
+        return self.solutions[:,index]
+
+    def _check_weights(self, weights):
+        weights = np.asarray(weights)
+        if weights.shape != (self.get_no_excitations(),):
+            raise ValueError('Expected %d excitation weights'
+                             % self.get_no_excitations())
+        return weights
+
+    def get_solution(self, weights):
+        """Return the dofs of the solution for excitation weights
+
+        @param weights: length m array of (complex) excitation weights
+        """
+        return np.dot(self.solutions, self._check_weights(weights))
+
+    def calc_linear_quantity(self, name, calc_fn, block=False):
+        """Calculate and store a quantity that is linear in the solution
+
+        @param name: Name to store the quantity under
+        @param calc_fn: Function calc_fn(dofs) that calculates the quantity
+            (a number or array) from solution dofs. It is called once for
+            each excitation.
+        @keyword block: If True, calc_fn(solutions) is instead called once
+            with the (n, m) block of all the solutions, and should return
+            an array with the excitation index as first axis. This allows
+            e.g. far fields to be calculated for all excitations together.
+        @return: array of per-excitation values with the excitation index
+            as first axis
+        """
+        if block:
+            values = np.asarray(calc_fn(self.solutions))
+        else:
+            values = np.array([calc_fn(self.get_excitation_solution(i))
+                               for i in range(self.get_no_excitations())])
+        self.linear_quantities[name] = values
+        return values
+
+    def get_linear_quantity(self, name, weights):
+        """Return stored quantity name for excitation weights"""
+        return np.tensordot(self._check_weights(weights),
+                            self.linear_quantities[name], axes=1)
+
+def get_steering_weights(positions, k0, theta, phi):
+    """Return array element weights that steer the main beam to theta, phi
+
+    @param positions: (m, 3) array of element positions
+    @param k0: Free space wavenumber
+    @param theta: Elevation angle of the beam in radians
+    @param phi: Azimuth angle of the beam in radians
+    @return: length m array of unit magnitude weights
+    """
+    r_hat = np.array([np.sin(theta)*np.cos(phi), np.sin(theta)*np.sin(phi),
+                      np.cos(theta)])
+    return np.exp(-1j*k0*np.dot(np.asarray(positions), r_hat))
@@ -25,6 +25,25 @@ import dolfin
 from dolfin import curl, cross, dx, ds, Constant, dot
 from sucemfem.Consts import Z0, c0
 import sucemfem.PostProcessing.ntff_expressions as ntff_expressions
+from sucemfem.Assembly.mesh_data import get_mesh_data
+from sucemfem.Sources.point_source import get_point_testing_matrix
+from sucemfem.PostProcessing.complex_field import ComplexField
+
+def get_spherical_unit_vectors(theta, phi):
+    """Return the spherical unit vectors for arrays of directions
+
+    @param theta: array of elevation angles in radians
+    @param phi: array of azimuth angles in radians
+    @return: (r_hat, theta_hat, phi_hat) -- (n, 3) arrays
+    """
+    theta = np.atleast_1d(theta).astype(np.float64)
+    phi = np.atleast_1d(phi).astype(np.float64)
+    r_hat = np.column_stack([np.sin(theta)*np.cos(phi),
+                             np.sin(theta)*np.sin(phi), np.cos(theta)])
+    theta_hat = np.column_stack([np.cos(theta)*np.cos(phi),
+                                 np.cos(theta)*np.sin(phi), -np.sin(theta)])
+    phi_hat = np.column_stack([-np.sin(phi), np.cos(phi), np.zeros_like(phi)])
+    return r_hat, theta_hat, phi_hat
 
 class SurfaceNTFFForms(object):
     def __init__(self, function_space):
@@ -32,8 +51,7 @@ class SurfaceNTFFForms(object):
         self.n = V.cell().n
         # \vec{r'}, i.e. rprime is simply the position vector
         self.rprime = V.cell().x
-        self.E_r = dolfin.Function(V)
-        self.E_i = dolfin.Function(V)
+        self.field = ComplexField(V)
         self.r_hat = ntff_expressions.get_r_hat()
         self.k0 = ntff_expressions.get_k0()
         self.theta_hat = ntff_expressions.get_theta_hat()
@@ -42,10 +60,14 @@ class SurfaceNTFFForms(object):
         self.phase = ntff_expressions.get_phase(self.k0, self.rprime, self.r_hat)
 
     def set_dofs(self, dofs):
-        x_r = np.real(dofs).copy()
-        x_i = np.imag(dofs).copy()
-        self.E_r.vector()[:] = x_r
-        self.E_i.vector()[:] = x_i
+        self.field.set_dofs(dofs)
+
+    def set_field(self, field):
+        """Share the L{ComplexField} field instead of copying dofs"""
+        self.field = field
+        # The forms refer to the functions of the previous field
+        self.__dict__.pop('N_form', None)
+        self.__dict__.pop('L_form', None)
 
     def get_N_form(self):
         try:
@@ -53,8 +75,9 @@ class SurfaceNTFFForms(object):
         except AttributeError:
             pass
         # Set up magnetic field and equivalent electric current forms
-        H_r = -curl(self.E_i)/(self.k0*Z0)
-        H_i = curl(self.E_r)/(self.k0*Z0)
+        E_r, E_i = self.field.get_functions()
+        H_r = -curl(E_i)/(self.k0*Z0)
+        H_i = curl(E_r)/(self.k0*Z0)
         J_r = cross(self.n, H_r)
         J_i = cross(self.n, H_i)
         #------------------------------
@@ -79,8 +102,9 @@ class SurfaceNTFFForms(object):
         except AttributeError:
             pass
         # Set up equivalent magnetic current forms
-        M_r = -cross(self.n, self.E_r)
-        M_i = -cross(self.n, self.E_i)
+        E_r, E_i = self.field.get_functions()
+        M_r = -cross(self.n, E_r)
+        M_i = -cross(self.n, E_i)
         #------------------------------
         # Set up form for far field potential L
         theta_hat = self.theta_hat
@@ -134,6 +158,9 @@ class NTFF(object):
     def set_dofs(self, dofs):
         self.forms.set_dofs(dofs)
 
+    def set_field(self, field):
+        self.forms.set_field(field)
+
     def set_frequency(self, frequency):
         self.frequency = frequency
         self.k0 = self.frequency*2*np.pi/c0
@@ -153,3 +180,170 @@ class NTFF(object):
         self._N.append([N_theta, N_phi])
         self._r_fac.append(r_fac)
         return (E_theta, E_phi)
+
+
+class QuadratureNTFF(object):
+    """Surface NTFF evaluated with boundary quadrature for many angles at once
+
+    Calculates the same far field as L{NTFF}, but instead of assembling
+    surface forms for every direction, the equivalent currents
+
+    J = n x H,  M = -n x E
+
+    are evaluated once at quadrature points on the mesh boundary. The far
+    field potentials N and L for a whole grid of directions are then
+    dense products of a phase matrix exp(j*k0*r_hat.r') with the weighted
+    currents. The boundary geometry and field evaluation matrices are set
+    up once and reused for all frequencies and dof vectors.
+
+    A block of solutions, e.g. from
+    L{ProblemConfigurations.EMDrivenProblem.DrivenProblemABC.solve_excitations},
+    can be transformed at the same time by passing an (n_dofs, m) array
+    to L{set_dofs}. A single solution can also be shared with other
+    postprocessors as a L{ComplexField}, see L{set_field}.
+    """
+    # Maximum number of phase matrix entries calculated at once
+    chunk_size = 2000000
+
+    def __init__(self, function_space):
+        self.function_space = function_space
+        self._geometry = None
+        self.field = None
+        self._traces = None
+        self._currents = None
+        self._currents_version = None
+
+    def set_dofs(self, dofs):
+        """Set the E-field dofs, or an (n_dofs, m) array of solutions"""
+        self.dofs = np.asarray(dofs)
+        self.field = None
+        self._traces = None
+        self._currents = None
+
+    def set_field(self, field):
+        """Share the L{ComplexField} field
+
+        The boundary traces of the field are cached with the field, so
+        that they are only recalculated once its dofs change.
+        """
+        self.field = field
+        self._currents = None
+
+    def get_dofs(self):
+        if self.field is not None:
+            return self.field.get_dofs()
+        return self.dofs
+
+    def set_k0(self, k0):
+        self.k0 = k0
+        self._currents = None
+
+    def set_frequency(self, frequency):
+        self.frequency = frequency
+        self.set_k0(self.frequency*2*np.pi/c0)
+
+    def _get_geometry(self):
+        """Return (points, normals, weights, E_matrix, curl_matrix)
+
+        The matrices evaluate E and curl(E) at the quadrature points as
+        (matrix*x).reshape(-1, 3).
+        """
+        if self._geometry is None:
+            V = self.function_space
+            cells, points, normals, weights = get_mesh_data(
+                V.mesh()).get_boundary_quadrature()
+            E_matrix = get_point_testing_matrix(V, cells, points).T.tocsr()
+            curl_matrix = get_point_testing_matrix(
+                V, cells, points, curl=True).T.tocsr()
+            self._geometry = (points, normals, weights, E_matrix, curl_matrix)
+        return self._geometry
+
+    def get_boundary_quadrature(self):
+        """Return the (points, normals, weights) of the boundary quadrature"""
+        return self._get_geometry()[:3]
+
+    def _calc_traces(self, dofs):
+        points, normals, weights, E_matrix, curl_matrix = self._get_geometry()
+        x = dofs.reshape(len(dofs), -1)
+        shape = (len(points), 3, x.shape[1])
+        return (E_matrix*x).reshape(shape), (curl_matrix*x).reshape(shape)
+
+    def get_boundary_traces(self):
+        """Return E and curl(E) at the quadrature points
+
+        @return: (E, curl_E) -- (n_points, 3, m) arrays
+        """
+        if self.field is not None:
+            return self.field.get_derived(
+                'boundary_quadrature_traces',
+                lambda field: self._calc_traces(field.get_dofs()))
+        if self._traces is None:
+            self._traces = self._calc_traces(self.dofs)
+        return self._traces
+
+    def get_weighted_currents(self):
+        """Return the weighted currents J and M as (n_points, 3, m) arrays"""
+        version = self.field.version if self.field is not None else None
+        if self._currents is None or version != self._currents_version:
+            points, normals, weights = self._get_geometry()[:3]
+            E, curl_E = self.get_boundary_traces()
+            H = 1j*curl_E/(self.k0*Z0)
+            n = normals[:,:,np.newaxis]
+            w = weights[:,np.newaxis,np.newaxis]
+            self._currents = (np.cross(n, H, axis=1)*w,
+                              -np.cross(n, E, axis=1)*w)
+            self._currents_version = version
+        return self._currents
+
+    def get_directions_chunk_size(self):
+        """Number of directions evaluated per phase matrix"""
+        no_pts = len(self._get_geometry()[0])
+        return max(self.chunk_size//max(no_pts, 1), 1)
+
+    def calc_potential(self, current, r_hat, theta_hat, phi_hat):
+        """Calculate the theta and phi components of a far field potential
+
+        @param current: (n_points, 3, m) weighted current at the quadrature
+            points, e.g. J to calculate N or M to calculate L
+        @param r_hat, theta_hat, phi_hat: (n, 3) spherical unit vectors of
+            the directions, see L{get_spherical_unit_vectors}
+        @return: (P_theta, P_phi) -- (n, m) arrays
+        """
+        points = self._get_geometry()[0]
+        m = current.shape[2]
+        phase = np.exp(1j*self.k0*np.dot(r_hat, points.T))
+        P = np.dot(phase, current.reshape(len(points), -1)).reshape(
+            len(r_hat), 3, m)
+        return (np.einsum('ak,akm->am', theta_hat, P),
+                np.einsum('ak,akm->am', phi_hat, P))
+
+    def calc_pts(self, theta_deg, phi_deg):
+        """Calculate the far field for arrays of directions
+
+        The far field is normalised to radius 1, as for L{NTFF.calc_pt}.
+
+        @param theta_deg: length n array of elevation angles in degrees
+        @param phi_deg: length n array of azimuth angles in degrees
+        @return: (n, 2) array of (E_theta, E_phi) values, or (n, 2, m)
+            array if a block of m solutions was set
+        """
+        J, M = self.get_weighted_currents()
+        k0 = self.k0
+        r_fac = 1j*k0*np.exp(-1j*k0)/(4*np.pi)
+        directions = get_spherical_unit_vectors(
+            np.deg2rad(theta_deg), np.deg2rad(phi_deg))
+        E_ff = np.zeros((len(directions[0]), 2, J.shape[2]), np.complex128)
+        chunk = self.get_directions_chunk_size()
+        for start in range(0, len(E_ff), chunk):
+            chunk_directions = [d[start:start+chunk] for d in directions]
+            N_theta, N_phi = self.calc_potential(J, *chunk_directions)
+            L_theta, L_phi = self.calc_potential(M, *chunk_directions)
+            E_ff[start:start+chunk,0] = -r_fac*(L_phi + Z0*N_theta)
+            E_ff[start:start+chunk,1] = r_fac*(L_theta - Z0*N_phi)
+        if self.get_dofs().ndim == 1:
+            E_ff = E_ff[:,:,0]
+        return E_ff
+
+    def calc_pt(self, theta_deg, phi_deg):
+        """Calculate the far field (E_theta, E_phi) in a single direction"""
+        return tuple(self.calc_pts(theta_deg, phi_deg)[0])
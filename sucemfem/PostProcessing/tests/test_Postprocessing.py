@@ -27,7 +27,8 @@ import numpy as np
 import dolfin
 
 # Module under test
-from sucemfem.PostProcessing import CalcEMFunctional
+from sucemfem.PostProcessing import CalcEMFunctional, Reconstruct
+from sucemfem.PostProcessing import PointEvaluationOperator
 
 class test_CalcEMFunctional(unittest.TestCase):
     def setUp(self):
@@ -49,3 +50,70 @@ class test_CalcEMFunctional(unittest.TestCase):
         self.DUT.set_E_dofs(self.g_dofs)
         val2 = self.DUT.calc_functional()        
         self.assertEqual(val1, val2)
+
+class test_Reconstruct(unittest.TestCase):
+    def setUp(self):
+        self.mesh = dolfin.UnitCube(2,2,2)
+        self.function_space = dolfin.FunctionSpace(
+            self.mesh, "Nedelec 1st kind H(curl)", 1)
+        nodofs = self.function_space.dofmap().global_dimension()
+        self.dofs = np.random.random(nodofs) + 1j*np.random.random(nodofs)
+        self.points = np.random.random((25, 3))*0.98 + 0.01
+        self.DUT = Reconstruct(self.function_space)
+        self.DUT.set_dof_values(self.dofs)
+
+    def _reference_values(self):
+        u_r = dolfin.Function(self.function_space)
+        u_i = dolfin.Function(self.function_space)
+        u_r.vector()[:] = np.require(np.real(self.dofs), requirements='C')
+        u_i.vector()[:] = np.require(np.imag(self.dofs), requirements='C')
+        return np.array([u_r(pt) + 1j*u_i(pt) for pt in self.points])
+
+    def test_reconstruct_points(self):
+        desired = self._reference_values()
+        actual = self.DUT.reconstruct_points(self.points, chunk_size=7)
+        self.assertEqual(actual.shape, (len(self.points), 3))
+        np.testing.assert_allclose(actual, desired, rtol=1e-10, atol=1e-12)
+
+    def test_reconstruct_no_points(self):
+        actual = self.DUT.reconstruct_points(np.zeros((0, 3)))
+        self.assertEqual(actual.shape, (0, 3))
+
+    def test_reconstruct_vector_lagrange(self):
+        V = dolfin.VectorFunctionSpace(self.mesh, "CG", 2)
+        dofs = np.random.random(V.dim()) + 1j*np.random.random(V.dim())
+        DUT = Reconstruct(V)
+        DUT.set_dof_values(dofs)
+        self.function_space, self.dofs = V, dofs
+        actual = DUT.reconstruct_points(self.points)
+        np.testing.assert_allclose(actual, self._reference_values(),
+                                   rtol=1e-10, atol=1e-12)
+
+    def test_reconstruct_chunks(self):
+        chunks = [self.points[:10], self.points[10:]]
+        actual = np.vstack(list(self.DUT.reconstruct_chunks(chunks)))
+        np.testing.assert_allclose(
+            actual, self.DUT.reconstruct_points(self.points))
+
+    def test_evaluation_operator(self):
+        DUT = self.DUT.get_evaluation_operator(self.points)
+        desired = self.DUT.reconstruct_points(self.points)
+        np.testing.assert_allclose(DUT.apply(self.dofs), desired)
+        block = np.column_stack([self.dofs, 2*self.dofs])
+        actual = DUT.apply(block)
+        self.assertEqual(actual.shape, (len(self.points), 3, 2))
+        np.testing.assert_allclose(actual[:,:,1], 2*desired)
+
+    def test_evaluation_operator_save_load(self):
+        import tempfile
+        DUT = self.DUT.get_evaluation_operator(self.points)
+        fd, filename = tempfile.mkstemp(suffix='.npz')
+        os.close(fd)
+        try:
+            DUT.save(filename)
+            loaded = PointEvaluationOperator.load(filename)
+        finally:
+            os.remove(filename)
+        np.testing.assert_equal(loaded.points, DUT.points)
+        np.testing.assert_allclose(loaded.apply(self.dofs),
+                                   DUT.apply(self.dofs))
@@ -0,0 +1,105 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+from __future__ import division
+
+import unittest
+import numpy as np
+import dolfin
+
+# Module under test:
+from sucemfem.PostProcessing import boundary_pipeline
+from sucemfem.PostProcessing import power_flux
+from sucemfem.PostProcessing import surface_ntff
+from sucemfem.PostProcessing import variational_ntff
+
+class test_BoundaryPostProcessor(unittest.TestCase):
+    order = 1
+
+    def setUp(self):
+        self.mesh = dolfin.UnitCube(2,2,2)
+        self.function_space = dolfin.FunctionSpace(
+            self.mesh, "Nedelec 1st kind H(curl)", self.order)
+        nodofs = self.function_space.dofmap().global_dimension()
+        self.dofs = np.random.random(nodofs) + 1j*np.random.random(nodofs)
+        self.k0 = 2*np.pi
+        self.theta_deg = np.array([0., 30., 90., 145.])
+        self.phi_deg = np.array([0., 45., 90., 270.])
+        self.DUT = boundary_pipeline.BoundaryPostProcessor(self.function_space)
+        self.DUT.add_quantity('flux', boundary_pipeline.SurfaceFluxQuantity())
+        self.DUT.add_quantity(
+            'variational_flux', boundary_pipeline.VariationalFluxQuantity())
+        self.DUT.add_quantity('far_field', boundary_pipeline.FarFieldQuantity(
+            self.theta_deg, self.phi_deg))
+        self.DUT.set_k0(self.k0)
+
+    def _calc_separately(self, dofs):
+        desired = {}
+        for name, cls in (('flux', power_flux.SurfaceFlux),
+                          ('variational_flux',
+                           power_flux.VariationalSurfaceFlux)):
+            flux = cls(self.function_space)
+            flux.set_k0(self.k0)
+            flux.set_dofs(dofs)
+            desired[name] = flux.calc_flux()
+        ntff = surface_ntff.QuadratureNTFF(self.function_space)
+        ntff.set_k0(self.k0)
+        ntff.set_dofs(dofs)
+        desired['far_field'] = ntff.calc_pts(self.theta_deg, self.phi_deg)
+        return desired
+
+    def test_calc(self):
+        self.DUT.set_dofs(self.dofs)
+        actual = self.DUT.calc()
+        desired = self._calc_separately(self.dofs)
+        self.assertAlmostEqual(actual['flux'], desired['flux'])
+        self.assertAlmostEqual(actual['variational_flux'],
+                               desired['variational_flux'])
+        np.testing.assert_almost_equal(actual['far_field'],
+                                       desired['far_field'])
+
+    def test_variational_far_field(self):
+        self.DUT.add_quantity(
+            'variational_far_field', boundary_pipeline.FarFieldQuantity(
+                self.theta_deg, self.phi_deg, variational=True))
+        self.DUT.set_dofs(self.dofs)
+        ntff = variational_ntff.BilinearNTFF(self.function_space)
+        ntff.set_k0(self.k0)
+        ntff.set_dofs(self.dofs)
+        np.testing.assert_almost_equal(
+            self.DUT.calc()['variational_far_field'],
+            ntff.calc_pts(self.theta_deg, self.phi_deg))
+
+    def test_block(self):
+        x = np.column_stack([self.dofs, 2j*self.dofs])
+        self.DUT.set_dofs(x)
+        actual = self.DUT.calc()
+        desired = self._calc_separately(self.dofs)
+        np.testing.assert_almost_equal(
+            actual['flux'], desired['flux']*np.array([1, 4]))
+        np.testing.assert_almost_equal(actual['far_field'][:,:,1],
+                                       2j*desired['far_field'])
+
+    def test_add_quantity(self):
+        self.assertRaises(ValueError, self.DUT.add_quantity, 'flux',
+                          boundary_pipeline.SurfaceFluxQuantity())
+
+class test_BoundaryPostProcessor_order2(test_BoundaryPostProcessor):
+    order = 2
@@ -0,0 +1,83 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+from __future__ import division
+
+import unittest
+import numpy as np
+import dolfin
+from sucemfem.Consts import c0
+
+# Module under test:
+from sucemfem.PostProcessing.complex_field import ComplexField
+from sucemfem.PostProcessing import power_flux
+from sucemfem.PostProcessing import surface_ntff
+
+class test_ComplexField(unittest.TestCase):
+    def setUp(self):
+        self.mesh = dolfin.UnitCube(2,2,2)
+        self.function_space = dolfin.FunctionSpace(
+            self.mesh, "Nedelec 1st kind H(curl)", 1)
+        nodofs = self.function_space.dofmap().global_dimension()
+        self.dofs = np.random.random(nodofs) + 1j*np.random.random(nodofs)
+        self.DUT = ComplexField(self.function_space)
+
+    def test_set_dofs(self):
+        self.assertEqual(self.DUT.version, 0)
+        self.DUT.set_dofs(self.dofs)
+        self.assertEqual(self.DUT.version, 1)
+        E_r, E_i = self.DUT.get_functions()
+        np.testing.assert_equal(E_r.vector().array(), self.dofs.real)
+        np.testing.assert_equal(E_i.vector().array(), self.dofs.imag)
+
+    def test_get_derived(self):
+        calls = []
+        def calc_fn(field):
+            calls.append(field.version)
+            return 2*field.get_dofs()
+        self.DUT.set_dofs(self.dofs)
+        self.DUT.get_derived('test', calc_fn)
+        actual = self.DUT.get_derived('test', calc_fn)
+        np.testing.assert_equal(actual, 2*self.dofs)
+        self.assertEqual(calls, [1])
+        self.DUT.set_dofs(3*self.dofs)
+        actual = self.DUT.get_derived('test', calc_fn)
+        np.testing.assert_equal(actual, 6*self.dofs)
+        self.assertEqual(calls, [1, 2])
+
+    def test_shared_postprocessors(self):
+        k0 = 2*np.pi
+        self.DUT.set_dofs(self.dofs)
+        for cls in (power_flux.SurfaceFlux, power_flux.VariationalSurfaceFlux):
+            shared = cls(self.function_space)
+            shared.set_k0(k0)
+            shared.set_field(self.DUT)
+            copied = cls(self.function_space)
+            copied.set_k0(k0)
+            copied.set_dofs(self.dofs)
+            self.assertAlmostEqual(shared.calc_flux(), copied.calc_flux())
+        ntff = surface_ntff.QuadratureNTFF(self.function_space)
+        ntff.set_frequency(c0)
+        ntff.set_field(self.DUT)
+        E_ff = ntff.calc_pts([0, 45], [0, 30])
+        # New field dofs are used without another set_field() call
+        self.DUT.set_dofs(2*self.dofs)
+        np.testing.assert_almost_equal(ntff.calc_pts([0, 45], [0, 30]),
+                                       2*E_ff)
@@ -0,0 +1,67 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+from __future__ import division
+
+import unittest
+import numpy as np
+import dolfin
+
+# Module under test:
+from sucemfem.PostProcessing import line_integrals
+
+class test_LineIntegrals(unittest.TestCase):
+    def setUp(self):
+        self.mesh = dolfin.UnitCube(3,3,3)
+        self.V = dolfin.FunctionSpace(self.mesh, "Nedelec 1st kind H(curl)", 3)
+        u_r = dolfin.interpolate(
+            dolfin.Expression(('0','0', '2*x[2]')), self.V)
+        u_i = dolfin.interpolate(
+            dolfin.Expression(('0','0', '-x[2]*x[2]')), self.V)
+        self.x = u_r.vector().array() + 1j*u_i.vector().array()
+        self.lines = np.array([[[0.5,0.35,0], [0.5,0.5,1]],
+                               [[0,0,0], [1,1,1]],
+                               [[1,1,1], [0,0,0]],
+                               [[0,0,1], [1,1,1]]])
+        self.desired = np.array([1, 1, -1, 0])*(1 - 1j/3)
+        self.DUT = line_integrals.LineIntegrals(self.V, self.lines)
+
+    def test_calc_integrals(self):
+        self.DUT.set_dofs(self.x)
+        np.testing.assert_almost_equal(self.DUT.calc_integrals(), self.desired)
+
+    def test_block(self):
+        self.DUT.set_dofs(np.column_stack([self.x, 2*self.x]))
+        actual = self.DUT.calc_integrals()
+        np.testing.assert_almost_equal(actual[:,0], self.desired)
+        np.testing.assert_almost_equal(actual[:,1], 2*self.desired)
+
+    def test_outside(self):
+        self.assertRaises(ValueError, line_integrals.get_line_integral_matrix,
+                          self.V, [[0.5, 0.5, 0.5], [0.5, 0.5, 1.5]])
+
+    def test_line_functional(self):
+        start, end = self.lines[1]
+        DUT = line_integrals.get_line_functional(self.V, start, end)
+        self.assertEqual(DUT.shape, (1, self.V.dim()))
+        np.testing.assert_almost_equal(DUT*self.x, self.desired[1:2])
+        # Cached with the function space
+        self.assertTrue(
+            line_integrals.get_line_functional(self.V, start, end) is DUT)
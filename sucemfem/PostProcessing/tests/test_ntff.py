@@ -26,10 +26,12 @@ import numpy as N
 import dolfin
 from sucemfem.Testing import Paths
 from sucemfem.Utilities.MeshGenerators import get_centred_cube
+from sucemfem.Assembly import nedelec1
 
 # Module under test:
 from sucemfem.PostProcessing import surface_ntff
 from sucemfem.PostProcessing import variational_ntff
+from sucemfem.PostProcessing import parallel_ntff
 
 class test_interpolant(unittest.TestCase):
     test_data_file = 'data/interpolant_test_data.pickle'
@@ -97,6 +99,50 @@ class test_surface_ntff(unittest.TestCase):
                                    rtol=self.rtol, atol=self.atol))
         
 
+class test_parallel_ntff(test_surface_ntff):
+    def setUp(self):
+        super(test_parallel_ntff, self).setUp()
+        self.DUT = parallel_ntff.ParallelNTFF(
+            surface_ntff.NTFF, self.environment.discretisation_space,
+            no_processes=2)
+
+    def test_ff(self):
+        env = self.environment
+        self.DUT.set_frequency(env.frequency)
+        self.DUT.set_dofs(env.discretisation_dofs)
+        actual_E_ff = self.DUT.calc_pts(env.theta_coords, env.phi_coords)
+        self.assertTrue(N.allclose(actual_E_ff, env.desired_E_ff,
+                                   rtol=self.rtol, atol=self.atol))
+
+class test_quadrature_ntff(test_surface_ntff):
+    # The boundary quadrature differs from that used by dolfin
+    rtol=1e-3
+
+    def setUp(self):
+        super(test_quadrature_ntff, self).setUp()
+        self.DUT = surface_ntff.QuadratureNTFF(
+            self.environment.discretisation_space)
+        self.atol = self.rtol*N.max(N.abs(self.environment.desired_E_ff))
+
+    def test_ff_pts(self):
+        env = self.environment
+        self.DUT.set_frequency(env.frequency)
+        self.DUT.set_dofs(env.discretisation_dofs)
+        actual_E_ff = self.DUT.calc_pts(env.theta_coords, env.phi_coords)
+        self.assertTrue(N.allclose(actual_E_ff, env.desired_E_ff,
+                                   rtol=self.rtol, atol=self.atol))
+
+    def test_ff_block(self):
+        env = self.environment
+        x = env.discretisation_dofs
+        self.DUT.set_frequency(env.frequency)
+        self.DUT.set_dofs(N.column_stack([x, 1j*x]))
+        actual_E_ff = self.DUT.calc_pts(env.theta_coords, env.phi_coords)
+        self.DUT.set_dofs(x)
+        desired_E_ff = self.DUT.calc_pts(env.theta_coords, env.phi_coords)
+        self.assertTrue(N.allclose(actual_E_ff[:,:,0], desired_E_ff))
+        self.assertTrue(N.allclose(actual_E_ff[:,:,1], 1j*desired_E_ff))
+
 class test_variational_ntff(test_surface_ntff):
     test_data_file = 'data/reference_variational_ntff-2-0.149896229-0.0499654096667.pickle'
     def setUp(self):
@@ -104,3 +150,62 @@ class test_variational_ntff(test_surface_ntff):
         self.environment = NTFFEnvironment(desired_file)
         self.DUT = variational_ntff.NTFF(self.environment.discretisation_space)
     
+
+class test_bilinear_ntff(test_quadrature_ntff):
+    test_data_file = test_variational_ntff.test_data_file
+
+    def setUp(self):
+        super(test_bilinear_ntff, self).setUp()
+        self.DUT = variational_ntff.BilinearNTFF(
+            self.environment.discretisation_space)
+
+class test_bilinear_ntff_order1(unittest.TestCase):
+    """Compare the lowest order closed form with the variational NTFF"""
+    rtol = 1e-10
+    frequency = 1e9
+
+    def setUp(self):
+        self.mesh = get_centred_cube(0.2, 0.05)
+        self.function_space = dolfin.FunctionSpace(
+            self.mesh, "Nedelec 1st kind H(curl)", 1)
+        n = self.function_space.dim()
+        self.dofs = N.random.random(n) + 1j*N.random.random(n)
+        self.theta_coords = N.array([0., 30., 90., 135., 180.])
+        self.phi_coords = N.array([0., 45., 100., 270., 330.])
+        self.DUT = variational_ntff.BilinearNTFF(self.function_space)
+        self.DUT.set_frequency(self.frequency)
+        self.DUT.set_dofs(self.dofs)
+        self.reference = variational_ntff.NTFF(self.function_space)
+        self.reference.set_frequency(self.frequency)
+        self.reference.set_dofs(self.dofs)
+
+    def test_skin_rows(self):
+        rows, S, M = self.DUT._get_skin_matrices()
+        self.assertTrue(nedelec1.is_nedelec_order1(self.function_space))
+        self.assertTrue(0 < len(rows) < self.function_space.dim())
+        self.assertEqual(S.shape, (len(rows), self.function_space.dim()))
+        self.assertEqual(M.shape, S.shape)
+
+    def test_E_H(self):
+        rows, KE = self.DUT.get_skin_product()
+        r_hat, theta_hat, phi_hat = surface_ntff.get_spherical_unit_vectors(
+            N.deg2rad(self.theta_coords), N.deg2rad(self.phi_coords))
+        actual = N.column_stack([
+            N.dot(self.DUT.calc_testing_dofs(r_hat, a_hat), KE[:,0])
+            for a_hat in (theta_hat, phi_hat)])
+        desired = N.array([self.reference.calc_pt_E_H(th_deg, ph_deg)
+                           for th_deg, ph_deg in zip(self.theta_coords,
+                                                     self.phi_coords)])
+        self.assertTrue(N.allclose(actual, desired, rtol=self.rtol,
+                                   atol=self.rtol*N.max(N.abs(desired))))
+
+    def test_ff_pts(self):
+        # The L term uses a different boundary quadrature, see
+        # test_quadrature_ntff
+        actual_E_ff = self.DUT.calc_pts(self.theta_coords, self.phi_coords)
+        desired_E_ff = N.array([self.reference.calc_pt(th_deg, ph_deg)
+                                for th_deg, ph_deg in zip(self.theta_coords,
+                                                          self.phi_coords)])
+        self.assertTrue(N.allclose(
+            actual_E_ff, desired_E_ff, rtol=1e-3,
+            atol=1e-3*N.max(N.abs(desired_E_ff))))
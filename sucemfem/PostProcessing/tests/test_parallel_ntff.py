@@ -0,0 +1,97 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+from __future__ import division
+
+import os
+import unittest
+import numpy as np
+
+# Module under test:
+from sucemfem.PostProcessing import parallel_ntff
+
+class PointwiseNTFF(object):
+    """Stand-in NTFF depending on the dofs, frequency and worker process"""
+    def __init__(self, function_space):
+        self.function_space = function_space
+
+    def set_frequency(self, frequency):
+        self.frequency = frequency
+
+    def set_dofs(self, dofs):
+        self.dofs = dofs
+
+    def calc_pt(self, theta_deg, phi_deg):
+        value = np.sum(self.dofs)*np.exp(1j*self.frequency*theta_deg)
+        return (value, phi_deg + 1j*os.getpid())
+
+class test_ParallelNTFF(unittest.TestCase):
+    def setUp(self):
+        self.dofs = np.random.random(10) + 1j*np.random.random(10)
+        self.theta_deg = np.linspace(0, 180, 37)
+        self.phi_deg = np.linspace(0, 360, 37)
+
+    def test_calc_pts(self):
+        DUT = parallel_ntff.ParallelNTFF(PointwiseNTFF, None, no_processes=3)
+        DUT.set_frequency(0.1)
+        DUT.set_dofs(self.dofs)
+        actual = DUT.calc_pts(self.theta_deg, self.phi_deg)
+        ntff = PointwiseNTFF(None)
+        ntff.set_frequency(0.1)
+        ntff.set_dofs(self.dofs)
+        desired = parallel_ntff.calc_pts_serial(
+            ntff, self.theta_deg, self.phi_deg)
+        np.testing.assert_equal(actual[:,0], desired[:,0])
+        np.testing.assert_equal(actual[:,1].real, self.phi_deg)
+        # Evaluated in worker processes
+        self.assertTrue(os.getpid() not in set(actual[:,1].imag))
+        DUT.close()
+
+    def test_persistent_pool(self):
+        DUT = parallel_ntff.ParallelNTFF(PointwiseNTFF, None, no_processes=3)
+        DUT.set_frequency(0.1)
+        DUT.set_dofs(self.dofs)
+        first = DUT.calc_pts(self.theta_deg, self.phi_deg)
+        ntff = PointwiseNTFF(None)
+        for frequency, dofs in ((0.2, self.dofs), (0.2, 2*self.dofs),
+                                (0.3, np.ones(20))):
+            DUT.set_frequency(frequency)
+            DUT.set_dofs(dofs)
+            actual = DUT.calc_pts(self.theta_deg, self.phi_deg)
+            ntff.set_frequency(frequency)
+            ntff.set_dofs(dofs)
+            desired = parallel_ntff.calc_pts_serial(
+                ntff, self.theta_deg, self.phi_deg)
+            np.testing.assert_equal(actual[:,0], desired[:,0])
+            if len(dofs) == len(self.dofs):
+                # The same worker processes are reused
+                pids = set(first[:,1].imag) | set(actual[:,1].imag)
+                self.assertTrue(len(pids) <= 3)
+        DUT.close()
+
+    def test_no_directions(self):
+        for no_processes in (1, 2):
+            DUT = parallel_ntff.ParallelNTFF(
+                PointwiseNTFF, None, no_processes=no_processes)
+            DUT.set_frequency(0.1)
+            DUT.set_dofs(self.dofs)
+            actual = DUT.calc_pts(np.zeros(0), np.zeros(0))
+            self.assertEqual(actual.shape, (0, 2))
+            DUT.close()
@@ -0,0 +1,104 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+from __future__ import division
+
+import unittest
+import numpy as np
+from sucemfem.Consts import Z0
+
+# Module under test:
+from sucemfem.PostProcessing import pattern_analysis
+
+class LinearArrayPattern(object):
+    """Far field of a linear array along the x axis
+
+    Without elements this is the far field of a z-directed dipole,
+    otherwise the elements have a cardioid pattern and the beam is steered
+    to theta_0 in the phi = 0 plane.
+    """
+    def __init__(self, no_elements, spacing, theta_0=0.):
+        self.positions = (np.arange(no_elements) - (no_elements - 1)/2)*spacing
+        self.kx_0 = 2*np.pi*np.sin(np.deg2rad(theta_0))
+
+    def calc_pts(self, theta_deg, phi_deg):
+        theta = np.deg2rad(theta_deg)
+        phi = np.deg2rad(phi_deg)
+        E_ff = np.zeros((len(theta), 2), np.complex128)
+        if len(self.positions) == 1:
+            E_ff[:,0] = np.sin(theta)
+            return E_ff
+        kx = 2*np.pi*np.sin(theta)*np.cos(phi) - self.kx_0
+        array_factor = np.sum(
+            np.exp(1j*np.outer(kx, self.positions)), axis=1)
+        E_ff[:,1] = (1 + np.cos(theta))*array_factor
+        return E_ff
+
+class BackwardBeamPattern(object):
+    """A cos^4 intensity beam along -z, no radiation into z > 0"""
+    def calc_pts(self, theta_deg, phi_deg):
+        E_ff = np.zeros((len(theta_deg), 2), np.complex128)
+        E_ff[:,0] = np.minimum(np.cos(np.deg2rad(theta_deg)), 0)**2
+        return E_ff
+
+class test_PatternAnalysis(unittest.TestCase):
+    def test_dipole(self):
+        DUT = pattern_analysis.PatternAnalysis(LinearArrayPattern(1, 0.))
+        P, error = DUT.calc_radiated_power()
+        self.assertAlmostEqual(P, 8*np.pi/3/(2*Z0), places=12)
+        D, theta, phi = DUT.calc_max_directivity()
+        self.assertAlmostEqual(D, 1.5, places=8)
+        self.assertAlmostEqual(theta, 90, places=2)
+        beam = DUT.calc_beam_parameters(phi_deg=0.)
+        self.assertAlmostEqual(beam['beamwidth'], 90, delta=0.01)
+        # The second beam at phi = 180 is the only other lobe in the cut
+        self.assertAlmostEqual(beam['sidelobe_level'], 0, places=6)
+        gain = DUT.calc_gain(90., 0., flux=2*P)
+        self.assertAlmostEqual(gain[0], 1.5, places=8)
+
+    def test_array(self):
+        pattern = LinearArrayPattern(8, 0.5, theta_0=20.)
+        DUT = pattern_analysis.PatternAnalysis(pattern)
+        beam = DUT.calc_beam_parameters()
+        self.assertTrue(DUT.no_evaluations < 10000)
+        # Reference values from a dense sampling of the cut
+        t = np.linspace(-180, 180, 360001)
+        U = pattern_analysis.PatternAnalysis(pattern)._cut_intensity(t, 0.)
+        dB = 10*np.log10(np.maximum(U/U.max(), 1e-30))
+        i0 = np.argmax(dB)
+        main_lobe = np.abs(t - t[i0]) < 20
+        desired_sll = np.max(dB[~main_lobe])
+        half_power = t[(dB >= 10*np.log10(0.5)) & main_lobe]
+        self.assertAlmostEqual(beam['peak_angle'], t[i0], delta=1e-2)
+        self.assertAlmostEqual(beam['sidelobe_level'], desired_sll,
+                               delta=beam['sidelobe_level_error'])
+        self.assertAlmostEqual(beam['beamwidth'],
+                               half_power.max() - half_power.min(),
+                               delta=2e-3 + beam['beamwidth_error'])
+
+    def test_beam_through_cut_ends(self):
+        DUT = pattern_analysis.PatternAnalysis(BackwardBeamPattern())
+        beam = DUT.calc_beam_parameters(phi_deg=0.)
+        self.assertAlmostEqual(abs(beam['peak_angle']), 180, delta=1e-2)
+        desired_bw = 2*np.rad2deg(np.arccos(0.5**0.25))
+        self.assertAlmostEqual(beam['beamwidth'], desired_bw,
+                               delta=2e-3 + beam['beamwidth_error'])
+        self.assertTrue(beam['beamwidth_error'] < 0.01)
+        self.assertTrue(np.isnan(beam['sidelobe_level']))
@@ -0,0 +1,84 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+from __future__ import division
+
+import unittest
+import numpy as np
+import dolfin
+
+from sucemfem.BoundaryConditions import ABCBoundaryCondition, BoundaryConditions
+from sucemfem.ProblemConfigurations import EMDrivenProblem
+from sucemfem.Sources.PostProcess import ComplexVoltageAlongLine
+from sucemfem.PostProcessing import circuit
+# Module under test:
+from sucemfem.PostProcessing import ports
+
+class test_S_matrix(unittest.TestCase):
+    def test_one_port(self):
+        Z = np.array([30+20j, 75-10j, 50])
+        actual = circuit.S_matrix(Z[:,np.newaxis,np.newaxis], 50.)
+        np.testing.assert_almost_equal(actual[:,0,0], circuit.S11(Z, 50.))
+
+    def test_matched(self):
+        Z0 = np.array([50., 75.])
+        np.testing.assert_almost_equal(
+            circuit.S_matrix(np.diag(Z0), Z0), np.zeros((2,2)))
+
+class test_VoltagePorts(unittest.TestCase):
+    def setUp(self):
+        self.mesh = dolfin.UnitCube(4,4,4)
+        abc = ABCBoundaryCondition()
+        abc.set_region_number(1)
+        bcs = BoundaryConditions()
+        bcs.add_boundary_condition(abc)
+        self.problem = EMDrivenProblem.DrivenProblemABC()
+        self.problem.set_mesh(self.mesh)
+        self.problem.set_basis_order(1)
+        self.problem.set_boundary_conditions(bcs)
+        self.problem.init_problem()
+        self.ports = [
+            ports.VoltagePort([[0.5,0.5,0.25], [0.5,0.5,0.75]], current=2.),
+            ports.VoltagePort([[0.25,0.25,0.5], [0.75,0.25,0.5]],
+                              reference_impedance=75.)]
+        self.DUT = ports.VoltagePorts(self.problem.function_space, self.ports)
+        self.frequencies = [1e8, 2e8]
+
+    def test_cached(self):
+        V = self.problem.function_space
+        endpoints = self.ports[0].endpoints
+        self.assertTrue(ports.get_port_functional(V, endpoints) is
+                        ports.get_port_functional(V, endpoints.copy()))
+
+    def test_calc_sweep(self):
+        result = self.DUT.calc_sweep(self.problem, self.frequencies)
+        self.assertEqual(result['Z'].shape, (2, 2, 2))
+        # Reciprocity
+        np.testing.assert_almost_equal(result['Z'][:,0,1]/result['Z'][:,1,0],
+                                       [1, 1])
+        self.problem.set_frequency(self.frequencies[1])
+        x = self.problem.solve_excitations(
+            self.DUT.get_excitations()).solutions
+        voltage = ComplexVoltageAlongLine(self.problem.function_space)
+        voltage.set_dofs(x[:,0])
+        Z_00 = -voltage.calculate_voltage(*self.ports[0].endpoints)/2.
+        self.assertAlmostEqual(result['Z'][1,0,0]/Z_00, 1)
+        np.testing.assert_almost_equal(result['S'][1],
+                                       self.DUT.calc_S_matrix(x))
@@ -75,4 +75,20 @@ class test_SurfaceFlux(unittest.TestCase):
         self.DUT.set_dofs(self.data['x'])
         # Desired result as calculated with gitrev 953c7063b02547f5233a29ced884ba5af0fd0fe3
         self.assertAlmostEqual(self.DUT.calc_flux(), (26.9015957282-7.85747240242e-08j))
+
+    def test_boundary_dofs(self):
+        x = self.data['x']
+        self.DUT.set_k0(self.k0)
+        self.DUT.set_dofs(x)
+        flux = self.DUT.calc_flux()
+        E_r = dolfin.Function(self.function_space)
+        E_r.vector()[:] = np.real(x).copy()
+        bc = dolfin.DirichletBC(
+            self.function_space, E_r, dolfin.DomainBoundary())
+        desired = dolfin.Vector(len(x))
+        bc.apply(desired)
+        np.testing.assert_equal(self.DUT.dirich_dofs.real, desired.array())
+        # New dofs at the same k0 should give a new result
+        self.DUT.set_dofs(2*x)
+        self.assertAlmostEqual(self.DUT.calc_flux()/flux, 4)
         
@@ -0,0 +1,110 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+from __future__ import division
+
+import unittest
+import numpy as np
+import dolfin
+from dolfin import dot, curl, dx
+from sucemfem.Consts import eps0, mu0, c0, Z0
+
+# Module under test:
+from sucemfem.PostProcessing import quadratic_forms
+from sucemfem.PostProcessing import power_flux
+
+class test_QuadraticForms(unittest.TestCase):
+    order = 1
+
+    def setUp(self):
+        self.mesh = dolfin.UnitCube(3,3,3)
+        self.function_space = dolfin.FunctionSpace(
+            self.mesh, "Nedelec 1st kind H(curl)", self.order)
+        nodofs = self.function_space.dofmap().global_dimension()
+        self.dofs = np.random.random(nodofs) + 1j*np.random.random(nodofs)
+        self.k0 = 2*np.pi
+        self.regions = dolfin.CellFunction('uint', self.mesh)
+        self.regions.set_all(0)
+        dolfin.CompiledSubDomain('x[0] < 0.5 + DOLFIN_EPS').mark(
+            self.regions, 1)
+        self.materials = {0:dict(eps_r=1, mu_r=1),
+                          1:dict(eps_r=4-0.5j, mu_r=2-0.1j)}
+        self.DUT = quadratic_forms.QuadraticForms(
+            self.function_space, self.regions, self.materials)
+        self.DUT.set_k0(self.k0)
+
+    def _get_functions(self):
+        E_r = dolfin.Function(self.function_space)
+        E_i = dolfin.Function(self.function_space)
+        E_r.vector()[:] = np.real(self.dofs).copy()
+        E_i.vector()[:] = np.imag(self.dofs).copy()
+        return E_r, E_i
+
+    def test_flux(self):
+        flux = power_flux.SurfaceFlux(self.function_space)
+        flux.set_k0(self.k0)
+        flux.set_dofs(self.dofs)
+        self.assertAlmostEqual(self.DUT.calc_flux(self.dofs),
+                               flux.calc_flux(), places=10)
+        Q = self.DUT.get_flux_operator()
+        self.assertAlmostEqual(abs(Q - Q.conj().T).max(), 0)
+
+    def test_energy_and_losses(self):
+        E_r, E_i = self._get_functions()
+        dx_1 = dx(1)
+        E2 = dot(E_r, E_r) + dot(E_i, E_i)
+        curlE2 = dot(curl(E_r), curl(E_r)) + dot(curl(E_i), curl(E_i))
+        assemble = lambda form: dolfin.assemble(form, cell_domains=self.regions)
+        int_E2 = assemble(E2*dx_1)
+        int_curlE2 = assemble(curlE2*dx_1)
+        eps_r, mu_r = self.materials[1]['eps_r'], self.materials[1]['mu_r']
+        omega = self.k0*c0
+        desired_We = eps0/4*eps_r.real*int_E2
+        desired_Wm = mu0/(4*self.k0**2*Z0**2)*(1/mu_r).real*int_curlE2
+        desired_loss = (omega*eps0/2*(-eps_r.imag)*int_E2 + omega*mu0/(
+            2*self.k0**2*Z0**2)*(1/mu_r).imag*int_curlE2)
+        self.assertAlmostEqual(
+            self.DUT.calc_electric_energy(self.dofs, 1)/desired_We, 1)
+        self.assertAlmostEqual(
+            self.DUT.calc_magnetic_energy(self.dofs, 1)/desired_Wm, 1)
+        self.assertAlmostEqual(self.DUT.calc_losses(self.dofs)/desired_loss, 1)
+
+    def test_region_matrices_dolfin(self):
+        # The dolfin assembly is used for all orders but 1, check it
+        # directly so that it is also covered for order 1
+        M, S = self.DUT._assemble_region_matrices_dolfin(
+            self.DUT._get_region_indicator(1))
+        E_r, E_i = self._get_functions()
+        assemble = lambda form: dolfin.assemble(form, cell_domains=self.regions)
+        int_E2 = assemble((dot(E_r, E_r) + dot(E_i, E_i))*dx(1))
+        int_curlE2 = assemble((dot(curl(E_r), curl(E_r))
+                               + dot(curl(E_i), curl(E_i)))*dx(1))
+        x = self.dofs
+        self.assertAlmostEqual(np.vdot(x, M*x).real/int_E2, 1)
+        self.assertAlmostEqual(np.vdot(x, S*x).real/int_curlE2, 1)
+
+    def test_block(self):
+        x = np.column_stack([self.dofs, 2j*self.dofs])
+        actual = self.DUT.calc_electric_energy(x)
+        desired = self.DUT.calc_electric_energy(self.dofs)
+        np.testing.assert_allclose(actual, [desired, 4*desired])
+
+class test_QuadraticForms_order2(test_QuadraticForms):
+    order = 2
@@ -0,0 +1,95 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+from __future__ import division
+
+import unittest
+import numpy as np
+
+# Module under test:
+from sucemfem.PostProcessing import spherical_wave
+
+class DipolePairNTFF(object):
+    """Analytical far field of two offset z-directed dipoles"""
+    def __init__(self, k0, offsets, currents):
+        self.k0 = k0
+        self.offsets = np.asarray(offsets)
+        self.currents = np.asarray(currents)
+
+    def calc_pts(self, theta_deg, phi_deg):
+        theta = np.deg2rad(theta_deg)
+        phi = np.deg2rad(phi_deg)
+        r_hat = np.column_stack([np.sin(theta)*np.cos(phi),
+                                 np.sin(theta)*np.sin(phi), np.cos(theta)])
+        phase = np.exp(1j*self.k0*np.dot(r_hat, self.offsets.T))
+        E_ff = np.zeros((len(theta), 2), np.complex128)
+        E_ff[:,0] = np.sin(theta)*np.dot(phase, self.currents)
+        return E_ff
+
+class test_spherical_harmonics(unittest.TestCase):
+    def test_orthonormality(self):
+        no_modes = 4
+        theta, phi, weights = \
+            spherical_wave.SphericalWaveExpansion.get_sampling_grid(no_modes)
+        Psi1, Psi2 = spherical_wave.vector_spherical_harmonics(
+            no_modes, theta, phi)
+        Psi = np.concatenate([Psi1, Psi2], axis=1)
+        gram = np.einsum('k,kic,kjc->ij', weights, Psi.conj(), Psi)
+        np.testing.assert_allclose(gram, np.eye(len(gram)), atol=1e-12)
+
+    def test_legendre_derivative(self):
+        theta = np.linspace(0.1, 3., 7)
+        h = 1e-6
+        P, U, dP = spherical_wave.normalised_legendre(5, theta)
+        P_p = spherical_wave.normalised_legendre(5, theta + h)[0]
+        P_m = spherical_wave.normalised_legendre(5, theta - h)[0]
+        np.testing.assert_allclose(dP, (P_p - P_m)/(2*h), atol=1e-7)
+
+class test_SphericalWaveExpansion(unittest.TestCase):
+    def setUp(self):
+        self.k0 = 2*np.pi
+        self.ntff = DipolePairNTFF(
+            self.k0, [[0.1, 0.2, -0.3], [-0.2, 0., 0.25]], [1., 0.5j])
+        self.theta_deg = np.array([0., 10., 45., 90., 133., 180.])
+        self.phi_deg = np.array([0., 271., 30., 187., 60., 90.])
+
+    def test_from_ntff(self):
+        DUT = spherical_wave.SphericalWaveExpansion.from_ntff(
+            self.ntff, radius=0.4, digits=8)
+        np.testing.assert_allclose(
+            DUT.calc_pts(self.theta_deg, self.phi_deg),
+            self.ntff.calc_pts(self.theta_deg, self.phi_deg), atol=1e-7)
+
+    def test_combine(self):
+        ntffs = [DipolePairNTFF(self.k0, [[0.1, 0., 0.]], [1.]),
+                 DipolePairNTFF(self.k0, [[0., 0., -0.2]], [1.])]
+        theta, phi, weights = \
+            spherical_wave.SphericalWaveExpansion.get_sampling_grid(12)
+        E_ff = np.dstack([ntff.calc_pts(np.rad2deg(theta), np.rad2deg(phi))
+                          for ntff in ntffs])
+        DUT = spherical_wave.SphericalWaveExpansion.from_samples(
+            12, theta, phi, weights, E_ff, self.k0)
+        self.assertEqual(DUT.get_no_solutions(), 2)
+        desired = (ntffs[0].calc_pts(self.theta_deg, self.phi_deg)
+                   - 2j*ntffs[1].calc_pts(self.theta_deg, self.phi_deg))
+        combined = DUT.combine([1., -2j])
+        np.testing.assert_allclose(
+            combined.calc_pts(self.theta_deg, self.phi_deg), desired,
+            atol=1e-8)
@@ -26,7 +26,15 @@ from sucemfem.Consts import Z0, c0
 from sucemfem import Geometry 
 from sucemfem.Interpolation import SurfaceInterpolant
 from sucemfem.PostProcessing import CalcEMFunctional
+from sucemfem.PostProcessing.complex_field import ComplexField
 from sucemfem.PostProcessing.surface_ntff import SurfaceNTFFForms
+from sucemfem.PostProcessing.surface_ntff import QuadratureNTFF
+from sucemfem.PostProcessing.surface_ntff import get_spherical_unit_vectors
+from sucemfem.Assembly import nedelec1
+from sucemfem.Assembly.mesh_data import get_mesh_data
+from sucemfem.Assembly.numpy_assembly import NedelecOneAssembler
+from sucemfem.Assembly.numpy_assembly import scatter_element_matrices
+from sucemfem.Utilities.Converters import dolfin_to_scipy_csr
 
 class TransformTestingExpression(object):
     """Dolfin expression for
@@ -80,6 +88,7 @@ class NTFF(object):
         self.surface_forms = SurfaceNTFFForms(self.function_space)
         self.testing_expression_gen = TransformTestingExpression()
         self.functional.set_cell_domains(self.cell_domains, self.cell_region)
+        self.set_field(ComplexField(self.function_space))
 
     def set_k0(self, k0):
         self.k0 = k0
@@ -90,8 +99,13 @@ class NTFF(object):
         self.set_k0(self.frequency*2*np.pi/c0)
 
     def set_dofs(self, dofs):
-        self.functional.set_E_dofs(dofs)
-        self.surface_forms.set_dofs(dofs)
+        self.field.set_dofs(dofs)
+
+    def set_field(self, field):
+        """Share the L{ComplexField} field instead of copying dofs"""
+        self.field = field
+        self.functional.set_E_field(field)
+        self.surface_forms.set_field(field)
 
     def calc_pt(self, theta_deg, phi_deg):
         # H-field contribution using variational calculation
@@ -129,3 +143,199 @@ class NTFF(object):
         self.functional.set_g_dofs(g_dofs)
         return self.functional.calc_functional()
 
+
+class BilinearNTFF(object):
+    """Variational NTFF using precomputed sparse matrices
+
+    Calculates the same far field as L{NTFF}. The variational functional
+
+    F(E, g) = <curl(E), curl(g)> - k0^2 <E, g>
+
+    over the cells touching the boundary is bilinear in E and g, so it
+    is evaluated as g^T (S - k0^2 M) E with the skin stiffness and mass
+    matrices S and M assembled once. K E = (S - k0^2 M) E is calculated
+    once per dof vector and frequency, after which the far field of each
+    direction is a dot product with its testing function dofs g.
+
+    For lowest order elements the testing dofs of a whole chunk of
+    directions are calculated in one vectorised pass from the closed
+    form edge interpolant, and only the rows of S and M belonging to
+    boundary edges are kept. Higher order testing functions are
+    interpolated per direction using L{SurfaceInterpolant}. The L term
+    is calculated with L{QuadratureNTFF}.
+    """
+    # Maximum number of testing dof values calculated at once
+    chunk_size = 2000000
+
+    def __init__(self, function_space):
+        self.function_space = function_space
+        self.surface_ntff = QuadratureNTFF(function_space)
+        self._skin_matrices = None
+        self._testing_edges = None
+        self._KE = None
+        self._KE_version = None
+
+    def set_k0(self, k0):
+        self.k0 = k0
+        self.surface_ntff.set_k0(k0)
+        self._KE = None
+
+    def set_frequency(self, frequency):
+        self.frequency = frequency
+        self.set_k0(self.frequency*2*np.pi/c0)
+
+    def set_dofs(self, dofs):
+        """Set the E-field dofs, or an (n_dofs, m) array of solutions"""
+        self.surface_ntff.set_dofs(dofs)
+        self._KE = None
+
+    def set_field(self, field):
+        """Share the L{ComplexField} field"""
+        self.surface_ntff.set_field(field)
+        self._KE = None
+
+    def get_dofs(self):
+        return self.surface_ntff.get_dofs()
+
+    def _get_skin_matrices(self):
+        """Return (rows, S, M) with the skin matrix rows of the testing dofs
+
+        rows is None if all the rows are kept.
+        """
+        if self._skin_matrices is None:
+            if nedelec1.is_nedelec_order1(self.function_space):
+                self._skin_matrices = self._calc_skin_matrices_nedelec1()
+            else:
+                self._skin_matrices = self._calc_skin_matrices_general()
+        return self._skin_matrices
+
+    def _calc_skin_matrices_nedelec1(self):
+        mesh = self.function_space.mesh()
+        md = get_mesh_data(mesh)
+        rows = self._get_testing_edges()[0]
+        # Cells connected to the boundary through an edge
+        skin = np.flatnonzero(np.in1d(md.cell_edges, rows).reshape(
+            md.cell_edges.shape).any(axis=1))
+        assembler = NedelecOneAssembler(mesh)
+        n = assembler.get_global_dimension()
+        S, M = [scatter_element_matrices(*assembler.calc_element_matrices(
+            kernel, elements=skin) + (n,))[rows]
+                for kernel in ('stiffness', 'mass')]
+        return rows, S, M
+
+    def _calc_skin_matrices_general(self):
+        V = self.function_space
+        cell_domains = dolfin.CellFunction('uint', V.mesh())
+        cell_domains.set_all(0)
+        Geometry.BoundaryEdgeCells(V.mesh()).mark(cell_domains, 1)
+        u = dolfin.TrialFunction(V)
+        v = dolfin.TestFunction(V)
+        forms = (dolfin.dot(dolfin.curl(v), dolfin.curl(u))*dolfin.dx(1),
+                 dolfin.dot(v, u)*dolfin.dx(1))
+        S, M = [dolfin_to_scipy_csr(dolfin.assemble(
+            form, tensor=dolfin.uBLASSparseMatrix(),
+            cell_domains=cell_domains)) for form in forms]
+        return None, S, M
+
+    def _get_testing_edges(self):
+        """Return (edges, tangents, midpoints) of the boundary edges
+
+        The tangents are the edge vectors, oriented from the lower to the
+        higher global vertex number as the Nedelec dofs.
+        """
+        if self._testing_edges is None:
+            md = get_mesh_data(self.function_space.mesh())
+            edge_vertices = np.zeros((md.num_edges, 2), np.int64)
+            edge_vertices[md.cell_edges.ravel()] = md.cells[
+                :, nedelec1.local_edge_vertices].reshape(-1, 2)
+            face_edges = md.cell_edges[
+                md.boundary_face_cells[:,np.newaxis],
+                nedelec1.local_face_edges[md.boundary_face_numbers]]
+            edges = np.unique(face_edges)
+            x = md.coordinates[edge_vertices[edges]]
+            self._testing_edges = (edges, x[:,1] - x[:,0],
+                                   (x[:,0] + x[:,1])/2)
+        return self._testing_edges
+
+    def _get_KE(self):
+        field = self.surface_ntff.field
+        version = field.version if field is not None else None
+        if self._KE is None or version != self._KE_version:
+            rows, S, M = self._get_skin_matrices()
+            dofs = self.get_dofs()
+            x = dofs.reshape(len(dofs), -1)
+            self._KE = S*x - self.k0**2*(M*x)
+            self._KE_version = version
+        return self._KE
+
+    def get_skin_product(self):
+        """Return (rows, KE) with KE = (S - k0^2 M) x over the skin cells
+
+        KE is an (n_rows, m) array, rows are the dof numbers of its rows,
+        or None if all the rows are kept.
+        """
+        return self._get_skin_matrices()[0], self._get_KE()
+
+    def calc_testing_dofs(self, r_hat, a_hat):
+        """Calculate the testing function dofs for a set of directions
+
+        The testing function is the interpolant of
+
+        1j/k0 r_hat x (a_hat x r_hat)*e^(j*k0*r_hat . r')
+
+        on the boundary, see L{TransformTestingExpression}.
+
+        @param r_hat: (n, 3) array of directions
+        @param a_hat: (n, 3) array of polarisation unit vectors
+        @return: (n, n_rows) array of testing dofs for the rows of the
+            skin matrices
+        """
+        k0 = self.k0
+        cf = np.cross(r_hat, np.cross(a_hat, r_hat))/k0
+        if nedelec1.is_nedelec_order1(self.function_space):
+            edges, tangents, midpoints = self._get_testing_edges()
+            return (1j*np.dot(cf, tangents.T)
+                    *np.exp(1j*k0*np.dot(r_hat, midpoints.T)))
+        expression_gen = TransformTestingExpression()
+        interpolator = SurfaceInterpolant(self.function_space)
+        g = np.zeros((len(r_hat), self.function_space.dim()), np.complex128)
+        for i in range(len(r_hat)):
+            expression_gen.set_parms(r_hat[i], a_hat[i], k0)
+            interpolator.set_interpolant_expression(
+                *expression_gen.get_expression())
+            g[i] = interpolator.calculate_interpolation()
+        return g
+
+    def calc_pts(self, theta_deg, phi_deg):
+        """Calculate the far field for arrays of directions
+
+        @param theta_deg: length n array of elevation angles in degrees
+        @param phi_deg: length n array of azimuth angles in degrees
+        @return: (n, 2) array of (E_theta, E_phi) values, or (n, 2, m)
+            array if a block of m solutions was set
+        """
+        KE = self._get_KE()
+        M_current = self.surface_ntff.get_weighted_currents()[1]
+        k0 = self.k0
+        r_fac = 1j*k0*np.exp(-1j*k0)/(4*np.pi)
+        r_hat, theta_hat, phi_hat = get_spherical_unit_vectors(
+            np.deg2rad(theta_deg), np.deg2rad(phi_deg))
+        E_ff = np.zeros((len(r_hat), 2, KE.shape[1]), np.complex128)
+        chunk = min(self.surface_ntff.get_directions_chunk_size(),
+                    max(self.chunk_size//len(KE), 1))
+        for start in range(0, len(E_ff), chunk):
+            sl = slice(start, start+chunk)
+            L_theta, L_phi = self.surface_ntff.calc_potential(
+                M_current, r_hat[sl], theta_hat[sl], phi_hat[sl])
+            E_H_theta = np.dot(self.calc_testing_dofs(r_hat[sl], theta_hat[sl]),
+                               KE)
+            E_H_phi = np.dot(self.calc_testing_dofs(r_hat[sl], phi_hat[sl]), KE)
+            E_ff[sl,0] = r_fac*(-L_phi + E_H_theta)
+            E_ff[sl,1] = r_fac*(L_theta + E_H_phi)
+        if self.get_dofs().ndim == 1:
+            E_ff = E_ff[:,:,0]
+        return E_ff
+
+    def calc_pt(self, theta_deg, phi_deg):
+        """Calculate the far field (E_theta, E_phi) in a single direction"""
+        return tuple(self.calc_pts(theta_deg, phi_deg)[0])
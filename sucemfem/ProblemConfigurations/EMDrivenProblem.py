@@ -26,8 +26,15 @@ import dolfin
 
 from sucemfem import Forms 
 from sucemfem import SystemMatrices
+from sucemfem.Materials import get_cell_values
 from sucemfem.Consts import c0, Z0
-from sucemfem.Utilities.Converters import dolfin_ublassparse_to_scipy_csr
+from sucemfem.Utilities.Converters import combine_csr_matrices
+from sucemfem.Utilities.LinalgSolvers import solve_sparse_block_system
+from sucemfem.Sources.current_source import CurrentSources
+from sucemfem.PostProcessing.superposition import SuperpositionStore
+from sucemfem.Utilities.Converters import dolfin_to_scipy_csr
+from sucemfem.Assembly.numpy_assembly import NedelecOneAssembler
+from sucemfem.Assembly.numpy_assembly import apply_essential_csr
 from EMProblem import EMProblem
 
 class CombineForms(Forms.CombineGalerkinForms):
@@ -37,6 +44,9 @@ class CombineForms(Forms.CombineGalerkinForms):
         ABC_form = self.boundary_conditions.get_bilinear_form()
         return dict(M=m, S=s, S_0=ABC_form)
 
+    def get_kernels(self):
+        return dict(M='mass', S='stiffness', S_0=self._get_boundary_kernel())
+
 class DrivenProblemABC(EMProblem):
     """Set up driven problem, potentially terminated by an ABC.
     
@@ -53,9 +63,20 @@ class DrivenProblemABC(EMProblem):
 
     where S, M are stiffness and mass matrices and k0 is the
     freespace wave-number
+
+    Regions with dispersive materials (see L{Materials.DispersionModel})
+    are assembled into S and M with their nominal material values. For
+    each such region unit weight mass or stiffness matrices M_r, S_r are
+    also assembled, so that A can be formed at any frequency from the
+    same matrices:
+
+    A += -k0**2*(eps_r(f) - eps_nom)*M_r + (1/mu_r(f) - 1/mu_nom)*S_r
     """
 
     FormCombiner = CombineForms
+    assembly_backends = EMProblem.assembly_backends + ('matrix_free',)
+    supports_dispersive_materials = True
+    dispersive_kernels = dict(eps_r='mass', mu_r='stiffness')
 
     def set_sources(self, sources):
         self.sources = sources
@@ -64,12 +85,56 @@ class DrivenProblemABC(EMProblem):
         """Set simulation frequency in Hz"""
         self.frequency = frequency
 
-    def get_LHS_matrix(self):
+    def get_LHS_matrix(self, stats=None):
+        """Return the complex system matrix A at the current frequency
+
+        A is formed from the real system matrices without copying them to
+        scipy first, see L{Utilities.Converters.combine_csr_matrices}. The
+        optional stats dict is updated with the bytes allocated to do so.
+
+        With the 'matrix_free' assembly backend a L{DrivenSystemOperator}
+        that applies A without assembling it is returned instead. It can be
+        used with the iterative solvers in L{Utilities.LinalgSolvers}.
+        """
+        k0 = 2*N.pi*self.frequency/c0
+        if self.assembly_backend == 'matrix_free':
+            return self.get_LHS_operator()
+        mats = self.system_matrices
+        terms = [(1, mats['S']), (-k0**2, mats['M']), (1j*k0, mats['S_0'])]
+        terms.extend(self._get_dispersive_terms(k0))
+        return combine_csr_matrices(terms, stats=stats)
+
+    def _get_dispersive_terms(self, k0):
+        """Return (coefficient, matrix) terms of the dispersive regions"""
+        mats = self.material_function_factory.region_material_properties
+        terms = []
+        for pname, region_no, mat in self.dispersive_matrices:
+            model = getattr(mats[region_no], pname)
+            value = model(self.frequency)
+            if pname == 'eps_r':
+                coeff = -k0**2*(value - model.nominal_value)
+            else:
+                coeff = 1/value - 1/model.nominal_value
+            terms.append((coeff, mat))
+        return terms
+
+    def get_LHS_operator(self, cache_element_matrices=False):
+        """Return a matrix-free operator for the system matrix A
+
+        Only basis order 1 is supported. See L{DrivenSystemOperator}.
+        """
+        from sucemfem.Assembly.matrix_free import DrivenSystemOperator
+        if self.basis_order != 1:
+            raise ValueError('Matrix-free operator only supports basis order 1')
         k0 = 2*N.pi*self.frequency/c0
-        M = dolfin_ublassparse_to_scipy_csr(self.system_matrices['M'])
-        S = dolfin_ublassparse_to_scipy_csr(self.system_matrices['S'])
-        S_0 = dolfin_ublassparse_to_scipy_csr(self.system_matrices['S_0'])
-        return S - k0**2*M + 1j*k0*S_0
+        num_cells = self.mesh.num_cells()
+        eps_r = get_cell_values(self.material_functions['eps_r'], num_cells)
+        mu_r = get_cell_values(self.material_functions['mu_r'], num_cells)
+        abc = self.combined_forms.get_kernels()['S_0'] is not None
+        return DrivenSystemOperator(
+            self.mesh, k0, eps_r=eps_r, mu_r=mu_r,
+            essential_dofs=self.boundary_conditions.get_essential_dofs(),
+            abc=abc, cache_element_matrices=cache_element_matrices)
 
     def get_RHS(self):
         RHS = N.zeros(self.get_global_dimension(), N.complex128)
@@ -79,14 +144,124 @@ class DrivenProblemABC(EMProblem):
         RHS[dofnos] += contribs
         return RHS
 
+    def get_RHS_block(self, excitations):
+        """Return the RHS vectors of several excitations as a block
+
+        @param excitations: sequence of excitations, each a
+            L{Sources.current_source.CurrentSources} collection, a single
+            L{Sources.current_source.CurrentSource}, or a set of incident
+            plane waves (L{Sources.plane_wave.PlaneWaveExcitation}) that
+            contributes one column per wave
+        @return: (n, m) array with the RHS vector of each excitation as
+            a column
+        """
+        k0 = 2*N.pi*self.frequency/c0
+        blocks = []
+        for excitation in excitations:
+            if hasattr(excitation, 'get_RHS_block'):
+                excitation.set_function_space(self.function_space)
+                block = excitation.get_RHS_block(k0)
+                # Constrained dofs of the total field are zero
+                block[self.boundary_conditions.get_essential_dofs()] = 0
+                blocks.append(block)
+                continue
+            if not hasattr(excitation, 'get_source_contributions'):
+                sources = CurrentSources()
+                sources.add_source(excitation)
+                excitation = sources
+            RHS = N.zeros((self.get_global_dimension(), 1), N.complex128)
+            dofnos, contribs = self._get_RHS_contributions(excitation)
+            RHS[dofnos, 0] += -1j*k0*Z0*contribs
+            blocks.append(RHS)
+        return N.hstack(blocks)
+
+    def solve_excitations(self, excitations, names=None, solver_type='lu',
+                          preconditioner_type='ilu'):
+        """Solve the system for several excitations at once
+
+        The system matrix is factorised (or preconditioned) only once, see
+        L{Utilities.LinalgSolvers.solve_sparse_block_system}.
+
+        @param excitations: sequence of excitations, see get_RHS_block()
+        @keyword names: Optional sequence of excitation names
+        @keyword solver_type: Block solver type
+        @keyword preconditioner_type: Preconditioner for iterative solvers
+        @return: L{PostProcessing.superposition.SuperpositionStore} with
+            the solution of each excitation
+        """
+        X = solve_sparse_block_system(
+            self.get_LHS_matrix(), self.get_RHS_block(excitations),
+            solver_type=solver_type, preconditioner_type=preconditioner_type)
+        return SuperpositionStore(X, names=names)
+
     def _init_system_matrices (self):
         """Initialise the system matrices associated with the problem. 
-        Matrices are stored in dolfin.uBLASSparseMatrix format.
+        Matrices are stored in dolfin.uBLASSparseMatrix format, so that
+        get_LHS_matrix() can use their CSR arrays without copying them.
         """ 
+        dispersive_regions = self._get_dispersive_regions()
+        if self.assembly_backend == 'matrix_free':
+            if dispersive_regions:
+                raise ValueError('Matrix-free operator does not support '
+                                 'dispersive materials')
+            # Nothing is assembled, see get_LHS_operator()
+            self.system_matrices = None
+            return
         EMProblem._init_system_matrices(
-            self, matrix_class=dolfin.uBLASSparseMatrix )
+            self, matrix_class=dolfin.uBLASSparseMatrix)
+        self._init_dispersive_matrices(dispersive_regions)
+
+    def _get_dispersive_regions(self):
+        """Return a list of (property name, region number) to assemble"""
+        mat_func_fac = self.material_function_factory
+        return [(pname, region_no)
+                for pname in ('eps_r', 'mu_r')
+                for region_no in mat_func_fac.get_dispersive_regions(pname)]
+
+    def _init_dispersive_matrices(self, dispersive_regions):
+        """Assemble the unit weight matrices of dispersive regions
+
+        The rows of constrained dofs are zeroed, so that the constrained
+        rows of A are determined by S, M and S_0 alone.
+        """
+        self.dispersive_matrices = []
+        if not dispersive_regions:
+            return
+        mat_func_fac = self.material_function_factory
+        indicators = dict((region_no, mat_func_fac.get_region_indicator(region_no))
+                          for pname, region_no in dispersive_regions)
+        if self.assembly_backend == 'numpy':
+            assembler = NedelecOneAssembler(self.mesh)
+            num_cells = self.mesh.num_cells()
+            region_mats = dict(
+                ((pname, region_no), assembler.assemble(
+                    self.dispersive_kernels[pname],
+                    get_cell_values(indicators[region_no], num_cells),
+                    num_threads=self.num_threads))
+                for pname, region_no in dispersive_regions)
+        else:
+            forms = self.interior_forms
+            form_fns = dict(eps_r=forms.get_weighted_mass_form,
+                            mu_r=forms.get_weighted_stiffness_form)
+            sysmats = SystemMatrices.SystemMatrices()
+            sysmats.set_matrix_class(dolfin.uBLASSparseMatrix)
+            sysmats.set_num_threads(self.num_threads)
+            sysmats.set_matrix_forms(dict(
+                ((pname, region_no), form_fns[pname](indicators[region_no]))
+                for pname, region_no in dispersive_regions))
+            sysmats.set_boundary_conditions(self.boundary_conditions)
+            region_mats = dict(
+                (k, dolfin_to_scipy_csr(mat))
+                for k, mat in sysmats.calc_system_matrices().items())
+        essential_dofs = self.boundary_conditions.get_essential_dofs()
+        for pname, region_no in dispersive_regions:
+            mat = apply_essential_csr(region_mats[pname, region_no],
+                                      essential_dofs, diagonal_value=0.)
+            self.dispersive_matrices.append((pname, region_no, mat))
 
-    def _get_RHS_contributions(self):
-        self.sources.set_function_space(self.function_space)
-        self.sources.init_sources()
-        return self.sources.get_source_contributions()
+    def _get_RHS_contributions(self, sources=None):
+        if sources is None:
+            sources = self.sources
+        sources.set_function_space(self.function_space)
+        sources.init_sources()
+        return sources.get_source_contributions()
@@ -32,6 +32,10 @@ class EMProblem(object):
     """
     A base class for solving electromagnetic problems
     """
+    assembly_backends = ('dolfin', 'numpy')
+    # Frequency dependent materials need problem specific support
+    supports_dispersive_materials = False
+
     def __init__ (self):
         self.element_type = "Nedelec 1st kind H(curl)"
         self.mesh = None
@@ -40,6 +44,9 @@ class EMProblem(object):
         self.material_regions = None
         self.region_meshfunction = None
         self.boundary_conditions = BoundaryConditions()
+        self.assembly_backend = 'dolfin'
+        self.num_threads = 1
+        self._material_cache = None
     
     def get_global_dimension(self):
         """Return total number of system dofs, including Dirichlet constrained dofs
@@ -84,6 +91,30 @@ class EMProblem(object):
     
     def set_region_meshfunction(self, region_meshfunction):
         self.region_meshfunction = region_meshfunction
+        # Force the material functions to be recalculated
+        self._material_cache = None
+
+    def set_assembly_backend(self, backend):
+        """Set the backend used to assemble the system matrices.
+
+        @param backend: 'dolfin' (default) to assemble the combined forms
+            with dolfin.assemble(), or 'numpy' to use closed form element
+            matrices calculated with NumPy. The 'numpy' backend only
+            supports basis order 1, and results in scipy CSR system
+            matrices.
+        """
+        if backend not in self.assembly_backends:
+            raise ValueError('Unknown assembly backend %s' % backend)
+        self.assembly_backend = backend
+
+    def set_num_threads(self, num_threads):
+        """Set the number of threads used to assemble the system matrices.
+
+        @param num_threads: Number of threads. Values larger than one
+            enable shared memory parallel assembly based on a mesh cell
+            colouring that is calculated once per mesh.
+        """
+        self.num_threads = num_threads
         
     def _init_boundary_conditions(self):
         """Initialise the boundary conditions associated with the problem.
@@ -111,28 +142,75 @@ class EMProblem(object):
         self.interior_forms.set_material_functions(self.material_functions)
         self.interior_forms.set_function_space(self.function_space)
             
+    def _get_material_key(self):
+        """Return a key identifying the current material specification"""
+        regions = self.material_regions
+        if regions is not None:
+            regions = tuple(sorted((region_no, tuple(sorted(values.items())))
+                                   for region_no, values in regions.items()))
+        return (id(self.mesh), id(self.region_meshfunction), regions)
+
     def _init_material_properties (self):
+        """Initialise the material functions, unless they are up to date
+
+        The material functions are reused by repeated calls to
+        init_problem() as long as the mesh, region meshfunction and
+        material regions are unchanged. Note that modifying the region
+        meshfunction in place is not detected; set it again with
+        set_region_meshfunction() after doing so.
+        """
+        key = self._get_material_key()
+        if self._material_cache is not None and self._material_cache[0] == key:
+            (self.material_function_factory,
+             self.material_functions) = self._material_cache[1:]
+            return
         mat_props_fac = Materials.MaterialPropertiesFactory ( self.material_regions )
+        material_properties = mat_props_fac.get_material_properties()
+        if not self.supports_dispersive_materials and any(
+            mat.is_dispersive(pname) for mat in material_properties.values()
+            for pname in ('eps_r', 'mu_r')):
+            raise ValueError('%s does not support dispersive materials'
+                             % self.__class__.__name__)
         mat_func_fac = Materials.MaterialFunctionFactory(
-            mat_props_fac.get_material_properties(), 
+            material_properties, 
             self.region_meshfunction, 
             self.mesh )
+        self.material_function_factory = mat_func_fac
         self.material_functions = mat_func_fac.get_material_functions ( 'eps_r', 'mu_r' )
+        self._material_cache = (key, mat_func_fac, self.material_functions)
     
     def _init_system_matrices (self, matrix_class=None):
         """Initialise the system matrices associated with the problem.
         
         @keyword matrix_class: An optional dolfin class to use for matrix storage.
-            (default: None).
+            (default: None). Ignored by the 'numpy' assembly backend.
         """
+        if self.assembly_backend == 'numpy':
+            self._init_system_matrices_numpy()
+            return
         bilin_forms = self.combined_forms.get_forms()
         sysmats = SystemMatrices.SystemMatrices()
         if matrix_class is not None:
             sysmats.set_matrix_class ( matrix_class )
+        sysmats.set_num_threads(self.num_threads)
         sysmats.set_matrix_forms(bilin_forms)
         sysmats.set_boundary_conditions(self.boundary_conditions)
         self.system_matrices = sysmats.calc_system_matrices()
 
+    def _init_system_matrices_numpy(self):
+        """Initialise the system matrices using the NumPy assembly backend
+        """
+        if self.basis_order != 1:
+            raise ValueError(
+                'NumPy assembly backend only supports basis order 1')
+        sysmats = SystemMatrices.NedelecOneSystemMatrices()
+        sysmats.set_mesh(self.mesh)
+        sysmats.set_num_threads(self.num_threads)
+        sysmats.set_matrix_kernels(self.combined_forms.get_kernels())
+        sysmats.set_material_functions(self.material_functions)
+        sysmats.set_boundary_conditions(self.boundary_conditions)
+        self.system_matrices = sysmats.calc_system_matrices()
+
     def init_problem(self):
         """Perform the final initialisation of the problem components.
         """
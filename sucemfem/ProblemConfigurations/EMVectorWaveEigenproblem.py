@@ -46,6 +46,9 @@ class CombineForms(Forms.CombineGalerkinForms):
         BC_bilin_forms = self.boundary_conditions.get_bilinear_form()
         return dict(M=m, S=s, BC=BC_bilin_forms)
 
+    def get_kernels(self):
+        return dict(M='mass', S='stiffness', BC=self._get_boundary_kernel())
+
 class EigenProblem(EMProblem):
     FormCombiner = CombineForms        
 
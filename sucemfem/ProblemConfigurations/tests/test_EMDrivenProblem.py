@@ -25,6 +25,7 @@ import pickle
 import numpy as N
 import dolfin
 
+from sucemfem import Materials
 from sucemfem.Testing import Meshes
 from sucemfem.Testing import Paths
 from sucemfem.Sources import point_source, current_source
@@ -71,6 +72,58 @@ class test_DrivenProblemABC(unittest.TestCase):
         self.assertTrue(N.allclose(
             actual_LHSmat, desired_LHSmat, rtol=1e-10, atol=3e-15))
 
+    def test_get_LHS_matrix_no_copy(self):
+        self.DUT.set_frequency(self.frequency)
+        self.DUT.init_problem()
+        stats = {}
+        A = self.DUT.get_LHS_matrix(stats=stats)
+        # Only the complex result and one real temporary are allocated,
+        # the uBLAS system matrices are not copied
+        self.assertEqual(stats['backend'], 'combined')
+        self.assertEqual(stats['bytes_allocated'], 24*A.nnz)
+
+    def test_get_LHS_matrix_numpy_backend(self):
+        self.DUT.set_frequency(self.frequency)
+        self.DUT.set_assembly_backend('numpy')
+        self.DUT.init_problem()
+        actual_LHSmat = self.DUT.get_LHS_matrix().todense()
+        desired_file = Paths.get_module_path_filename('LHS_matrix.npy', __file__)
+        desired_LHSmat = N.load(desired_file)
+        self.assertTrue(N.allclose(
+            actual_LHSmat, desired_LHSmat, rtol=1e-10, atol=3e-15))
+
+    def test_get_LHS_matrix_dispersive(self):
+        # A Debye model with zero relaxation time has the static value at
+        # all frequencies
+        eps_r = 4.
+        self.DUT.set_frequency(self.frequency)
+        self.DUT.set_material_regions({0:dict(eps_r=eps_r, mu_r=1)})
+        self.DUT.init_problem()
+        desired_LHSmat = self.DUT.get_LHS_matrix().todense()
+        for backend in ('dolfin', 'numpy'):
+            self.DUT.set_assembly_backend(backend)
+            self.DUT.set_material_regions({0:dict(
+                eps_r=Materials.DebyeModel(1., eps_r, 0.), mu_r=1)})
+            self.DUT.init_problem()
+            actual_LHSmat = self.DUT.get_LHS_matrix().todense()
+            self.assertTrue(N.allclose(
+                actual_LHSmat, desired_LHSmat, rtol=1e-10, atol=3e-15))
+
+    def test_solve_excitations(self):
+        self.DUT.set_frequency(self.frequency)
+        self.DUT.init_problem()
+        dipole_2 = point_source.PointCurrentSource()
+        dipole_2.set_position(self.source_coord + [0.01, 0, 0])
+        dipole_2.set_value([0, 1j, 0])
+        store = self.DUT.solve_excitations([self.current_sources, dipole_2])
+        A = self.DUT.get_LHS_matrix()
+        b_1 = self.DUT.get_RHS()
+        self.assertTrue(N.allclose(A*store.get_excitation_solution(0), b_1))
+        weights = N.array([2, -1j])
+        b_2 = self.DUT.get_RHS_block([dipole_2])[:,0]
+        self.assertTrue(N.allclose(A*store.get_solution(weights),
+                                   2*b_1 - 1j*b_2))
+
     def test_get_RHS(self):
         self.DUT.set_frequency(self.frequency)
         self.DUT.init_problem()
@@ -22,15 +22,29 @@ import dolfin
 import numpy as np
 from scipy.integrate import romberg
 from sucemfem.Utilities.Geometry import unit_vector, vector_length
-from sucemfem.Utilities.Converters import as_dolfin_vector
+from sucemfem.PostProcessing.complex_field import ComplexField
+from sucemfem.PostProcessing.line_integrals import get_line_functional
 
 class VoltageAlongLine(object):
-    """Measure voltage along a straight line between two points"""
+    """Measure voltage along a straight line between two points
+
+    For a dolfin Function the basis functions are integrated exactly
+    along the pieces of the line in each cell, see
+    L{PostProcessing.line_integrals}. The line functional is cached with
+    the function space for each pair of end points. Other field functions
+    are integrated numerically.
+    """
     def __init__(self, field_function):
         self.field_function = field_function
+        self.function_space = None
+        if hasattr(field_function, 'function_space'):
+            self.function_space = field_function.function_space()
 
     def calculate_voltage(self, start_pt, end_pt):
         fn = self.field_function
+        if self.function_space is not None:
+            L = get_line_functional(self.function_space, start_pt, end_pt)
+            return (L*fn.vector().array())[0]
         delta = end_pt - start_pt
         l_hat = unit_vector(delta)
         # Evaluate E . l_hat where E is the electric field vector and
@@ -44,23 +58,23 @@ class VoltageAlongLine(object):
         return intg
 
 class ComplexVoltageAlongLine(object):
-    """Measure complex voltage along a straight line between two points"""
+    """Measure complex voltage along a straight line between two points
+
+    The real and imaginary parts are integrated together, see
+    L{PostProcessing.line_integrals}. The line functional is cached with
+    the function space for each pair of end points.
+    """
     def __init__(self, function_space):
         self.function_space = function_space
+        self.set_field(ComplexField(function_space))
 
     def set_dofs(self, dofs):
-        self.dofs = dofs
-        self.x_r = as_dolfin_vector(self.dofs.real)
-        self.x_i = as_dolfin_vector(self.dofs.imag)
-        self.E_r = dolfin.Function(self.function_space, self.x_r)
-        self.E_i = dolfin.Function(self.function_space, self.x_i)
-        self.real_voltage = VoltageAlongLine(self.E_r)
-        self.imag_voltage = VoltageAlongLine(self.E_i)
+        self.field.set_dofs(dofs)
 
-    def calculate_voltage(self, start_pt, end_pt):
-        return (self.real_voltage.calculate_voltage(start_pt, end_pt) +
-                1j*self.imag_voltage.calculate_voltage(start_pt, end_pt))
-    
+    def set_field(self, field):
+        """Share the L{ComplexField} field instead of copying dofs"""
+        self.field = field
 
-        
-        
+    def calculate_voltage(self, start_pt, end_pt):
+        L = get_line_functional(self.function_space, start_pt, end_pt)
+        return (L*self.field.get_dofs())[0]
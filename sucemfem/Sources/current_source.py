@@ -19,14 +19,34 @@
 # Authors
 # Neilen Marais <nmarais@gmail.com>
 from __future__ import division
-import collections
-import itertools
 import numpy as N
 
+def sum_contributions(dofnos_list, values_list):
+    """Sum RHS contributions that may share dofs
+
+    @param dofnos_list: sequence of dof number arrays
+    @param values_list: sequence of value arrays matching dofnos_list
+    @rtype: (C{numpy.array}, C{numpy.array})
+    @return: (dofnos, rhs_contribs) -- the unique dof numbers and the summed
+        contributions to each, a sparse representation of the RHS vector.
+    """
+    if len(dofnos_list) == 0:
+        return N.array([], dtype=N.uint), N.array([])
+    dofnos = N.concatenate([N.asarray(d).ravel() for d in dofnos_list])
+    values = N.concatenate([N.asarray(v).ravel() for v in values_list])
+    unique_dofnos, inverse = N.unique(dofnos, return_inverse=True)
+    n = len(unique_dofnos)
+    rhs_contribs = N.bincount(inverse, weights=values.real, minlength=n)
+    if N.iscomplexobj(values):
+        rhs_contribs = rhs_contribs + 1j*N.bincount(
+            inverse, weights=values.imag, minlength=n)
+    return unique_dofnos.astype(N.uint), rhs_contribs
+
 
 class CurrentSources(object):
     def __init__(self):
         self.sources = []
+        self._contributions_cache = None
 
     def set_function_space(self, function_space):
         self.function_space = function_space
@@ -39,25 +59,50 @@ class CurrentSources(object):
             src.set_function_space(self.function_space)
         
     def get_source_contributions(self):
-        """Get and return the RHS contribution of the current source
-        """
-        contribs = collections.defaultdict(lambda : 0.)
-        for src in self.sources:
-            dofnos, values = src.get_contribution()
-            for dn, v in itertools.izip(dofnos, values):
-                contribs[dn] = contribs[dn] + v
+        """Get and return the RHS contribution of the current sources
 
-        dofnos = N.array(contribs.keys(), dtype=N.uint)
-        rhs_contribs = N.array(contribs.values())
-        return dofnos, rhs_contribs
+        The contributions of sources that have not changed since the
+        previous call are reused, see L{CurrentSource.get_cached_contribution}.
+
+        @rtype: (C{numpy.array}, C{numpy.array})
+        @return: (dofnos, rhs_contribs) with unique dofnos, see
+            L{sum_contributions}. The arrays may be cached and should not
+            be modified in place.
+        """
+        src_contribs = [src.get_cached_contribution() for src in self.sources]
+        cache = self._contributions_cache
+        if cache is not None and len(cache[0]) == len(src_contribs) and all(
+            c is cached for c, cached in zip(src_contribs, cache[0])):
+            return cache[1]
+        contribs = sum_contributions([dofnos for dofnos, values in src_contribs],
+                                     [values for dofnos, values in src_contribs])
+        self._contributions_cache = (src_contribs, contribs)
+        return contribs
 
 class CurrentSource(object):
-    """Abstract base class for current sources"""
+    """Abstract base class for current sources
+
+    Subclasses should call self._invalidate() whenever a parameter that
+    affects get_contribution() is changed.
+    """
+    _contribution = None
 
     def set_function_space(self, function_space):
         """Set function space that the source is to be applied to"""
+        if function_space is not getattr(self, 'function_space', None):
+            self._invalidate()
         self.function_space = function_space
 
+    def _invalidate(self):
+        """Discard the cached contribution"""
+        self._contribution = None
+
+    def get_cached_contribution(self):
+        """Return get_contribution(), calculating it only if the source changed"""
+        if self._contribution is None:
+            self._contribution = self.get_contribution()
+        return self._contribution
+
     def get_contribution(self):
         """Get and return the RHS contribution of the current source
         
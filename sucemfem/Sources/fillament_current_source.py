@@ -20,22 +20,37 @@ from __future__ import division
 
 import dolfin
 import numpy as np
-import collections
 
 from sucemfem.Sources.current_source import CurrentSource
-from sucemfem.Sources.point_source import calc_pointsource_contrib
+from sucemfem.Geometry import get_segment_quadrature
+from sucemfem.Geometry import get_segment_quadrature_points
+from sucemfem.Sources.point_source import calc_pointsource_contribs
+from sucemfem.Sources.point_source import calc_cell_pointsource_contribs
 from sucemfem.Utilities.Geometry import unit_vector, vector_length
 
 class FillamentCurrentSource(CurrentSource):
-    no_integration_points = 100
+    """Constant line current along a straight fillament
+
+    By default the fillament is clipped against the mesh cells, and the
+    basis functions are integrated along the piece in each cell using
+    Gauss-Legendre quadrature that is exact for the basis order.
+    """
+    # None for exact per-cell integration
+    no_integration_points = None
 
     def __init__(self, *names, **kwargs):
         self._dirty = True
         
     def set_no_integration_points(self, no_integration_points):
         """Set number of integration points to use along the length of
-        the fillament"""
+        the fillament
+
+        Instead of integrating exactly, the fillament is approximated by
+        no_integration_points evenly spaced point sources. Set to None to
+        restore exact integration.
+        """
         self.no_integration_points = no_integration_points
+        self._invalidate()
     
     def set_source_endpoints(self, source_endpoints):
         """Set the current filament endpoints.
@@ -46,39 +61,43 @@ class FillamentCurrentSource(CurrentSource):
         """
         self.source_endpoints = source_endpoints
         self._dirty = True
+        self._invalidate()
 
     def set_value(self, value):
         """Set line current value in Amperes"""
         self.value = value
         self._dirty = True
+        self._invalidate()
         
     def _update(self):
         if self._dirty:
             self.source_start, self.source_end = self.source_endpoints
             self.source_delta = self.source_end - self.source_start
             self.vector_value = unit_vector(self.source_delta)*self.value
-        self._dirty == False
+        self._dirty = False
             
     def get_contribution(self):
         self._update()
+        if self.no_integration_points is None:
+            return self._get_integrated_contribution()
         source_len = vector_length(self.source_delta)
         no_pts = self.no_integration_points
         if no_pts == 1:
-            intg_pts = [self.source_start + self.source_delta*0.5]
+            intg_pts = self.source_start + self.source_delta*0.5
         else:
             intg_pts = self.source_start + self.source_delta*np.linspace(
                 0,1,no_pts)[:, np.newaxis]
 
-        contribs = collections.defaultdict(lambda : 0.)
         point_magnitude = self.vector_value*source_len/no_pts
-        for pt in intg_pts:
-            dnos, vals = calc_pointsource_contrib(
-                self.function_space, pt, point_magnitude)
-            for dn, v in zip(dnos, vals):
-                contribs[dn] = contribs[dn] + v
+        return calc_pointsource_contribs(
+            self.function_space, intg_pts, point_magnitude)
 
-        dofnos = np.array(contribs.keys(), dtype=np.uint)
-        rhs_contribs = np.array(contribs.values())
-        return dofnos, rhs_contribs
-        
-        
+    def _get_integrated_contribution(self):
+        V = self.function_space
+        cell_indices, intg_pts, weights = get_segment_quadrature(
+            V.mesh(), self.source_start, self.source_end,
+            get_segment_quadrature_points(V))
+        if abs(np.sum(weights)/vector_length(self.source_delta) - 1) > 1e-6:
+            raise ValueError('Fillament does not lie inside the mesh')
+        return calc_cell_pointsource_contribs(
+            V, cell_indices, intg_pts, weights[:,np.newaxis]*self.vector_value)
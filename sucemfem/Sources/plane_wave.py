@@ -0,0 +1,144 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors
+# Neilen Marais <nmarais@gmail.com>
+"""Incident plane wave excitation for scattering problems"""
+from __future__ import division
+
+import numpy as np
+
+from sucemfem.Assembly.mesh_data import get_mesh_data
+from sucemfem.Sources.point_source import get_point_testing_matrix
+
+def get_incidence_vectors(theta, phi):
+    """Return the propagation and polarisation unit vectors of plane waves
+
+    @param theta: array of elevation angles in radians of the directions
+        the waves are incident from
+    @param phi: array of azimuth angles in radians
+    @return: (k_hat, theta_hat, phi_hat) -- (m, 3) arrays with the
+        propagation directions k_hat = -r_hat, and the spherical unit
+        vectors at (theta, phi)
+    """
+    theta = np.atleast_1d(theta)
+    phi = np.atleast_1d(phi)
+    r_hat = np.column_stack([np.sin(theta)*np.cos(phi),
+                             np.sin(theta)*np.sin(phi), np.cos(theta)])
+    theta_hat = np.column_stack([np.cos(theta)*np.cos(phi),
+                                 np.cos(theta)*np.sin(phi), -np.sin(theta)])
+    phi_hat = np.column_stack([-np.sin(phi), np.cos(phi), np.zeros_like(phi)])
+    return -r_hat, theta_hat, phi_hat
+
+class PlaneWaveExcitation(object):
+    """A set of incident plane waves for a total field formulation
+
+    The total field E is solved for, with the first order ABC applied to
+    the scattered field E - E_inc. The incident field then only enters
+    through the boundary term of the weak form, giving the RHS
+
+    b_i = j*k0*int_S (n x (k_hat x E_inc) - n x (n x E_inc)) . N_i dS
+
+    for each incident wave, where S is the ABC boundary. Since the system
+    matrix does not depend on the incident wave, all the waves can be
+    solved with a single factorisation, see
+    L{ProblemConfigurations.EMDrivenProblem.DrivenProblemABC.solve_excitations}.
+    The equivalent currents of the incident field on a closed surface
+    radiate no far field, so the usual NTFF of the total field gives the
+    scattered far field.
+
+    The ABC is applied to the whole mesh boundary, as is the case for
+    L{BoundaryConditions.ABCBoundaryCondition}. Boundary faces on a PEC
+    scatterer only affect constrained dofs, whose RHS entries are zeroed
+    by DrivenProblemABC.
+    """
+    # Maximum number of quadrature point values calculated at once
+    chunk_size = 2000000
+    _boundary_quadrature = None
+
+    def set_function_space(self, function_space):
+        if function_space is not getattr(self, 'function_space', None):
+            self._boundary_quadrature = None
+        self.function_space = function_space
+
+    def set_incidence(self, theta, phi, E_theta=0., E_phi=1.):
+        """Set the incidence directions and polarisations
+
+        @param theta: array of m elevation angles in radians of the
+            directions that the waves are incident from
+        @param phi: array of m azimuth angles in radians
+        @keyword E_theta: (complex) theta_hat component(s) of the incident
+            field at the origin (default: 0)
+        @keyword E_phi: (complex) phi_hat component(s) of the incident
+            field at the origin (default: 1)
+        """
+        self.k_hat, theta_hat, phi_hat = get_incidence_vectors(theta, phi)
+        m = len(self.k_hat)
+        E_theta = np.ones(m)*E_theta
+        E_phi = np.ones(m)*E_phi
+        self.polarisations = (E_theta[:,np.newaxis]*theta_hat
+                              + E_phi[:,np.newaxis]*phi_hat)
+
+    def get_no_excitations(self):
+        return len(self.k_hat)
+
+    def get_incident_field(self, k0, points, excitations=slice(None)):
+        """Evaluate the incident fields at points
+
+        @param k0: Free space wavenumber
+        @param points: (n, 3) array of points
+        @keyword excitations: Optional index or slice of the waves to use
+        @return: (m, n, 3) array of complex incident field values
+        """
+        phase = np.exp(-1j*k0*np.dot(self.k_hat[excitations],
+                                     np.asarray(points).T))
+        return (phase[:,:,np.newaxis]
+                *self.polarisations[excitations][:,np.newaxis,:])
+
+    def _get_boundary_quadrature(self):
+        """Return (points, normals, weights, testing_matrix) on the boundary"""
+        if self._boundary_quadrature is None:
+            V = self.function_space
+            cells, points, normals, weights = get_mesh_data(
+                V.mesh()).get_boundary_quadrature()
+            testing_matrix = get_point_testing_matrix(V, cells, points)
+            self._boundary_quadrature = (points, normals, weights,
+                                         testing_matrix)
+        return self._boundary_quadrature
+
+    def get_RHS_block(self, k0):
+        """Return the RHS vectors of the incident waves
+
+        @param k0: Free space wavenumber
+        @return: (n_dofs, m) complex array with the RHS of each wave as
+            a column
+        """
+        points, normals, weights, P = self._get_boundary_quadrature()
+        m = self.get_no_excitations()
+        RHS = np.zeros((P.shape[0], m), np.complex128)
+        chunk = max(self.chunk_size//max(len(points), 1), 1)
+        for start in range(0, m, chunk):
+            excitations = slice(start, min(start + chunk, m))
+            E_inc = self.get_incident_field(k0, points, excitations)
+            k_hat = self.k_hat[excitations][:,np.newaxis,:]
+            n = normals[np.newaxis,:,:]
+            integrand = (np.cross(n, np.cross(k_hat, E_inc))
+                         - np.cross(n, np.cross(n, E_inc)))
+            integrand *= 1j*k0*weights[np.newaxis,:,np.newaxis]
+            RHS[:,excitations] = P*integrand.reshape(len(E_inc), -1).T
+        return RHS
@@ -20,16 +20,20 @@
 # Neilen Marais <nmarais@gmail.com>
 from __future__ import division
 
-import itertools
 import dolfin
 import numpy as N
+from sucemfem.Geometry import get_cell_locator
+from sucemfem.Assembly import nedelec1
+from sucemfem.Assembly.mesh_data import get_mesh_data
 from sucemfem.Sources.current_source import CurrentSource
+from sucemfem.Sources.current_source import sum_contributions
 
 class PointCurrentSource(CurrentSource):
     def set_position(self, position):
         """Set point source position. Expects an array with x,y,z coordinates
         """
         self.position = N.array(position, dtype=N.float64)
+        self._invalidate()
 
     def set_value(self, value):
         """Set point value. Expects an array with x,y,z components of current
@@ -37,6 +41,7 @@ class PointCurrentSource(CurrentSource):
         iscomplex = N.any(N.iscomplex(value))
         dtype = N.complex128 if iscomplex else N.float64
         self.value = N.array(value, dtype=dtype)
+        self._invalidate()
 
     def get_contribution(self):
         """Get source contribution dofnos and value
@@ -46,6 +51,29 @@ class PointCurrentSource(CurrentSource):
         """
         return calc_pointsource_contrib(self.function_space, self.position, self.value)
 
+class PointCurrentSources(CurrentSource):
+    """An array of point current sources (electric dipoles)
+
+    All the sources are evaluated in one batch, see
+    L{calc_pointsource_contribs}.
+    """
+    def set_positions(self, positions):
+        """Set source positions as an (N,3) array of x,y,z coordinates"""
+        self.positions = N.array(positions, dtype=N.float64).reshape(-1, 3)
+        self._invalidate()
+
+    def set_values(self, values):
+        """Set source values as an (N,3) array of x,y,z current components"""
+        iscomplex = N.any(N.iscomplex(values))
+        dtype = N.complex128 if iscomplex else N.float64
+        self.values = N.array(values, dtype=dtype).reshape(-1, 3)
+        self._invalidate()
+
+    def get_contribution(self):
+        """Get the summed contribution dofnos and values of all the sources"""
+        return calc_pointsource_contribs(
+            self.function_space, self.positions, self.values)
+
 def calc_pointsource_contrib(V, source_coords, source_value):
     """Calculate the RHS contribution of a current point source (i.e. electric dipole)
     
@@ -59,26 +87,123 @@ def calc_pointsource_contrib(V, source_coords, source_value):
         
         C{RHS[dofnos] += rhs_contribs} will add the current source to the system's RHS.
     """
-    source_coords = N.asarray(source_coords, dtype=N.float64)
-    source_value = N.asarray(source_value)
+    return calc_pointsource_contribs(V, source_coords, source_value)
+
+def calc_pointsource_contribs(V, source_coords, source_values):
+    """Calculate the summed RHS contribution of a batch of point sources
+
+    The cells containing the sources are found in one pass using the
+    cell locator cached with the mesh. For lowest order Nedelec elements
+    the basis functions are evaluated for all the sources at once,
+    otherwise the dofs are tabulated once per cell.
+
+    @param V: dolfin FunctionSpace object
+    @param source_coords: (N,3) array with x,y,z coordinates of the sources
+    @param source_values: (N,3) array with x,y,z components of the source
+        currents, or a length 3 array to use the same value for all sources
+    
+    @rtype: (C{numpy.array}, C{numpy.array})
+    @return: (dofnos, rhs_contribs) -- the unique dofs affected by the
+        sources and their summed contributions, see
+        L{current_source.sum_contributions}
+    """
+    source_coords = N.asarray(source_coords, dtype=N.float64).reshape(-1, 3)
+    source_values = N.asarray(source_values)
+    source_values = source_values*N.ones((len(source_coords), 1))
+    cell_indices = get_cell_locator(V.mesh()).locate(source_coords)
+    if N.any(cell_indices < 0):
+        raise ValueError('Source point(s) outside the mesh: %s' %
+                         source_coords[cell_indices < 0])
+    return calc_cell_pointsource_contribs(
+        V, cell_indices, source_coords, source_values)
+
+def calc_cell_pointsource_contribs(V, cell_indices, source_coords,
+                                   source_values):
+    """Calculate the summed RHS contribution of point sources in known cells
+
+    As L{calc_pointsource_contribs}, but with the containing cells of the
+    sources given, e.g. for quadrature points of a known cell.
+
+    @param V: dolfin FunctionSpace object
+    @param cell_indices: length N array with the cell of each source
+    @param source_coords: (N,3) array with x,y,z coordinates of the sources
+    @param source_values: (N,3) array with x,y,z components of the source
+        currents
+    """
+    dofnos, basis_vals = evaluate_basis(V, cell_indices, source_coords)
+    contribs = N.einsum('nik,nk->ni', basis_vals, N.asarray(source_values))
+    return sum_contributions([dofnos], [contribs])
+
+def evaluate_basis(V, cell_indices, points):
+    """Evaluate the basis functions of V at points in known cells
+
+    For lowest order Nedelec elements the closed form basis is evaluated
+    for all the points at once, otherwise the dolfin element is evaluated
+    point by point, tabulating the dofs once per cell.
+
+    @param V: dolfin FunctionSpace object
+    @param cell_indices: length N array with the cell of each point
+    @param points: (N,3) array with x,y,z coordinates of the points
+    @return: (dofnos, basis_vals) -- (N, d) array with the dofs of each
+        point's cell and (N, d, 3) array with the basis function values
+    """
+    if nedelec1.is_nedelec_order1(V):
+        eval_fn = _eval_basis_nedelec1
+    else:
+        eval_fn = _eval_basis_general
+    return eval_fn(V, N.asarray(cell_indices),
+                   N.asarray(points, dtype=N.float64).reshape(-1, 3))
+
+def evaluate_basis_curls(V, cell_indices, points):
+    """Evaluate the curls of the basis functions of V at points in known cells
+
+    As L{evaluate_basis}, but returns the basis function curls. For lowest
+    order Nedelec elements these are constant per cell.
+    """
+    if nedelec1.is_nedelec_order1(V):
+        eval_fn = _eval_curls_nedelec1
+    else:
+        eval_fn = _eval_curls_general
+    return eval_fn(V, N.asarray(cell_indices),
+                   N.asarray(points, dtype=N.float64).reshape(-1, 3))
+
+def get_point_testing_matrix(V, cell_indices, points, curl=False):
+    """Return the sparse matrix that tests vector values at points
+
+    For a (N,3) array of point vector values f, P*f.ravel() is the vector
+    with entries sum_q f_q . N_i(x_q) for each basis function N_i. Many
+    sets of point values can be tested with a single sparse product. The
+    transpose of P evaluates a field with dofs x at the points as
+    (P.T*x).reshape(N, 3).
+
+    @param V: dolfin FunctionSpace object
+    @param cell_indices: length N array with the cell of each point
+    @param points: (N,3) array with x,y,z coordinates of the points
+    @keyword curl: test with the basis function curls instead (default: False)
+    @return: scipy.sparse.csr_matrix P of shape (V.dim(), 3*N)
+    """
+    import scipy.sparse
+    eval_fn = evaluate_basis_curls if curl else evaluate_basis
+    dofnos, basis_vals = eval_fn(V, cell_indices, points)
+    no_pts = len(dofnos)
+    cols = 3*N.arange(no_pts)[:,N.newaxis,N.newaxis] + N.arange(3)
+    rows, cols = N.broadcast_arrays(dofnos[:,:,N.newaxis], cols)
+    return scipy.sparse.coo_matrix(
+        (basis_vals.ravel(), (rows.ravel(), cols.ravel())),
+        shape=(V.dim(), 3*no_pts)).tocsr()
+
+def _eval_basis_nedelec1(V, cell_indices, points):
+    """Vectorised evaluation using the closed form Whitney basis"""
+    mesh_data = get_mesh_data(V.mesh())
+    grads = mesh_data.grads[cell_indices]
+    lam = nedelec1.barycentric_coordinates(
+        mesh_data.cell_coords[cell_indices], grads, points)
+    return mesh_data.cell_edges[cell_indices], nedelec1.basis_values(grads, lam)
+
+def _eval_basis_general(V, cell_indices, points):
+    """Evaluate using the dolfin element, tabulating dofs once per cell"""
+    mesh = V.mesh()
     dm = V.dofmap()
-    dofnos = N.zeros(dm.max_cell_dimension(), dtype=N.uintc)
-    source_pt = dolfin.Point(*source_coords)
-    io = V.mesh().intersection_operator()
-    try:
-#        cell_index = V.mesh().any_intersected_entity(source_pt)
-        cell_index = io.any_intersected_entity(source_pt)
-    except StandardError:
-        # CGAL as used by dolfin to implement intersection searches
-        # seems to break with 1-element meshes
-        if dolfin.Cell(V.mesh(), 0).intersects(source_pt):
-            cell_index = 0
-        else: raise
-    c = dolfin.Cell(V.mesh(), cell_index)
-    # Check that the source point is in this element    
-    assert(c.intersects_exactly(source_pt)) 
-
-    dm.tabulate_dofs(dofnos,  c)
     finite_element = V.dolfin_element()
     no_basis_fns = finite_element.space_dimension()
     # Vector valued elements have rank of 1
@@ -89,7 +214,54 @@ def calc_pointsource_contrib(V, source_coords, source_value):
     # this should be 3
     bf_value_dimension = finite_element.value_dimension(0)
     el_basis_vals = N.zeros((no_basis_fns, bf_value_dimension), dtype=N.float64)
-    finite_element.evaluate_basis_all(el_basis_vals, source_coords, c)
-    rhs_contribs = N.sum(el_basis_vals*source_value, axis=1)
-    return dofnos, rhs_contribs
+    cell_dofs = N.zeros(dm.max_cell_dimension(), dtype=N.uintc)
+    no_pts = len(points)
+    dofnos = N.zeros((no_pts, dm.max_cell_dimension()), dtype=N.uintc)
+    basis_vals = N.zeros((no_pts, no_basis_fns, bf_value_dimension),
+                         dtype=N.float64)
+    current_cell_index = None
+    for i in N.argsort(cell_indices, kind='mergesort'):
+        if cell_indices[i] != current_cell_index:
+            current_cell_index = cell_indices[i]
+            c = dolfin.Cell(mesh, int(current_cell_index))
+            dm.tabulate_dofs(cell_dofs,  c)
+        finite_element.evaluate_basis_all(el_basis_vals, points[i], c)
+        dofnos[i] = cell_dofs
+        basis_vals[i] = el_basis_vals
+    return dofnos, basis_vals
+
+def _eval_curls_nedelec1(V, cell_indices, points):
+    """Vectorised evaluation of the constant Whitney basis curls"""
+    mesh_data = get_mesh_data(V.mesh())
+    curls = nedelec1.curls(mesh_data.grads[cell_indices])
+    return mesh_data.cell_edges[cell_indices], curls
 
+def _eval_curls_general(V, cell_indices, points):
+    """Evaluate curls from the dolfin element first derivatives"""
+    mesh = V.mesh()
+    dm = V.dofmap()
+    finite_element = V.dolfin_element()
+    no_basis_fns = finite_element.space_dimension()
+    assert(finite_element.value_rank() == 1)
+    bf_value_dimension = finite_element.value_dimension(0)
+    # Derivatives are returned per basis function and value component
+    # along each of the three coordinate directions
+    el_derivs = N.zeros(no_basis_fns*bf_value_dimension*3, dtype=N.float64)
+    cell_dofs = N.zeros(dm.max_cell_dimension(), dtype=N.uintc)
+    no_pts = len(points)
+    dofnos = N.zeros((no_pts, dm.max_cell_dimension()), dtype=N.uintc)
+    curl_vals = N.zeros((no_pts, no_basis_fns, 3), dtype=N.float64)
+    current_cell_index = None
+    for i in N.argsort(cell_indices, kind='mergesort'):
+        if cell_indices[i] != current_cell_index:
+            current_cell_index = cell_indices[i]
+            c = dolfin.Cell(mesh, int(current_cell_index))
+            dm.tabulate_dofs(cell_dofs,  c)
+        finite_element.evaluate_basis_derivatives_all(1, el_derivs, points[i], c)
+        # D[f, comp, dir] = d(N_f)_comp/d(x_dir)
+        D = el_derivs.reshape(no_basis_fns, bf_value_dimension, 3)
+        curl_vals[i,:,0] = D[:,2,1] - D[:,1,2]
+        curl_vals[i,:,1] = D[:,0,2] - D[:,2,0]
+        curl_vals[i,:,2] = D[:,1,0] - D[:,0,1]
+        dofnos[i] = cell_dofs
+    return dofnos, curl_vals
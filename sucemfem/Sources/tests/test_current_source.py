@@ -0,0 +1,78 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+from __future__ import division
+
+
+import unittest
+import numpy as np
+
+# Module under test:
+from sucemfem.Sources import current_source
+
+class test_sum_contributions(unittest.TestCase):
+    def test_sum(self):
+        dofnos, rhs = current_source.sum_contributions(
+            [np.array([5, 2, 7]), np.array([7, 1, 5])],
+            [np.array([1., 2., 3.]), np.array([4j, 5., 6.])])
+        self.assertTrue(np.all(dofnos == [1, 2, 5, 7]))
+        self.assertTrue(np.allclose(rhs, [5., 2., 7., 3+4j]))
+
+    def test_empty(self):
+        dofnos, rhs = current_source.sum_contributions([], [])
+        self.assertEqual(len(dofnos), 0)
+        self.assertEqual(len(rhs), 0)
+
+class CountingSource(current_source.CurrentSource):
+    def __init__(self, dofnos, values):
+        self.dofnos = np.array(dofnos)
+        self.values = np.array(values)
+        self.no_calls = 0
+
+    def set_values(self, values):
+        self.values = np.array(values)
+        self._invalidate()
+
+    def get_contribution(self):
+        self.no_calls += 1
+        return self.dofnos, self.values
+
+class test_CurrentSources(unittest.TestCase):
+    def setUp(self):
+        self.src1 = CountingSource([0, 1], [1., 2.])
+        self.src2 = CountingSource([1, 3], [3., 4.])
+        self.DUT = current_source.CurrentSources()
+        self.DUT.add_source(self.src1)
+        self.DUT.add_source(self.src2)
+        self.DUT.set_function_space(None)
+        self.DUT.init_sources()
+
+    def test_caching(self):
+        dofnos, rhs = self.DUT.get_source_contributions()
+        self.assertTrue(np.all(dofnos == [0, 1, 3]))
+        self.assertTrue(np.allclose(rhs, [1., 5., 4.]))
+        self.DUT.init_sources()
+        self.DUT.get_source_contributions()
+        self.assertEqual(self.src1.no_calls, 1)
+        self.src2.set_values([-3., 4.])
+        dofnos, rhs = self.DUT.get_source_contributions()
+        self.assertEqual(self.src1.no_calls, 1)
+        self.assertEqual(self.src2.no_calls, 2)
+        self.assertTrue(np.allclose(rhs, [1., -1., 4.]))
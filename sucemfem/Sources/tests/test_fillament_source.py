@@ -102,3 +102,32 @@ class test_fillament_source(unittest.TestCase):
         self.assertTrue(isinstance(cs, FillamentCurrentSource))
         self.assertEqual(cs.value, self.fillament_current)
         self.assertTrue(np.all(cs.source_endpoints == self.fillament_endpoints))
+
+class test_fillament_integration(unittest.TestCase):
+    def setUp(self):
+        self.mesh = dolfin.UnitCube(2,2,2)
+        self.V = dolfin.FunctionSpace(self.mesh, "Nedelec 1st kind H(curl)", 1)
+        self.DUT = FillamentCurrentSource()
+        self.DUT.set_function_space(self.V)
+        self.DUT.set_value(2.)
+
+    def _get_rhs(self):
+        dofnos, rhs_contribs = self.DUT.get_contribution()
+        rhs = np.zeros(self.V.dim())
+        rhs[dofnos] = rhs_contribs
+        return rhs
+
+    def test_edge(self):
+        # The tangential integral of a lowest order basis function is one
+        # along its own edge and zero along other edges
+        self.DUT.set_source_endpoints(np.array([[0,0,0], [0.5,0,0.]]))
+        rhs = self._get_rhs()
+        self.assertAlmostEqual(np.max(np.abs(rhs)), 2.)
+        self.assertAlmostEqual(np.sum(np.abs(rhs)), 2.)
+
+    def test_sampled(self):
+        self.DUT.set_source_endpoints(np.array([[0.1,0.2,0.3], [0.8,0.6,0.7]]))
+        exact = self._get_rhs()
+        self.DUT.set_no_integration_points(2000)
+        sampled = self._get_rhs()
+        self.assertTrue(np.allclose(sampled, exact, atol=1e-2*np.max(exact)))
@@ -0,0 +1,76 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+from __future__ import division
+
+
+import unittest
+import numpy as np
+import dolfin
+
+from sucemfem.BoundaryConditions import ABCBoundaryCondition, BoundaryConditions
+from sucemfem.ProblemConfigurations.EMDrivenProblem import DrivenProblemABC
+from sucemfem.Consts import c0
+# Module under test:
+from sucemfem.Sources import plane_wave
+
+class test_PlaneWaveExcitation(unittest.TestCase):
+    def setUp(self):
+        self.mesh = dolfin.UnitCube(6,6,6)
+        self.wavelength = 2.
+        self.k0 = 2*np.pi/self.wavelength
+        self.DUT = plane_wave.PlaneWaveExcitation()
+        self.DUT.set_incidence([0., 0.7, 2.], [0., 0.3, 1.1],
+                               E_theta=[1, 0.5, 0], E_phi=[0, 1j, 1])
+
+    def _get_edge_integrals(self):
+        """Integrals of the incident fields along the mesh edges"""
+        # Dofs are oriented from the lower to the higher vertex number
+        edge_vertices = np.sort([e.entities(0) for e in dolfin.edges(self.mesh)],
+                                axis=1)
+        coords = self.mesh.coordinates()
+        start, end = coords[edge_vertices[:,0]], coords[edge_vertices[:,1]]
+        xi, w = np.polynomial.legendre.leggauss(4)
+        integrals = 0
+        for xi_q, w_q in zip(xi, w):
+            E_inc = self.DUT.get_incident_field(
+                self.k0, start + (end - start)*(xi_q + 1)/2)
+            integrals = integrals + w_q/2*np.sum(E_inc*(end - start), axis=2)
+        return integrals
+
+    def test_empty_domain(self):
+        # Without a scatterer the total field is the incident field
+        abc = ABCBoundaryCondition()
+        abc.set_region_number(1)
+        bcs = BoundaryConditions()
+        bcs.add_boundary_condition(abc)
+        dp = DrivenProblemABC()
+        dp.set_mesh(self.mesh)
+        dp.set_basis_order(1)
+        dp.set_boundary_conditions(bcs)
+        dp.set_assembly_backend('numpy')
+        dp.init_problem()
+        dp.set_frequency(c0/self.wavelength)
+        store = dp.solve_excitations([self.DUT])
+        desired = self._get_edge_integrals()
+        for i in range(3):
+            actual = store.get_excitation_solution(i)
+            self.assertTrue(np.linalg.norm(actual - desired[i])
+                            < 0.05*np.linalg.norm(desired[i]))
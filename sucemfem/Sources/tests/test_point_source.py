@@ -0,0 +1,84 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+from __future__ import division
+
+
+import unittest
+import numpy as np
+import dolfin
+
+# Module under test:
+from sucemfem.Sources import point_source
+
+def reference_pointsource_contrib(V, source_coords, source_value):
+    """Point source contribution evaluated with the dolfin element
+
+    Locates the cell with dolfin's intersection operator and evaluates
+    the basis functions with evaluate_basis_all, independently of the
+    batched implementation under test.
+    """
+    source_coords = np.asarray(source_coords, dtype=np.float64)
+    dm = V.dofmap()
+    dofnos = np.zeros(dm.max_cell_dimension(), dtype=np.uintc)
+    source_pt = dolfin.Point(*source_coords)
+    cell_index = V.mesh().intersection_operator().any_intersected_entity(
+        source_pt)
+    c = dolfin.Cell(V.mesh(), cell_index)
+    dm.tabulate_dofs(dofnos, c)
+    finite_element = V.dolfin_element()
+    el_basis_vals = np.zeros((finite_element.space_dimension(),
+                              finite_element.value_dimension(0)),
+                             dtype=np.float64)
+    finite_element.evaluate_basis_all(el_basis_vals, source_coords, c)
+    return dofnos, np.sum(el_basis_vals*source_value, axis=1)
+
+class test_calc_pointsource_contribs(unittest.TestCase):
+    def setUp(self):
+        self.mesh = dolfin.UnitCube(2,2,2)
+        self.V = dolfin.FunctionSpace(
+            self.mesh, "Nedelec 1st kind H(curl)", 1)
+        self.points = np.random.rand(30, 3)*0.98 + 0.01
+        self.values = np.random.rand(30, 3) + 1j*np.random.rand(30, 3)
+
+    def test_nedelec1_general(self):
+        """Closed form order 1 evaluation matches the dolfin element"""
+        cell_indices = point_source.get_cell_locator(self.mesh).locate(
+            self.points)
+        args = (self.V, cell_indices, self.points)
+        dofnos_1, basis_vals_1 = point_source._eval_basis_nedelec1(*args)
+        dofnos_g, basis_vals_g = point_source._eval_basis_general(*args)
+        self.assertTrue(np.all(dofnos_1 == dofnos_g))
+        self.assertTrue(np.allclose(basis_vals_1, basis_vals_g))
+
+    def test_batch(self):
+        dofnos, contribs = point_source.calc_pointsource_contribs(
+            self.V, self.points, self.values)
+        desired = np.zeros(self.V.dim(), np.complex128)
+        for pt, val in zip(self.points, self.values):
+            dnos, c = reference_pointsource_contrib(self.V, pt, val)
+            desired[dnos] += c
+        actual = np.zeros(self.V.dim(), np.complex128)
+        actual[dofnos] = contribs
+        self.assertTrue(np.allclose(actual, desired))
+
+    def test_outside(self):
+        self.assertRaises(ValueError, point_source.calc_pointsource_contrib,
+                          self.V, [0.5, 0.5, 2.], [0, 0, 1.])
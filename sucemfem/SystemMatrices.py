@@ -22,9 +22,12 @@ from __future__ import division
 
 import dolfin 
 from sucemfem import Forms
+from sucemfem import Materials
+from sucemfem.Utilities.Caching import get_cached
 
 class SystemMatrices(object):
     MatrixClass = dolfin.PETScMatrix
+    num_threads = 1
 
     def set_matrix_class(self, matrix_class):
         """Set matrix class to use for system matrix.
@@ -39,20 +42,119 @@ class SystemMatrices(object):
         """Set matrix_forms with a dict mapping matrix names to bilinear forms"""
         self.matrix_forms = matrix_forms
 
+    def set_num_threads(self, num_threads):
+        """Set the number of threads to use for assembly
+
+        If larger than one, dolfin's shared memory (OpenMP) assembler is
+        used, which assembles cells of the same mesh colour concurrently.
+        The mesh colouring is calculated once and stored with the mesh.
+        """
+        self.num_threads = num_threads
+
     def set_boundary_conditions(self, boundary_conditions):
         """Set boundary_conditions with instance of BoundaryConditions"""
         self.boundary_conditions = boundary_conditions
 
+    def _colour_mesh(self):
+        """Colour the mesh for threaded assembly, once per mesh"""
+        V = getattr(self.boundary_conditions, 'function_space', None)
+        if V is None:
+            # dolfin colours the mesh itself if needed
+            return
+        mesh = V.mesh()
+        # Cells sharing a vertex get different colours, which is
+        # sufficient for any element type
+        get_cached(mesh, 'dolfin_vertex_colouring',
+                   lambda m: m.color('vertex'))
+
+    def calc_system_matrices(self):
+        """Calculate and return system matrices in a dict"""
+        system_matrices = dict()
+        old_num_threads = dolfin.parameters['num_threads']
+        if self.num_threads > 1:
+            self._colour_mesh()
+            dolfin.parameters['num_threads'] = self.num_threads
+        try:
+            for matname, form in self.matrix_forms.items():
+                mat = self.MatrixClass()
+                if isinstance(form, Forms.NullForm):
+                    mat = None
+                else:
+                    dolfin.assemble(form, tensor=mat)
+                    self.boundary_conditions.apply_essential(mat)
+                system_matrices[matname] = mat
+        finally:
+            dolfin.parameters['num_threads'] = old_num_threads
+
+        return system_matrices
+
+class NedelecOneSystemMatrices(object):
+    """Calculate lowest order Nedelec system matrices using NumPy
+
+    Instead of compiling and assembling dolfin forms, the closed form
+    element matrices of Whitney elements are calculated for all cells at
+    once. Each system matrix is specified by the name of its element
+    kernel (see L{Assembly.numpy_assembly.NedelecOneAssembler}), and the
+    resulting matrices are scipy CSR matrices numbered in the same way as
+    the dolfin order 1 function space.
+    """
+    kernel_weights = dict(mass='eps_r', stiffness='mu_r')
+    num_threads = 1
+
+    def set_mesh(self, mesh):
+        """Set the (UFC ordered) mesh to assemble on"""
+        from sucemfem.Assembly.numpy_assembly import NedelecOneAssembler
+        self.assembler = NedelecOneAssembler(mesh)
+
+    def set_num_threads(self, num_threads):
+        """Set the number of threads to use for assembly
+
+        If larger than one, cells of the same colour are assembled
+        concurrently. See
+        L{Assembly.numpy_assembly.NedelecOneAssembler.assemble_threaded}
+        """
+        self.num_threads = num_threads
+
+    def set_matrix_kernels(self, matrix_kernels):
+        """Set matrix_kernels with a dict mapping matrix names to kernel names
+
+        A kernel name of None results in a None matrix, analogous to a
+        Forms.NullForm for SystemMatrices
+        """
+        self.matrix_kernels = matrix_kernels
+
+    def set_material_functions(self, material_functions):
+        """Set dict of element-wise constant material functions"""
+        self.material_functions = material_functions
+
+    def set_boundary_conditions(self, boundary_conditions):
+        """Set boundary_conditions with instance of BoundaryConditions"""
+        self.boundary_conditions = boundary_conditions
+
+    def _get_kernel_weights(self, kernel):
+        try:
+            pname = self.kernel_weights[kernel]
+        except KeyError:
+            return None
+        values = Materials.get_cell_values(
+            self.material_functions[pname], self.assembler.mesh_data.num_cells)
+        if pname == 'mu_r':
+            values = 1/values
+        return values
+
     def calc_system_matrices(self):
         """Calculate and return system matrices in a dict"""
+        from sucemfem.Assembly.numpy_assembly import apply_essential_csr
+        essential_dofs = self.boundary_conditions.get_essential_dofs()
         system_matrices = dict()
-        for matname, form in self.matrix_forms.items():
-            mat = self.MatrixClass()
-            if isinstance(form, Forms.NullForm):
+        for matname, kernel in self.matrix_kernels.items():
+            if kernel is None:
                 mat = None
             else:
-                dolfin.assemble(form, tensor=mat)
-                self.boundary_conditions.apply_essential(mat)
+                mat = self.assembler.assemble(
+                    kernel, self._get_kernel_weights(kernel),
+                    num_threads=self.num_threads)
+                mat = apply_essential_csr(mat, essential_dofs)
             system_matrices[matname] = mat
 
         return system_matrices
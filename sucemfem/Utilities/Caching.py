@@ -0,0 +1,61 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+"""Helpers to cache derived data (connectivity, geometry, operators) with
+the dolfin object it was calculated from"""
+
+_cache_attribute = '_sucemfem_cache'
+
+def get_cache(obj):
+    """Return the cache dict stored with obj, creating it if needed
+
+    If obj does not allow new attributes to be set, a new (empty) dict is
+    returned on every call, effectively disabling caching for obj.
+    """
+    try:
+        return getattr(obj, _cache_attribute)
+    except AttributeError:
+        cache = {}
+        try:
+            setattr(obj, _cache_attribute, cache)
+        except AttributeError:
+            pass
+        return cache
+
+def get_cached(obj, key, calc_fn):
+    """Return the value cached with obj under key, calculating it if needed
+
+    @param obj: Object (typically a dolfin Mesh or FunctionSpace) with which
+        the value is to be cached.
+    @param key: Hashable cache key.
+    @param calc_fn: Function calc_fn(obj) that calculates the value.
+    """
+    cache = get_cache(obj)
+    try:
+        return cache[key]
+    except KeyError:
+        value = cache[key] = calc_fn(obj)
+        return value
+
+def clear_cache(obj):
+    """Clear all cached values stored with obj
+
+    This should be called if e.g. the coordinates of a mesh are modified
+    after cached data have been calculated.
+    """
+    get_cache(obj).clear()
@@ -24,22 +24,179 @@
 import numpy as np
 import dolfin
 
+def _signed_index_view(a):
+    """Return index array a as signed integers, without copying if possible
+
+    uBLAS stores its indices as std::size_t. scipy needs signed indices,
+    so unsigned arrays are viewed as the signed type of the same width.
+    """
+    a = np.asarray(a)
+    if a.dtype.kind == 'u':
+        a = a.view(np.dtype('i%d' % a.dtype.itemsize))
+    return a
+
+def _wrap_csr(data, indices, indptr, shape):
+    """Build a scipy.sparse.csr_matrix around existing CSR arrays
+
+    The csr_matrix((data, indices, indptr)) constructor may cast the
+    index arrays to a smaller integer type, which copies them. Setting
+    the attributes directly keeps the original buffers.
+    """
+    import scipy.sparse
+    A_sp = scipy.sparse.csr_matrix(shape, dtype=data.dtype)
+    A_sp.data = data
+    A_sp.indices = indices
+    A_sp.indptr = indptr
+    return A_sp
+
+def _record_stats(stats, backend, nbytes):
+    if stats is not None:
+        stats['backend'] = backend
+        stats['bytes_allocated'] = nbytes
+
+def _ublas_csr_arrays(A, copy):
+    """Return (data, indices, indptr, bytes allocated) of a uBLAS matrix"""
+    if copy:
+        (row,col,data) = A.data()
+        nbytes = row.nbytes + col.nbytes + data.nbytes
+    else:
+        (row,col,data) = A.data(deepcopy=False)
+        nbytes = 0
+    return data, _signed_index_view(col), _signed_index_view(row), nbytes
+
+def _petsc_csr_arrays(A):
+    """Return (data, indices, indptr, bytes allocated) of a PETSc matrix
+
+    The CSR arrays are read through petsc4py in a single call.
+
+    @raise NotImplementedError: if dolfin was built without petsc4py
+    """
+    try:
+        mat = A.mat()
+    except (AttributeError, ImportError, TypeError):
+        raise NotImplementedError(
+            'Converting a PETScMatrix requires dolfin with petsc4py support; '
+            'assemble into a uBLASSparseMatrix instead')
+    (row,col,data) = mat.getValuesCSR()
+    return (data, _signed_index_view(col), _signed_index_view(row),
+            row.nbytes + col.nbytes + data.nbytes)
+
+def dolfin_to_scipy_csr(A, copy=False, stats=None):
+    """
+    convert a DOLFIN uBLAS or PETSc matrix to a scipy.sparse.csr_matrix()
+
+    For uBLAS matrices the CSR arrays of A are used directly unless copy
+    is True. The result then shares memory with A, so A should be kept
+    alive and unmodified for as long as the result is used; a reference
+    to A is stored on the result for this purpose. PETSc matrices are
+    always copied since PETSc does not expose its storage, and need
+    dolfin with petsc4py support.
+
+    @param A: a DOLFIN uBLASSparseMatrix or PETScMatrix
+    @keyword copy: copy the uBLAS data instead of sharing it (default: False)
+    @keyword stats: optional dict that is updated with the keys 'backend'
+        and 'bytes_allocated', the number of bytes newly allocated for
+        the matrix data.
+    """
+    if hasattr(dolfin, 'PETScMatrix') and isinstance(A, dolfin.PETScMatrix):
+        backend = 'petsc'
+        data, indices, indptr, nbytes = _petsc_csr_arrays(A)
+    else:
+        backend = 'ublas'
+        data, indices, indptr, nbytes = _ublas_csr_arrays(A, copy)
+    A_sp = _wrap_csr(data, indices, indptr, (A.size(0), A.size(1)))
+    if backend == 'ublas' and not copy:
+        A_sp._dolfin_matrix = A
+    _record_stats(stats, backend, nbytes)
+    return A_sp
+
+def _same_pattern(A, B):
+    if A.shape != B.shape or A.nnz != B.nnz:
+        return False
+    if A.indptr is B.indptr and A.indices is B.indices:
+        return True
+    return (np.array_equal(A.indptr, B.indptr)
+            and np.array_equal(A.indices, B.indices))
+
+def combine_csr_matrices(terms, stats=None):
+    """
+    Calculate the linear combination sum(coeff*A) of CSR matrices
+
+    If all the matrices have the same sparsity pattern, as is the case for
+    matrices assembled on the same function space, the result is formed in
+    a single data array that shares the index arrays of the first matrix.
+    Real and imaginary parts are accumulated separately so that complex
+    coefficients of real matrices need only one real temporary. Otherwise
+    the matrices are added using scipy.
+
+    @param terms: sequence of (coefficient, matrix) pairs. Matrices may be
+        scipy sparse matrices or DOLFIN matrices; None matrices are skipped.
+    @keyword stats: optional dict that is updated with 'bytes_allocated',
+        including the bytes allocated to convert DOLFIN matrices.
+    """
+    nbytes = 0
+    sp_terms = []
+    for coeff, mat in terms:
+        if mat is None:
+            continue
+        if not hasattr(mat, 'tocsr'):
+            conv_stats = {}
+            mat = dolfin_to_scipy_csr(mat, stats=conv_stats)
+            nbytes += conv_stats['bytes_allocated']
+        sp_terms.append((coeff, mat.tocsr()))
+    if len(sp_terms) == 0:
+        raise ValueError('No matrices to combine')
+    first = sp_terms[0][1]
+    if not all(_same_pattern(first, mat) for coeff, mat in sp_terms[1:]):
+        result = sum(coeff*mat for coeff, mat in sp_terms)
+        nbytes += result.data.nbytes + result.indices.nbytes \
+                  + result.indptr.nbytes
+        _record_stats(stats, 'scipy', nbytes)
+        return result
+
+    dtype = np.result_type(*[np.result_type(coeff, mat.dtype)
+                             for coeff, mat in sp_terms])
+    data = np.zeros(first.nnz, dtype)
+    tmp = np.empty(first.nnz, np.float64)
+    nbytes += data.nbytes + tmp.nbytes
+    complex_result = np.iscomplexobj(data)
+    for coeff, mat in sp_terms:
+        if np.iscomplexobj(mat.data):
+            data += coeff*mat.data
+            nbytes += 2*mat.data.nbytes
+            continue
+        coeff = complex(coeff)
+        if complex_result:
+            parts = ((data.real, coeff.real), (data.imag, coeff.imag))
+        else:
+            parts = ((data, coeff.real),)
+        for part, c in parts:
+            if c != 0:
+                np.multiply(mat.data, c, out=tmp)
+                part += tmp
+    del tmp
+    result = _wrap_csr(data, first.indices, first.indptr, first.shape)
+    # Keep the matrices that own the shared index arrays alive
+    result._dolfin_matrix = getattr(first, '_dolfin_matrix', None)
+    _record_stats(stats, 'combined', nbytes)
+    return result
+
 def dolfin_ublassparse_to_scipy_csr ( A, dtype=None, imagify=False ):
     """
     convert a DOLFIN uBLASSparseMatrix to a scipy.sparse.csr_matrix()
+
+    The data is copied. See L{dolfin_to_scipy_csr} for a conversion that
+    shares the data of A, and that also handles PETSc matrices.
     
     @param A: a DOLFIN uBLASSparseMatrix
     @param dtype: the numpy data type to use to store the matrix
     @param imagify: multiply the original matrix data by 1j
     """
-    import scipy.sparse
-    # get the sparse data from the input matrix
-    (row,col,data) = A.data()   # get sparse data
-    col = np.intc(col)
-    row = np.intc(row)
-    n = A.size(0)
-    if imagify: data = data*1j
-    A_sp = scipy.sparse.csr_matrix( (data,col,row), shape=(n,n), dtype=dtype)
+    A_sp = dolfin_to_scipy_csr(A, copy=True)
+    if imagify:
+        A_sp.data = A_sp.data*1j
+    if dtype is not None:
+        A_sp = A_sp.astype(dtype)
     
     return A_sp
 
@@ -0,0 +1,240 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+"""Ahead-of-time compilation of the standard sucemfem forms and expressions
+
+dolfin JIT compiles every form, expression and finite element the first
+time it is used, and caches the generated modules on disk (in the
+instant cache). This module compiles everything used by the standard
+problem and post-processing classes for a list of basis orders, so that
+batch jobs using the same cache directory start with a hot cache.
+
+Usage from the command line:
+
+    python -m sucemfem.Utilities.FormCache --orders 1,2,3 --cache-dir DIR
+
+The cache directory must also be used by the jobs that are to benefit,
+either by calling set_cache_dir() before any dolfin JIT compilation, or by
+setting the INSTANT_CACHE_DIR environment variable.
+
+Note that the form compiler parameters (see Utilities.Optimization) are
+part of the cache signature; the same parameters should be used for
+warm-up and for the actual runs.
+"""
+from __future__ import division
+
+import os
+import sys
+import json
+import subprocess
+from time import time
+
+def set_cache_dir(cache_dir):
+    """Use cache_dir for the on-disk JIT cache
+
+    Has to be called before any form or expression is compiled.
+    """
+    cache_dir = os.path.abspath(cache_dir)
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    os.environ['INSTANT_CACHE_DIR'] = cache_dir
+    return cache_dir
+
+def _get_cache_dir():
+    cache_dir = os.environ.get('INSTANT_CACHE_DIR')
+    if not cache_dir:
+        cache_dir = os.path.join(os.path.expanduser('~'), '.instant', 'cache')
+    return cache_dir
+
+def _count_cache_entries(cache_dir):
+    if not os.path.exists(cache_dir):
+        return 0
+    return len(os.listdir(cache_dir))
+
+def get_standard_jit_items(order):
+    """Return (name, compile_fn) pairs for the standard forms of order
+
+    Calling compile_fn() compiles (or loads from the cache) the item. A
+    small mesh is used, so any assembly needed to trigger compilation is
+    cheap.
+    """
+    import dolfin
+    from sucemfem import Forms, Materials
+    from sucemfem.BoundaryConditions import ABCBoundaryCondition
+    from sucemfem.PostProcessing import CalcEMFunctional
+    from sucemfem.PostProcessing import ntff_expressions
+    from sucemfem.PostProcessing.surface_ntff import SurfaceNTFFForms
+    from sucemfem.PostProcessing.variational_ntff import TransformTestingExpression
+    from sucemfem.PostProcessing.power_flux import SurfaceFlux
+
+    mesh = dolfin.UnitCube(1,1,1)
+    state = {}
+    def function_space():
+        state['V'] = dolfin.FunctionSpace(
+            mesh, "Nedelec 1st kind H(curl)", order)
+    def interior_forms():
+        # Single region meshes get Constant material functions, others DG0
+        # functions, and the two result in different compiled forms
+        region_meshfn = dolfin.CellFunction('uint', mesh)
+        region_meshfn.set_all(0)
+        region_meshfn[0] = 1
+        variants = ((None, None),
+                    ({0:dict(eps_r=1, mu_r=1), 1:dict(eps_r=2, mu_r=1)},
+                     region_meshfn))
+        state['interior_forms'] = []
+        for material_regions, meshfn in variants:
+            mat_props = Materials.MaterialPropertiesFactory(material_regions)
+            mat_fns = Materials.MaterialFunctionFactory(
+                mat_props.get_material_properties(), meshfn, mesh
+                ).get_material_functions('eps_r', 'mu_r')
+            forms = Forms.EMGalerkinInteriorForms()
+            forms.set_material_functions(mat_fns)
+            forms.set_function_space(state['V'])
+            state['interior_forms'].append(forms)
+    def mass_form():
+        for forms in state['interior_forms']:
+            dolfin.assemble(forms.get_mass_form())
+    def stiffness_form():
+        for forms in state['interior_forms']:
+            dolfin.assemble(forms.get_stiffness_form())
+    def abc_form():
+        abc = ABCBoundaryCondition()
+        abc.set_function_space(state['V'])
+        dolfin.assemble(abc.get_bilinear_form())
+    def ntff_expressions_():
+        for name in ('get_r_hat', 'get_k0', 'get_theta_hat',
+                     'get_phi_hat', 'get_3d_vector'):
+            getattr(ntff_expressions, name)()
+        TransformTestingExpression()
+    def surface_ntff_forms():
+        forms = SurfaceNTFFForms(state['V'])
+        forms.set_parms(0., 0., 1.)
+        forms.assemble_N()
+        forms.assemble_L()
+    def em_functional(subdomain):
+        functional = CalcEMFunctional(state['V'])
+        functional.set_k0(1.)
+        if subdomain:
+            cell_domains = dolfin.CellFunction('uint', mesh)
+            cell_domains.set_all(1)
+            functional.set_cell_domains(cell_domains, 1)
+        functional.calc_functional()
+    def surface_flux_form():
+        flux = SurfaceFlux(state['V'])
+        flux.set_k0(1.)
+        flux.calc_flux()
+
+    return [('function_space', function_space),
+            ('material_functions', interior_forms),
+            ('mass_form', mass_form),
+            ('stiffness_form', stiffness_form),
+            ('abc_form', abc_form),
+            ('ntff_expressions', ntff_expressions_),
+            ('surface_ntff_forms', surface_ntff_forms),
+            ('em_functional', lambda : em_functional(False)),
+            ('em_functional_subdomain', lambda : em_functional(True)),
+            ('surface_flux_form', surface_flux_form),
+            ]
+
+def warm_form_cache(orders, cache_dir=None):
+    """Compile the standard forms and expressions for each basis order
+
+    @param orders: Sequence of basis function orders
+    @keyword cache_dir: Optional JIT cache directory. If None the currently
+        active instant cache directory is used.
+    @return: A list of dicts with keys 'order', 'name', 'time' (seconds) and
+        'compiled' (True if new modules were generated, False if the item
+        was loaded from the cache).
+    """
+    if cache_dir is not None:
+        set_cache_dir(cache_dir)
+    cache_dir = _get_cache_dir()
+    report = []
+    for order in orders:
+        for name, compile_fn in get_standard_jit_items(order):
+            no_entries = _count_cache_entries(cache_dir)
+            t0 = time()
+            compile_fn()
+            report.append(dict(order=order, name=name, time=time() - t0,
+                               compiled=_count_cache_entries(cache_dir) > no_entries))
+    return report
+
+def measure_load_times(orders, cache_dir=None, optimise=False):
+    """Measure cache load times of the standard forms in a fresh process
+
+    The in-memory JIT caches of the current process are bypassed by running
+    warm_form_cache() in a subprocess.
+
+    @return: A report as for warm_form_cache()
+    """
+    args = [sys.executable, '-m', 'sucemfem.Utilities.FormCache', '--json',
+            '--orders', ','.join(str(o) for o in orders)]
+    if cache_dir is not None:
+        args += ['--cache-dir', cache_dir]
+    if optimise:
+        args += ['--optimise']
+    output = subprocess.Popen(args, stdout=subprocess.PIPE).communicate()[0]
+    return json.loads(output.splitlines()[-1])
+
+def print_report(compile_report, load_report=None):
+    """Print compile (and optionally load) times per form"""
+    load_times = {}
+    if load_report is not None:
+        load_times = dict(((r['order'], r['name']), r['time'])
+                          for r in load_report)
+    print '%5s %-25s %10s %10s %10s' % (
+        'order', 'item', 'status', 'time [s]', 'load [s]')
+    for r in compile_report:
+        status = 'compiled' if r['compiled'] else 'cached'
+        load_time = load_times.get((r['order'], r['name']))
+        load_str = '%10.3f' % load_time if load_time is not None else '%10s' % '-'
+        print '%5d %-25s %10s %10.3f %s' % (
+            r['order'], r['name'], status, r['time'], load_str)
+
+def main(argv=None):
+    from optparse import OptionParser
+    parser = OptionParser(description=
+        'Precompile the standard sucemfem forms into a JIT cache directory')
+    parser.add_option('--orders', default='1,2,3',
+                      help='comma separated list of basis orders [%default]')
+    parser.add_option('--cache-dir', default=None,
+                      help='JIT cache directory [instant default]')
+    parser.add_option('--optimise', action='store_true', default=False,
+                      help='enable dolfin form compiler optimisation')
+    parser.add_option('--no-load-times', action='store_true', default=False,
+                      help='do not measure load times in a fresh process')
+    parser.add_option('--json', action='store_true', default=False,
+                      help=('only output the report as json, without '
+                            'measuring load times'))
+    options, args = parser.parse_args(argv)
+    orders = [int(o) for o in options.orders.split(',')]
+    if options.optimise:
+        from sucemfem.Utilities.Optimization import set_dolfin_optimisation
+        set_dolfin_optimisation(True)
+    report = warm_form_cache(orders, options.cache_dir)
+    if options.json:
+        print json.dumps(report)
+        return
+    load_report = None
+    if not options.no_load_times:
+        load_report = measure_load_times(
+            orders, options.cache_dir, options.optimise)
+    print_report(report, load_report)
+
+if __name__ == '__main__':
+    main()
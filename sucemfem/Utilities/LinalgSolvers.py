@@ -36,7 +36,11 @@ class SystemSolverBase ( object ):
         """
         The constructor for a System Solver
         
-        @param A: The matrix for the system that must be solved
+        @param A: The matrix for the system that must be solved. A
+            matrix-free operator with shape, dtype and matvec attributes
+            (e.g. L{sucemfem.Assembly.matrix_free.DrivenSystemOperator}) is
+            also accepted by the iterative solvers. The 'diagonal'
+            preconditioner additionally requires a diagonal() method.
         @keyword preconditioner_type: A string indicating the type of preconditioner to be used.
             (default: None)
         """
@@ -115,6 +119,9 @@ class SystemSolverBase ( object ):
             M = None
         elif M_type.lower() == 'diagonal':
             M = scipy.sparse.spdiags(1./self._A.diagonal(), 0, self._A.shape[0], self._A.shape[1])
+        elif M_type.lower() == 'ilu' and not hasattr(self._A, 'tocsc'):
+            print "Warning: ILU preconditioner requires an assembled matrix. Not using preconditioner."
+            M = None
         elif M_type.lower() == 'ilu':            
             self._M_data = scipy.sparse.linalg.spilu (self._A.tocsc(), drop_tol=1e-8, fill_factor=10)
 #            self._M_data = scipy.sparse.linalg.spilu (self._A.tocsc(), drop_tol=1e-8, fill_factor=1)                         
@@ -320,4 +327,39 @@ def solve_sparse_system ( A, b, preconditioner_type='ilu' ):
 #    solver = BiCGStabSolver ( A ) #removed preconditioner -> 2D Waveguide works!    
     x = solver.solve(b)
     return x
-    
+
+def solve_sparse_block_system ( A, B, solver_type='lu', preconditioner_type='ilu' ):
+    """
+    Solve the sparse linear system AX = B for a block of RHS vectors
+
+    A single factorisation or preconditioner is calculated and shared by
+    all the columns of B.
+
+    @param A: a square matrix
+    @param B: (n, m) array with the m RHS vectors as columns
+    @keyword solver_type: 'lu' for a sparse LU factorisation of A that is
+        used to solve all the columns (default), or 'bicgstab'/'gmres' to
+        solve the columns iteratively using a shared preconditioner. Only
+        the iterative solvers accept matrix-free operators.
+    @keyword preconditioner_type: Preconditioner type string for the
+        iterative solvers
+    @return: (n, m) array X with the solution vectors as columns
+    """
+    B = np.asarray(B)
+    if B.ndim == 1:
+        B = B[:,np.newaxis]
+    if solver_type == 'lu':
+        if not hasattr(A, 'tocsc'):
+            raise ValueError('LU solver requires an assembled matrix')
+        lu = scipy.sparse.linalg.splu(A.tocsc())
+        return lu.solve(np.require(B, dtype=np.result_type(A.dtype, B.dtype)))
+    solver_classes = dict(bicgstab=BiCGStabSolver, gmres=GMRESSolver)
+    try:
+        solver = solver_classes[solver_type](A, preconditioner_type)
+    except KeyError:
+        raise ValueError('Unknown solver type %s' % solver_type)
+    X = np.zeros(B.shape, dtype=np.result_type(A.dtype, B.dtype))
+    for i in range(B.shape[1]):
+        X[:,i] = solver.solve(B[:,i])
+    return X
+
@@ -0,0 +1,87 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+from __future__ import division
+
+import unittest
+import numpy as np
+import scipy.sparse
+import dolfin
+
+# Module under test
+from sucemfem.Utilities import Converters
+
+class test_combine_csr_matrices(unittest.TestCase):
+    def setUp(self):
+        A = scipy.sparse.rand(50, 50, density=0.1, format='csr')
+        self.A = A + scipy.sparse.eye(50, 50, format='csr')
+        self.B = self.A.copy()
+        self.B.data = np.random.rand(self.A.nnz)
+        self.C = scipy.sparse.eye(50, 50, format='csr')
+
+    def test_shared_pattern(self):
+        k0 = 2.5
+        stats = {}
+        actual = Converters.combine_csr_matrices(
+            [(1, self.A), (-k0**2, self.B), (1j*k0, None)], stats=stats)
+        desired = self.A - k0**2*self.B
+        self.assertEqual(stats['backend'], 'combined')
+        self.assertTrue(actual.indices is self.A.indices)
+        self.assertTrue(np.allclose(actual.todense(), desired.todense()))
+
+    def test_complex(self):
+        actual = Converters.combine_csr_matrices(
+            [(1, self.A), (1j*3, self.B)])
+        desired = self.A + 3j*self.B
+        self.assertTrue(np.iscomplexobj(actual.data))
+        self.assertTrue(np.allclose(actual.todense(), desired.todense()))
+
+    def test_different_pattern(self):
+        stats = {}
+        actual = Converters.combine_csr_matrices(
+            [(1, self.A), (2j, self.C)], stats=stats)
+        desired = self.A + 2j*self.C
+        self.assertEqual(stats['backend'], 'scipy')
+        self.assertTrue(np.allclose(actual.todense(), desired.todense()))
+
+class test_dolfin_to_scipy_csr(unittest.TestCase):
+    def setUp(self):
+        mesh = dolfin.UnitCube(2,2,2)
+        V = dolfin.FunctionSpace(mesh, 'Nedelec 1st kind H(curl)', 1)
+        u = dolfin.TrialFunction(V)
+        v = dolfin.TestFunction(V)
+        self.form = dolfin.inner(u, v)*dolfin.dx
+
+    def _assemble(self, matrix_class):
+        mat = matrix_class()
+        dolfin.assemble(self.form, tensor=mat)
+        return mat
+
+    def test_ublas(self):
+        mat = self._assemble(dolfin.uBLASSparseMatrix)
+        stats = {}
+        actual = Converters.dolfin_to_scipy_csr(mat, stats=stats)
+        self.assertEqual(stats['bytes_allocated'], 0)
+        self.assertTrue(np.allclose(actual.todense(), mat.array()))
+
+    def test_petsc(self):
+        mat = self._assemble(dolfin.PETScMatrix)
+        actual = Converters.dolfin_to_scipy_csr(mat)
+        self.assertTrue(np.allclose(actual.todense(), mat.array()))
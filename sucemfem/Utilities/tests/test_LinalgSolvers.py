@@ -29,6 +29,7 @@ import scipy.sparse
 
 sys.path.insert(0, '../')
 from sucemfem.Utilities.LinalgSolvers import solve_sparse_system, calculate_residual
+from sucemfem.Utilities.LinalgSolvers import solve_sparse_block_system
 del sys.path[0]
 
 
@@ -46,6 +47,22 @@ class TestSparseSolver ( unittest.TestCase ):
         
         np.testing.assert_array_equal( b, x )
    
+class TestBlockSolver ( unittest.TestCase ):
+    def setUp ( self ):
+        N = 200
+        A = scipy.sparse.rand ( N, N, density=0.02, format='csr' )
+        self.A = A + 1j*A.T + 10*scipy.sparse.eye ( N, N )
+        self.B = np.random.rand ( N, 3 ) + 1j*np.random.rand ( N, 3 )
+
+    def test_lu ( self ):
+        X = solve_sparse_block_system ( self.A, self.B )
+        self.assertTrue ( np.allclose ( self.A*X, self.B ) )
+
+    def test_iterative ( self ):
+        X = solve_sparse_block_system ( self.A, self.B, solver_type='bicgstab',
+                                        preconditioner_type='diagonal' )
+        self.assertTrue ( np.allclose ( self.A*X, self.B, rtol=1e-4, atol=1e-4 ) )
+
 class TestOther ( unittest.TestCase ):   
     def _call_function (self, A, x, b ):
         print b.shape
@@ -77,3 +77,45 @@ class test_BoundaryEdgeCells(unittest.TestCase):
         
 
     
+
+class test_CellLocator(unittest.TestCase):
+    def setUp(self):
+        self.mesh = dolfin.UnitCube(3,3,3)
+        self.DUT = Geometry.get_cell_locator(self.mesh)
+
+    def test_cached(self):
+        self.assertTrue(Geometry.get_cell_locator(self.mesh) is self.DUT)
+
+    def test_locate(self):
+        points = np.random.rand(200, 3)
+        cell_indices = self.DUT.locate(points)
+        for pt, ci in zip(points, cell_indices):
+            cell = dolfin.Cell(self.mesh, int(ci))
+            self.assertTrue(cell.intersects(dolfin.Point(*pt)))
+
+    def test_outside(self):
+        cell_indices = self.DUT.locate([[0.5, 0.5, 1.5], [0.5, 0.5, 0.5]])
+        self.assertEqual(cell_indices[0], -1)
+        self.assertTrue(cell_indices[1] >= 0)
+
+class test_get_segment_quadrature(unittest.TestCase):
+    def setUp(self):
+        self.mesh = dolfin.UnitCube(3,3,3)
+
+    def test_integrate(self):
+        start, end = np.array([0.1, 0.2, 0.3]), np.array([0.9, 0.7, 0.4])
+        cell_indices, points, weights = Geometry.get_segment_quadrature(
+            self.mesh, start, end, 2)
+        length = np.sqrt(np.sum((end - start)**2))
+        self.assertAlmostEqual(np.sum(weights), length)
+        # Cubic along the segment is integrated exactly
+        t = np.dot(points - start, end - start)/length**2
+        self.assertAlmostEqual(np.dot(weights, t**3), length/4)
+        for pt, ci in zip(points, cell_indices):
+            cell = dolfin.Cell(self.mesh, int(ci))
+            self.assertTrue(cell.intersects(dolfin.Point(*pt)))
+
+    def test_outside(self):
+        cell_indices, points, weights = Geometry.get_segment_quadrature(
+            self.mesh, [0.5, 0.5, 0.5], [0.5, 0.5, 1.5], 1)
+        self.assertAlmostEqual(np.sum(weights), 0.5)
@@ -0,0 +1,87 @@
+## Copyright (C) 2011 Stellenbosch University
+##
+## This file is part of SUCEM.
+##
+## SUCEM is free software: you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation, either version 3 of the License, or
+## (at your option) any later version.
+##
+## SUCEM is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with SUCEM. If not, see <http://www.gnu.org/licenses/>. 
+##
+## Contact: cemagga@gmail.com 
+# Authors:
+# Neilen Marais <nmarais@gmail.com>
+from __future__ import division
+
+
+import unittest
+import dolfin
+import numpy as np
+
+# Module under test
+from sucemfem import Materials
+
+class test_MaterialFunctionFactory(unittest.TestCase):
+    def setUp(self):
+        self.mesh = dolfin.UnitCube(2,2,2)
+        self.region_meshfn = dolfin.CellFunction('uint', self.mesh)
+        self.region_meshfn.set_all(3)
+        self.region_meshfn.array()[::3] = 7
+        self.material_regions = {3:dict(eps_r=2., mu_r=1.),
+                                 7:dict(eps_r=5., mu_r=3.)}
+
+    def _get_DUT(self, material_regions, region_meshfn):
+        mat_props = Materials.MaterialPropertiesFactory(material_regions)
+        return Materials.MaterialFunctionFactory(
+            mat_props.get_material_properties(), region_meshfn, self.mesh)
+
+    def test_regions(self):
+        DUT = self._get_DUT(self.material_regions, self.region_meshfn)
+        mat_fns = DUT.get_material_functions('eps_r', 'mu_r')
+        regions = self.region_meshfn.array()
+        for pname in ('eps_r', 'mu_r'):
+            desired = np.array([self.material_regions[r][pname]
+                                for r in regions])
+            actual = mat_fns[pname].vector().array()
+            self.assertTrue(np.all(actual == desired))
+        # The DG0 function space is shared between properties
+        self.assertTrue(mat_fns['eps_r'].function_space() ==
+                        mat_fns['mu_r'].function_space())
+
+    def test_single_region(self):
+        DUT = self._get_DUT(None, None)
+        mat_fns = DUT.get_material_functions('eps_r', 'mu_r')
+        self.assertTrue(isinstance(mat_fns['eps_r'], dolfin.Constant))
+        self.assertEqual(float(mat_fns['eps_r']), 1.)
+
+    def test_missing_region(self):
+        DUT = self._get_DUT({3:dict(eps_r=2.)}, self.region_meshfn)
+        self.assertRaises(ValueError, DUT.get_material_functions, 'eps_r')
+
+class test_DispersionModels(unittest.TestCase):
+    def test_debye(self):
+        DUT = Materials.DebyeModel(eps_inf=2., eps_s=10., tau=1e-9)
+        self.assertAlmostEqual(DUT(0.), 10.)
+        self.assertAlmostEqual(DUT(1e15), 2., places=5)
+        # exp(j*omega*t) convention: losses give a negative imaginary part
+        self.assertTrue(DUT(1e8).imag < 0)
+        self.assertAlmostEqual(DUT(1/(2*np.pi*1e-9)), 6. - 4j)
+
+    def test_lorentz(self):
+        DUT = Materials.LorentzModel(eps_inf=1., delta_eps=3.,
+                                     resonant_frequency=1e9, gamma=1e8)
+        self.assertAlmostEqual(DUT(0.), 4.)
+        omega_0 = 2*np.pi*1e9
+        self.assertAlmostEqual(DUT(1e9), 1. - 3j*omega_0/1e8)
+
+    def test_drude(self):
+        DUT = Materials.DrudeModel(eps_inf=1., plasma_frequency=1e9, gamma=0.)
+        self.assertAlmostEqual(DUT(1e9), 0.)
+        self.assertAlmostEqual(DUT(2e9), 0.75)